@@ -0,0 +1,10 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Build targets & utilities used by build.py. Target modules are only imported when one of
+# their targets is run.
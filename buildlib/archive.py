@@ -0,0 +1,124 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Zip archive operations.
+
+import errno, os, shutil, stat
+
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile, ZipInfo
+
+from .common import exitWithError, printWarning
+from .files import checkDirSourceExists, checkFileSourceExists, checkTargetNotDir, deleteFile
+from .profile import profiler
+
+
+# file extensions of data that is already compressed
+compressed_ext = (".png", ".neu", ".zip", ".gz", ".bz2")
+
+
+def packFile(sourcefile, archive, amend=False, verbose=False, arcname=None):
+  checkFileSourceExists(sourcefile)
+
+  new_archive = type(archive) != ZipFile
+  zopen = archive
+  if new_archive:
+    checkTargetNotDir(archive, "create zip")
+    zopen = ZipFile(archive, "a" if amend else "w")
+  zopen.write(sourcefile, arcname)
+  if profiler.enabled:
+    profiler.count(files_zipped=1, bytes_zipped=os.path.getsize(sourcefile))
+  # if ZipFile was passed, calling instruction should close the file
+  if new_archive:
+    zopen.close()
+
+  if verbose:
+    print("compress '{}' => '{}'".format(sourcefile, archive))
+
+def packDir(sourcedir, archive, incroot=False, amend=False, verbose=False):
+  with profiler.span("packDir", "zip", {"source": sourcedir, "archive": str(archive)}):
+    _packDir(sourcedir, archive, incroot, amend, verbose)
+
+def _packDir(sourcedir, archive, incroot=False, amend=False, verbose=False):
+  checkDirSourceExists(sourcedir)
+  checkTargetNotDir(archive, "create zip")
+
+  # member names are relative to source directory (or its parent if root is included) so that
+  # archiving does not depend on working directory
+  archive = os.path.abspath(archive)
+  dir_abs = os.path.abspath(sourcedir)
+  dir_rel = os.path.dirname(dir_abs) if incroot else dir_abs
+
+  zopen = ZipFile(archive, "a" if amend else "w")
+  z_count_start = len(zopen.namelist())
+  for ROOT, DIRS, FILES in os.walk(dir_abs):
+    for f in FILES:
+      f = os.path.join(ROOT, f)
+      packFile(f, zopen, True, verbose, os.path.relpath(f, dir_rel))
+  z_count_end = len(zopen.namelist())
+  zopen.close()
+
+  if z_count_end == 0:
+    printWarning("no files compressed, archive empty: {}".format(archive))
+    deleteFile(archive, verbose)
+  elif verbose:
+    z_count_diff = z_count_end - z_count_start
+    if z_count_diff == 0:
+      print("archive unchanged: {}".format(archive))
+    else:
+      print("added {} files into archive: {}".format(z_count_diff, archive))
+
+def packMembers(archive, members, verbose=False):
+  with profiler.span("packMembers", "zip", {"archive": archive}):
+    _packMembers(archive, members, verbose)
+
+def _packMembers(archive, members, verbose=False):
+  # streams members directly from their source paths, members are (source, arcname[, mode])
+  checkTargetNotDir(archive, "create zip")
+
+  zopen = ZipFile(archive, "w")
+  for member in members:
+    source, arcname = member[:2]
+    checkFileSourceExists(source, "compress")
+    zinfo = ZipInfo.from_file(source, arcname)
+    if len(member) > 2:
+      zinfo.external_attr = (stat.S_IFREG | member[2]) << 16
+    # don't waste time deflating data that is already compressed
+    if source.lower().endswith(compressed_ext):
+      zinfo.compress_type = ZIP_STORED
+    else:
+      zinfo.compress_type = ZIP_DEFLATED
+    fsource = open(source, "rb")
+    ftarget = zopen.open(zinfo, "w")
+    shutil.copyfileobj(fsource, ftarget, 1024 * 1024)
+    ftarget.close()
+    fsource.close()
+    if profiler.enabled:
+      profiler.count(files_zipped=1, bytes_zipped=zinfo.file_size)
+    if verbose:
+      print("compress '{}' => '{}'".format(source, archive))
+  zopen.close()
+
+def unpack(filepath, dir_target=None, verbose=False):
+  if not os.path.isfile(filepath):
+    exitWithError("cannot extract zip, file not found: {}".format(filepath), errno.ENOENT)
+
+  dir_parent = os.path.dirname(filepath)
+  if dir_target == None:
+    dir_target = os.path.join(dir_parent, os.path.basename(filepath).lower().split(".zip")[0])
+
+  if os.path.exists(dir_target):
+    if not os.path.isdir(dir_target):
+      exitWithError("cannot extract zip, file exists: {}".format(dir_target), errno.EEXIST)
+    shutil.rmtree(dir_target)
+  os.makedirs(dir_target)
+
+  if verbose:
+    print("extracting contents of {} ...".format(filepath))
+  zopen = ZipFile(filepath, "r")
+  zopen.extractall(dir_target)
+  zopen.close()
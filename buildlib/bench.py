@@ -0,0 +1,152 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Benchmark target.
+
+import json, os, re, shutil, subprocess, time
+
+from .archive import packDir
+from .common import exitWithError, getConfig, options, writeFile
+from .files import deleteDir, deleteFile, makeDir
+from .web import distWeb, stageWeb
+
+
+def getRevision(_dir):
+  # retrieves short commit hash of working tree or None if not available
+  try:
+    res = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=_dir, capture_output=True,
+        text=True)
+    if res.returncode != 0:
+      return None
+    rev = res.stdout.strip()
+    res = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=_dir,
+        capture_output=True, text=True)
+    if res.stdout.strip():
+      rev += "-dirty"
+    return rev
+  except FileNotFoundError:
+    return None
+
+def getBenchSelections(comp, size):
+  # one selection per body type with first index of each outfit layer that can be drawn
+  from chargen import compositor
+
+  selections = []
+  info = comp.getSizeInfo(size)
+  for body in info["base"]["body"]:
+    outfit = {}
+    for layer in compositor.outfit_layers:
+      selection = {"size": size, "type": body, "layers": {"outfit": dict(outfit, **{layer: 1})}}
+      try:
+        comp.render(selection)
+      except (ValueError, OSError):
+        continue
+      outfit[layer] = 1
+    selections.append({"size": size, "type": body, "layers": {"outfit": outfit}})
+  return selections
+
+def bench(_dir, verbose=False):
+  import contextlib, io, platform, tempfile
+  from chargen import bench as timing, compositor
+
+  print("\nrunning benchmarks ...")
+
+  dir_build = os.path.join(_dir, "build")
+  dir_web = os.path.join(dir_build, "web")
+  dir_assets = os.path.join(_dir, "assets")
+  file_dist = os.path.join(dir_build, "dist", "chargen_{}_web.zip".format(getConfig("version")))
+  dir_temp = tempfile.mkdtemp(prefix="chargen-bench-")
+  file_pack = os.path.join(dir_temp, "assets.zip")
+  params = {"warmup": options["warmup"], "iterations": options["iterations"]}
+
+  def quiet(action):
+    # target output is suppressed so that it does not distort timings
+    def run():
+      with contextlib.redirect_stdout(io.StringIO()):
+        action(_dir, False)
+    return run
+
+  def cleanWeb():
+    deleteDir(dir_web, False)
+    deleteFile(os.path.join(dir_build, "stage-web.json"), False)
+
+  # existing staged files & web distribution are moved aside while benchmarking so that they are
+  # not replaced by the results of benchmark runs
+  outputs = [dir_web, os.path.join(dir_build, "stage-web.json"), file_dist]
+  dir_saved = os.path.join(dir_temp, "saved")
+
+  def saveOutputs():
+    makeDir(dir_saved, False)
+    for idx, path in enumerate(outputs):
+      if os.path.exists(path):
+        shutil.move(path, os.path.join(dir_saved, str(idx)))
+
+  def restoreOutputs():
+    cleanWeb()
+    deleteFile(file_dist, False)
+    for idx, path in enumerate(outputs):
+      saved = os.path.join(dir_saved, str(idx))
+      if os.path.exists(saved):
+        shutil.move(saved, path)
+
+  cases = [
+    ("stage-web", quiet(stageWeb), cleanWeb, None),
+    ("stage-web (unchanged)", quiet(stageWeb), None, None),
+    ("dist-web", quiet(distWeb), lambda: deleteFile(file_dist, False), None),
+    ("pack-assets", lambda: packDir(dir_assets, file_pack), lambda: deleteFile(file_pack, False),
+        None)
+  ]
+  try:
+    comp = compositor.Compositor(dir_assets)
+    for size in comp.layers:
+      if not re.match(r"^\d+x\d+$", size):
+        continue
+      selections = getBenchSelections(comp, size)
+      cases.append(("composite {}".format(size), lambda sel=selections: list(comp.renderMany(sel)),
+          None, len(selections)))
+  except (ValueError, KeyError, OSError) as e:
+    exitWithError("failed to prepare compositing benchmark: {}".format(e))
+
+  results = {}
+  saveOutputs()
+  try:
+    for name, func, setup, sheets in cases:
+      if verbose:
+        print("bench '{}'".format(name))
+      result = timing.measure(func, setup, **params)
+      if sheets:
+        result["sheets"] = sheets
+        result["sheets_per_sec"] = sheets / max(result["median"], 0.000001)
+      results[name] = result
+  finally:
+    restoreOutputs()
+    shutil.rmtree(dir_temp, ignore_errors=True)
+
+  print("\n{:<24} {:>10} {:>10} {:>10}".format("benchmark", "median", "p95", "sheets/s"))
+  for name, result in results.items():
+    print("{:<24} {:>9.1f}ms {:>9.1f}ms {:>10}".format(name, result["median"] * 1000,
+        result["p95"] * 1000, "{:.1f}".format(result["sheets_per_sec"]) if "sheets_per_sec" in result
+        else "-"))
+
+  rev = getRevision(_dir)
+  report = {
+    "revision": rev,
+    "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    "python": platform.python_version(),
+    "platform": platform.platform(),
+    "cpus": os.cpu_count(),
+    "warmup": params["warmup"],
+    "iterations": params["iterations"],
+    "results": results
+  }
+  dir_bench = options["output"] or os.path.join(dir_build, "bench")
+  if not os.path.exists(dir_bench):
+    makeDir(dir_bench, verbose)
+  file_report = os.path.join(dir_bench, "bench-{}.json".format(rev or "unknown"))
+  writeFile(file_report, json.dumps(report, indent=2))
+  print("\nresults written to '{}'".format(file_report))
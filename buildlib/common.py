@@ -0,0 +1,177 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Options, configuration & messages shared by all build modules.
+
+# NOTE: modules that are slow to import (e.g. json) are imported by the functions using them so
+#       that commands that don't need them start quickly
+
+import codecs, errno, os, sys
+
+
+dir_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+file_conf = os.path.join(dir_root, "build.conf")
+
+options = {
+  "web-dist": False,
+  # run targets even if up to date
+  "force": False,
+  # number of targets that can be executed concurrently
+  "jobs": 1,
+  # print timing & file operation summary of targets
+  "profile": False,
+  # file to write Chrome trace events to
+  "trace": None,
+  # values set with --<name>=<value>
+  "input": None,
+  "output": None,
+  # benchmark iterations
+  "warmup": 1,
+  "iterations": 5,
+  # address of render service
+  "host": "127.0.0.1",
+  "port": 8080,
+  # size limit of composite sheet cache in MB (0 disables cache)
+  "cache-size": 512,
+  # catalogue export slice (<index>/<count>), archive format & unique sheets per archive
+  "shard": "1/1",
+  "archive": "tar",
+  "part-size": 1000,
+  # formats of animated previews (comma separated list of gif & apng)
+  "animation": "gif",
+  # layer categories to downscale (comma separated list, e.g. outfit/hair,base/eyes)
+  "categories": None,
+  # install downscaled layers missing from assets & update counts in layers.json
+  "update-layers": False
+}
+
+
+# --- UTILITY FUNCTIONS --- #
+
+def printUsage():
+  from .runner import targets
+
+  file_exe = "build.py"
+  print("\nUSAGE:\n  {} [-h] [-v|-q] [-w] [-j <jobs>] [--force] [--profile] [--trace <file>]\n      [--input=<file>] [--output=<dir>] [--warmup=<n>] [--iterations=<n>]\n      [--host=<address>] [--port=<port>] [--cache-size=<MB>]\n      [--shard=<index>/<count>] [--archive=tar|zip] [--part-size=<n>]\n      [--animation=gif,apng] [--categories=<list>] [--update-layers]\n      {}".format(
+      file_exe, "|".join(targets.getNames())))
+
+def printWarning(msg):
+  print("\nWARNING: " + msg)
+
+def printError(msg):
+  print("\nERROR: " + msg)
+
+def exitWithError(msg, code=1, usage=False):
+  printError(msg)
+  if usage:
+    printUsage()
+  sys.exit(code)
+
+def readFile(filepath):
+  if not os.path.exists(filepath):
+    exitWithError("cannot open file for reading, does not exist: {}".format(filepath), errno.ENOENT)
+  if os.path.isdir(filepath):
+    exitWithError("cannot open file for reading, directory exists: {}".format(filepath), errno.EISDIR)
+
+  fopen = codecs.open(filepath, "r", "utf-8")
+  # clean up line delimeters
+  content = fopen.read().replace("\r\n", "\n").replace("\r", "\n")
+  fopen.close()
+
+  return content
+
+def writeFile(filepath, data):
+  if type(data) in (list, tuple):
+    # convert data to string
+    data = "\n".join(data)
+
+  # replace rather than overwrite so that hard linked copies of the file are not modified
+  fopen = codecs.open(filepath + ".tmp", "w", "utf-8")
+  fopen.write(data)
+  fopen.close()
+  os.replace(filepath + ".tmp", filepath)
+
+def formatSize(size):
+  for unit in ("B", "KB", "MB"):
+    if size < 1024:
+      return "{:.0f}{}".format(size, unit) if unit == "B" else "{:.1f}{}".format(size, unit)
+    size /= 1024
+  return "{:.1f}GB".format(size)
+
+def formatCount(files, size):
+  if files == 0:
+    return "-"
+  return "{}/{}".format(files, formatSize(size))
+
+def getConfig(key, default=None):
+  if not os.path.isfile(file_conf):
+    printError("config not found: {}".format(file_conf))
+    return None
+
+  lines = readFile(file_conf).split("\n")
+  lidx = 0;
+  for line in lines:
+    lidx =+ 0
+    line = line.strip()
+    if not line or line.startswith("#"):
+      continue
+    if "=" not in line:
+      printWarning("malformed line in config ({}): {}".format(lidx, line))
+      continue
+    tmp = line.split("=", 1)
+    if key == tmp[0].strip():
+      return tmp[1].strip()
+  return default
+
+def readJsonLines(filepath):
+  # retrieves (line number, value) of each non-empty line
+  import json
+
+  values = []
+  lidx = 0
+  for line in readFile(filepath).split("\n"):
+    lidx += 1
+    line = line.strip()
+    if not line:
+      continue
+    try:
+      values.append((lidx, json.loads(line)))
+    except ValueError as e:
+      exitWithError("malformed JSON on line {} of {}: {}".format(lidx, filepath, e))
+  return values
+
+def readManifest(filepath):
+  import json
+
+  if not os.path.isfile(filepath):
+    return {}
+  try:
+    return json.loads(readFile(filepath))
+  except ValueError:
+    printWarning("ignoring malformed manifest: {}".format(filepath))
+    return {}
+
+def writeManifest(filepath, manifest):
+  import json
+
+  writeFile(filepath, json.dumps(manifest, indent=2, sort_keys=True))
+
+def fingerprintPath(hasher, _dir, path):
+  # adds file stats of path (recursively for directories) to hash
+  filepath = os.path.join(_dir, os.path.normpath(path))
+  if os.path.isdir(filepath):
+    for ROOT, DIRS, FILES in os.walk(filepath):
+      DIRS[:] = sorted(d for d in DIRS if d != "__pycache__")
+      for f in sorted(FILES):
+        fingerprintPath(hasher, _dir, os.path.join(ROOT, f))
+  elif os.path.isfile(filepath):
+    st = os.stat(filepath)
+    hasher.update("{}:{}:{}\n".format(os.path.relpath(filepath, _dir), st.st_mtime_ns,
+        st.st_size).encode("utf-8"))
+  else:
+    hasher.update("{}:missing\n".format(path).encode("utf-8"))
@@ -0,0 +1,67 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Python module requirements of targets.
+#
+# Modules required by the targets of a run are looked up before any target is started, modules
+# that were found are cached per interpreter so that following runs don't need to look them up.
+# Modules are only installed by the 'init' target.
+
+import importlib.util, os, sys
+
+from .common import readManifest, writeManifest
+
+
+# pip packages of modules with a different name
+packages = {
+  "PIL": "Pillow"
+}
+
+
+def getPackage(mod):
+  return packages.get(mod, mod)
+
+def getCacheFile(_dir):
+  return os.path.join(_dir, "build", "cache", "deps.json")
+
+def isAvailable(mod):
+  return importlib.util.find_spec(mod) is not None
+
+def check(mods, _dir):
+  # retrieves list of modules that are not available
+  if not mods:
+    return []
+  file_cache = getCacheFile(_dir)
+  cache = readManifest(file_cache)
+  interpreter = "{} ({})".format(sys.executable, sys.version.split()[0])
+  found = cache.get(interpreter, [])
+  missing = []
+  for mod in mods:
+    if mod in found:
+      continue
+    if isAvailable(mod):
+      found.append(mod)
+    else:
+      missing.append(mod)
+  if found != cache.get(interpreter):
+    cache[interpreter] = sorted(found)
+    if not os.path.isdir(os.path.dirname(file_cache)):
+      os.makedirs(os.path.dirname(file_cache))
+    writeManifest(file_cache, cache)
+  return missing
+
+def installModule(mod):
+  import subprocess
+
+  if isAvailable(mod):
+    return
+  print("\ninstalling {} module ...".format(mod))
+  subprocess.run((sys.executable, "-m", "pip", "install", getPackage(mod)))
+  importlib.invalidate_caches()
+  if not isAvailable(mod):
+    print("\nWARNING: failed to install '{}' module".format(mod))
@@ -0,0 +1,163 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Desktop app (Neutralinojs) targets.
+
+import os, re
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .archive import packMembers
+from .common import dir_root, getConfig, printWarning, readFile, writeFile
+from .files import cloneDir, copyDir, copyFile, deleteDir, makeDir, moveFile, runCommand
+from .profile import profiler
+
+
+def stageDesktop(_dir, verbose=False):
+  print("\nstaging desktop files ...")
+
+  dir_build = os.path.join(_dir, "build")
+  dir_web = os.path.join(dir_build, "web")
+  dir_neu = os.path.join(dir_build, "neutralinojs")
+  dir_app = os.path.join(dir_build, "desktop")
+  dir_doc = os.path.join(dir_app, "doc")
+  dir_res = os.path.join(dir_app, "resources")
+
+  if not os.path.isdir(dir_neu):
+    res = runCommand("npm", ("run", "stage-desktop"), False, "cmd")
+    if res != 0:
+      printWarning("call to 'npm' returned error")
+  else:
+    print("\nskipped Neutralinojs download, directory exists: {}".format(dir_neu))
+
+  deleteDir(dir_app, verbose)
+  makeDir(dir_app, verbose)
+  # resources are linked rather than copied, files rewritten below are replaced by writeFile
+  cloneDir(dir_web, dir_res, True, verbose)
+  copyFile(
+    os.path.join(dir_neu, "LICENSE"),
+    dir_app,
+    "LICENSE-neutralinojs.txt",
+    verbose
+  )
+  copyFile(
+    os.path.join(dir_res, "LICENSE.txt"),
+    os.path.join(dir_app, "LICENSE.txt"),
+    None, verbose
+  )
+  copyDir(
+    os.path.join(dir_neu, "bin"),
+    os.path.join(dir_app, "bin"),
+    None, verbose
+  )
+  copyFile(
+    os.path.join(dir_neu, "resources", "js", "neutralino.js"),
+    os.path.join(dir_res, "js", "neutralino.js"),
+    None, verbose
+  )
+  copyFile(
+    os.path.join(_dir, "neutralino.config.json"),
+    os.path.join(dir_app, "neutralino.config.json"),
+    None, verbose
+  )
+
+  # add Neutralinojs script to HTML
+  if verbose:
+    print("\nincorporating neutralino.js into index.html")
+  file_index = os.path.join(dir_res, "index.html")
+  lines_orig = readFile(file_index).split("\n")
+  lines = list(lines_orig)
+  for idx in range(len(lines)):
+    if lines[idx].strip() == "<head>":
+      lines.insert(idx+1, "  <script src=\"js/neutralino.js\"></script>")
+      break
+  if lines != lines_orig:
+    writeFile(file_index, lines)
+  # configuration is also included in script bundles
+  dir_script = os.path.join(dir_res, "script")
+  for filename in sorted(os.listdir(dir_script)):
+    if filename != "config.js" and not filename.endswith(".bundle.js"):
+      continue
+    file_config_js = os.path.join(dir_script, filename)
+    content = readFile(file_config_js)
+    changes = re.sub(
+      r"^config\[\"desktop\"\] ?= ?false",
+      "config[\"desktop\"] = true",
+      content, 1, re.M
+    )
+    if changes != content:
+      writeFile(file_config_js, changes)
+      if verbose:
+        print("updated file '{}'".format(file_config_js))
+
+def runDesktop(_dir, verbose=False):
+  print("\nrunning desktop app ...")
+
+  dir_app = os.path.join(_dir, "build", "desktop")
+  ret = runCommand("npm", ("exec", "neu", "run"), winext="cmd", cwd=dir_app)
+
+def _packageDist(dir_dist_temp, distname, ext="", verbose=False):
+  if verbose:
+    print("packaging {} ...".format(distname))
+
+  app_ver = getConfig("version")
+  dir_app = os.path.dirname(dir_dist_temp)
+  dir_neu_dist = os.path.join(dir_dist_temp, "chargen")
+  members = [
+    (os.path.join(dir_neu_dist, "chargen-{}{}".format(distname, ext)), "chargen" + ext, 0o775),
+    (os.path.join(dir_neu_dist, "resources.neu"), "resources.neu")
+  ]
+  # ~ if ext == ".exe":
+    # ~ members.append((os.path.join(dir_neu_dist, "WebView2Loader.dll"), "WebView2Loader.dll"))
+  dir_doc = os.path.join(dir_app, "resources", "doc")
+  for ROOT, DIRS, FILES in os.walk(dir_doc):
+    for f in FILES:
+      f = os.path.join(ROOT, f)
+      members.append((f, os.path.join("doc", os.path.relpath(f, dir_doc))))
+  for filename in ("LICENSE.txt", "LICENSE-neutralinojs.txt"):
+    members.append((os.path.join(dir_app, filename), filename))
+  members.append((os.path.join(dir_root, "README.md"), "README.md"))
+  packMembers(os.path.join(dir_dist_temp, "chargen_{}_{}.zip".format(app_ver, distname)), members,
+      verbose)
+
+def distDesktop(_dir, verbose=False):
+  print("\ncreating desktop app distribution ...")
+
+  dir_build = os.path.join(_dir, "build")
+  dir_app = os.path.join(dir_build, "desktop")
+  dir_dist_temp = os.path.join(dir_app, "dist")
+
+  runCommand("npm", ("exec", "neu", "build", "--release"), winext="cmd", cwd=dir_app)
+
+  platforms = (
+    ("linux_arm64", ""),
+    ("linux_armhf", ""),
+    ("linux_x64", ""),
+    ("mac_arm64", ""),
+    ("mac_x64", ""),
+    ("win_x64", ".exe")
+  )
+  # platforms are packaged concurrently, compression releases the GIL
+  executor = ThreadPoolExecutor(max_workers=min(len(platforms), os.cpu_count() or 1))
+  futures = [executor.submit(profiler.wrap(_packageDist), dir_dist_temp, distname, ext, verbose)
+      for distname, ext in platforms]
+  try:
+    for future in futures:
+      future.result()
+  finally:
+    executor.shutdown(wait=True, cancel_futures=True)
+
+  dir_dist = os.path.join(dir_build, "dist")
+  if not os.path.isdir(dir_dist):
+    makeDir(dir_dist, verbose)
+  for obj in os.listdir(dir_dist_temp):
+    objpath = os.path.join(dir_dist_temp, obj)
+    if os.path.isfile(objpath):
+      moveFile(objpath, dir_dist, obj, verbose)
+
+  deleteDir(dir_dist_temp, verbose)
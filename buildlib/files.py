@@ -0,0 +1,379 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# File operations.
+
+import errno, fnmatch, hashlib, os, shutil, sys
+
+from .common import exitWithError
+from .profile import profiler
+
+
+def checkTargetNotExists(target, action=None, add_parent=False):
+  err = errno.EEXIST
+  msg = ""
+  if action:
+    msg += "cannot " + action + ", "
+
+  if os.path.exists(target):
+    if os.path.isdir(target):
+      err = errno.EISDIR
+      msg += "directory"
+    else:
+      msg += "file"
+    msg += " exists: {}".format(target)
+    exitWithError(msg, err)
+
+  if add_parent:
+    dir_parent = os.path.dirname(target)
+    if not os.path.exists(dir_parent):
+      os.makedirs(dir_parent)
+    elif not os.path.isdir(dir_parent):
+      exitWithError("cannot create directory, file exists: {}".format(dir_parent), err)
+
+def checkTargetNotDir(target, action=None):
+  msg = ""
+  if action:
+    msg += "cannot " + action + ", "
+
+  if os.path.exists(target) and os.path.isdir(target):
+    exitWithError(msg + "directory exists: {}".format(target), errno.EISDIR)
+
+def checkFileSourceExists(source, action=None):
+  msg = ""
+  if action:
+    msg += "cannot " + action + " file, "
+
+  if not os.path.exists(source):
+    msg += "source does not exist: {}".format(source)
+    exitWithError(msg, errno.ENOENT)
+  if os.path.isdir(source):
+    msg += "source is a directory: {}".format(source)
+    exitWithError(msg, errno.EISDIR)
+
+def checkDirSourceExists(source, action=None):
+  msg = ""
+  if action:
+    msg += "cannot " + action + " directory, "
+
+  if not os.path.exists(source):
+    msg += "source does not exist: {}".format(source)
+    exitWithError(msg, errno.ENOENT)
+  if not os.path.isdir(source):
+    msg += "source is a file: {}".format(source)
+    exitWithError(msg, errno.EEXIST)
+
+def makeDir(dirpath, verbose=False):
+  checkTargetNotExists(dirpath, "create directory")
+  os.makedirs(dirpath)
+  if not os.path.isdir(dirpath):
+    exitWithError("failed to create directory, an unknown error occured: {}".format(dirpath))
+  if verbose:
+    print("new directory '{}'".format(dirpath))
+
+def deleteFile(filepath, verbose=False):
+  if os.path.exists(filepath):
+    if os.path.isdir(filepath):
+      exitWithError("cannot delete file, directory exists: {}".format(filepath), errno.EISDIR)
+    if profiler.enabled:
+      profiler.count(files_deleted=1, bytes_deleted=os.path.getsize(filepath))
+    os.remove(filepath)
+    if os.path.exists(filepath):
+      exitWithError("failed to delete file, an unknown error occured: {}".format(filepath))
+    if verbose:
+      print("delete '{}'".format(filepath))
+
+def deleteDir(dirpath, verbose=False):
+  with profiler.span("deleteDir", "file", {"path": dirpath}):
+    _deleteDir(dirpath, verbose)
+
+def _deleteDir(dirpath, verbose=False):
+  if os.path.exists(dirpath):
+    if not os.path.isdir(dirpath):
+      exitWithError("cannot delete directory, file exists: {}".format(dirpath), errno.EEXIST)
+    for obj in os.listdir(dirpath):
+      objpath = os.path.join(dirpath, obj)
+      if not os.path.isdir(objpath):
+        deleteFile(objpath, verbose)
+      else:
+        deleteDir(objpath, verbose)
+    if len(os.listdir(dirpath)) != 0:
+      exitWithError("failed to delete directory, not empty: {}".format(dirpath))
+    os.rmdir(dirpath)
+    if os.path.exists(dirpath):
+      exitWithError("failed to delete directory, an unknown error occurred: {}".format(dirpath))
+    if verbose:
+      print("delete '{}'".format(dirpath))
+
+def copyFile(source, target, name=None, verbose=False):
+  if name:
+    target = os.path.join(target, name)
+  checkFileSourceExists(source, "copy")
+  checkTargetNotExists(target, "copy file", True)
+  shutil.copyfile(source, target)
+  if not os.path.exists(target):
+    exitWithError("failed to copy file, an unknown error occurred: {}".format(target))
+  if profiler.enabled:
+    profiler.count(files_copied=1, bytes_copied=os.path.getsize(target))
+  if verbose:
+    print("copy '{}' -> '{}'".format(source, target))
+
+def copyExecutable(source, target, name=None, verbose=False):
+  copyFile(source, target, name, verbose)
+  os.chmod(target, 0o775)
+
+def copyDir(source, target, name=None, verbose=False):
+  if name:
+    target = os.path.join(target, name)
+  with profiler.span("copyDir", "file", {"source": source, "target": target}):
+    _copyDir(source, target, verbose)
+
+def _copyDir(source, target, verbose=False):
+  checkDirSourceExists(source, "copy")
+  checkTargetNotExists(target, "copy directory")
+  makeDir(target, False)
+  if not os.path.isdir(target):
+    exitWithError("failed to copy directory, an unknown error occurred: {}".format(target))
+  if verbose:
+    print("copy '{}' -> '{}'".format(source, target))
+  for obj in os.listdir(source):
+    objsource = os.path.join(source, obj)
+    objtarget = os.path.join(target, obj)
+    if not os.path.isdir(objsource):
+      copyFile(objsource, objtarget, None, verbose)
+    else:
+      _copyDir(objsource, objtarget, verbose)
+
+# Linux ioctl request to share extents of one file with another (copy-on-write)
+FICLONE = 0x40049409
+# clone methods that failed indexed by (source device, target device)
+clone_unsupported = {}
+
+def cloneFile(source, target, hardlink=False):
+  # copies file without duplicating data when filesystem allows it, returns method used
+  # NOTE: hard linked targets share content with source, they must only be replaced & never
+  #       written to in place (see writeFile)
+  st = os.stat(source)
+  if profiler.enabled:
+    profiler.count(files_copied=1, bytes_copied=st.st_size)
+  devices = (st.st_dev, os.stat(os.path.dirname(target) or ".").st_dev)
+  unsupported = clone_unsupported.setdefault(devices, set())
+  if "reflink" not in unsupported and sys.platform.startswith("linux"):
+    import fcntl
+    fsource = open(source, "rb")
+    ftarget = open(target, "wb")
+    try:
+      fcntl.ioctl(ftarget.fileno(), FICLONE, fsource.fileno())
+      return "reflink"
+    except OSError:
+      unsupported.add("reflink")
+    finally:
+      fsource.close()
+      ftarget.close()
+    os.remove(target)
+  if hardlink and "hardlink" not in unsupported:
+    try:
+      os.link(source, target)
+      return "hardlink"
+    except OSError as e:
+      if e.errno == errno.EEXIST:
+        raise
+      unsupported.add("hardlink")
+  if "copy_file_range" not in unsupported and hasattr(os, "copy_file_range"):
+    fsource = open(source, "rb")
+    ftarget = open(target, "wb")
+    try:
+      while os.copy_file_range(fsource.fileno(), ftarget.fileno(), 1 << 30) > 0:
+        pass
+      return "copy_file_range"
+    except OSError:
+      unsupported.add("copy_file_range")
+    finally:
+      fsource.close()
+      ftarget.close()
+    os.remove(target)
+  shutil.copyfile(source, target)
+  return "copy"
+
+def cloneDir(source, target, hardlink=False, verbose=False, methods=None):
+  # copies directory tree using cloneFile, returns table of method -> file count
+  checkDirSourceExists(source, "copy")
+  checkTargetNotExists(target, "copy directory")
+  if methods is None:
+    methods = {}
+  os.makedirs(target)
+  with profiler.span("cloneDir", "file", {"source": source, "target": target}), \
+      os.scandir(source) as entries:
+    for entry in entries:
+      objtarget = os.path.join(target, entry.name)
+      if entry.is_dir():
+        cloneDir(entry.path, objtarget, hardlink, False, methods)
+      else:
+        method = cloneFile(entry.path, objtarget, hardlink)
+        methods[method] = methods.get(method, 0) + 1
+  if verbose:
+    print("copy '{}' -> '{}' ({})".format(source, target, ", ".join("{} {}".format(count, method)
+        for method, count in sorted(methods.items()))))
+  return methods
+
+def moveFile(source, target, name=None, verbose=False):
+  if name:
+    target = os.path.join(target, name)
+  checkFileSourceExists(source, "move")
+  checkTargetNotExists(target, "move file", True)
+  shutil.move(source, target)
+  if os.path.exists(source) or not os.path.exists(target):
+    exitWithError("failed to move file, an unknown error occurred: {}".format(target))
+  if verbose:
+    print("move '{}' -> '{}'".format(source, target))
+
+def moveDir(source, target, name=None, verbose=False):
+  if name:
+    target = os.path.join(target, name)
+  checkDirSourceExists(source, "move")
+  checkTargetNotExists(target, "move directory")
+  makeDir(target, False)
+  if not os.path.isdir(target):
+    exitWithError("failed to move directory, an unknown error occurred: {}".format(target))
+  for obj in os.listdir(source):
+    objsource = os.path.join(source, obj)
+    objtarget = os.path.join(target, obj)
+    if not os.path.isdir(objsource):
+      moveFile(objsource, objtarget, None, verbose)
+    else:
+      moveDir(objsource, objtarget, None, verbose)
+  deleteDir(source, False)
+  if verbose:
+    print("move '{}' -> '{}'".format(source, target))
+
+def downloadFile(url, filename, verbose=False):
+  if verbose:
+    print("\ndownloading file from {} ...".format(url))
+
+  dir_target = os.path.join(os.getcwd(), "temp")
+  if not os.path.exists(dir_target):
+    os.makedirs(dir_target)
+  if not os.path.isdir(dir_target):
+    exitWithError("cannot download to temp directory, file exists: {}".format(dir_target), errno.EEXIST)
+
+  file_target = os.path.join(dir_target, filename)
+  if os.path.exists(file_target):
+    print("{} exists, delete to re-download".format(file_target))
+    return
+
+  import wget
+  from urllib.error import HTTPError
+
+  try:
+    wget.download(url, file_target)
+  except HTTPError:
+    exitWithError("could not download file from: {}".format(url))
+
+def runCommand(cmd, args=[], failOnError=True, winext=None, cwd=None):
+  import subprocess
+
+  if sys.platform == "win32" and winext:
+    cmd = cmd + "." + winext
+  args = [cmd] + list(args)
+  try:
+    with profiler.span(" ".join(args), "subprocess"):
+      res = subprocess.run(args, cwd=cwd)
+    if res.returncode != 0 and failOnError:
+      exitWithError("called process exited with error: {}".format(" ".join(args)), res.returncode)
+    return res.returncode
+  except FileNotFoundError:
+    exitWithError("the system could not find file to execute: {}".format(cmd), errno.ENOENT)
+  return 0
+
+def hashFile(filepath):
+  hasher = hashlib.sha1()
+  fopen = open(filepath, "rb")
+  for chunk in iter(lambda: fopen.read(65536), b""):
+    hasher.update(chunk)
+  fopen.close()
+  return hasher.hexdigest()
+
+def getStatKey(filepath):
+  st = os.stat(filepath)
+  return [st.st_mtime_ns, st.st_size]
+
+def isExcluded(relpath, patterns):
+  for pattern in patterns:
+    if fnmatch.fnmatch(relpath, pattern):
+      return True
+  return False
+
+def listStageFiles(_dir, files, dirs, exclude=[]):
+  # retrieves paths relative to _dir of all files to be staged
+  staged = []
+  for f in files:
+    if f and not isExcluded(f, exclude):
+      staged.append(f)
+  for d in dirs:
+    if not d:
+      continue
+    dir_source = os.path.join(_dir, d)
+    checkDirSourceExists(dir_source, "stage")
+    for ROOT, DIRS, FILES in os.walk(dir_source):
+      for f in FILES:
+        relpath = os.path.relpath(os.path.join(ROOT, f), _dir).replace(os.sep, "/")
+        if not isExcluded(relpath, exclude):
+          staged.append(relpath)
+  return staged
+
+def syncFiles(_dir, relpaths, dir_target, entries_old={}, verbose=False):
+  # copies new & changed files, returns manifest entries & list of copied files
+  entries = {}
+  changed = []
+  for relpath in relpaths:
+    source = os.path.join(_dir, os.path.normpath(relpath))
+    target = os.path.join(dir_target, os.path.normpath(relpath))
+    checkFileSourceExists(source, "stage")
+    source_key = getStatKey(source)
+    entry = entries_old.get(relpath)
+    if entry and os.path.isfile(target) and getStatKey(target) == entry["target"]:
+      if source_key == entry["source"]:
+        entries[relpath] = entry
+        continue
+      digest = hashFile(source)
+      if digest == entry["hash"]:
+        entries[relpath] = dict(entry, source=source_key)
+        continue
+    else:
+      digest = hashFile(source)
+
+    deleteFile(target, False)
+    checkTargetNotExists(target, "stage file", True)
+    # source tree is never hard linked so that editing a staged file cannot alter sources
+    method = cloneFile(source, target)
+    if verbose:
+      print("{} '{}' -> '{}'".format(method, source, target))
+    entries[relpath] = {"hash": digest, "source": source_key, "target": getStatKey(target)}
+    changed.append(relpath)
+  return entries, changed
+
+def isGeneratedStale(dir_target, gen, gen_old):
+  if not gen_old or gen_old["input"] != gen["input"] or len(gen_old["outputs"]) == 0:
+    return True
+  for relpath in gen_old["outputs"]:
+    if not os.path.isfile(os.path.join(dir_target, os.path.normpath(relpath))):
+      return True
+  return False
+
+def removeStale(dir_target, keep, verbose=False):
+  # deletes files not listed in keep & any directories left empty, returns number of files deleted
+  removed = 0
+  for ROOT, DIRS, FILES in os.walk(dir_target, topdown=False):
+    for f in FILES:
+      filepath = os.path.join(ROOT, f)
+      if os.path.relpath(filepath, dir_target).replace(os.sep, "/") not in keep:
+        deleteFile(filepath, verbose)
+        removed += 1
+    if ROOT != dir_target and len(os.listdir(ROOT)) == 0:
+      os.rmdir(ROOT)
+  return removed
@@ -0,0 +1,119 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Layer processing targets.
+
+import errno, os
+
+from .common import exitWithError, options, readJsonLines
+
+
+def cacheLayers(_dir, verbose=False):
+  from chargen import bounds, layercache
+
+  print("\ncaching decoded layers ...")
+
+  dir_cache = os.path.join(_dir, "build", "cache", "layers")
+  refreshed = layercache.update(os.path.join(_dir, "assets"), dir_cache, verbose)
+  if len(refreshed) == 0:
+    print("layer cache up to date: {}".format(dir_cache))
+  else:
+    print("decoded {} layers into cache: {}".format(len(refreshed), dir_cache))
+
+  # opaque frame bounds are indexed alongside cached layers so that compositing can skip empty space
+  refreshed = bounds.update(os.path.join(_dir, "assets"), dir_cache, verbose)
+  if len(refreshed) > 0:
+    print("indexed opaque bounds of {} layers: {}".format(len(refreshed),
+        os.path.join(dir_cache, bounds.file_index)))
+
+def upscaleLayers(_dir, verbose=False):
+  from chargen import scalex
+
+  print("\nupscaling layers ...")
+
+  dir_upscale = os.path.join(_dir, "build", "cache", "upscale")
+  for factor in (2, 3):
+    dir_target = os.path.join(dir_upscale, "{}x".format(factor))
+    try:
+      refreshed = scalex.update(os.path.join(_dir, "assets"), dir_target, factor, verbose)
+    except ValueError as e:
+      exitWithError("failed to upscale layers: {}".format(e))
+    if len(refreshed) == 0:
+      print("upscaled layers up to date: {}".format(dir_target))
+    else:
+      print("upscaled {} layers by {}x into: {}".format(len(refreshed), factor, dir_target))
+
+def downscaleLayers(_dir, verbose=False):
+  from chargen import downscale
+
+  print("\ndownscaling {} layers to {} ...".format(downscale.source_size, downscale.target_size))
+
+  dir_assets = os.path.join(_dir, "assets")
+  dir_target = options["output"] or os.path.join(_dir, "build", "cache", "downscale")
+  categories = None
+  if options["categories"]:
+    categories = [c.strip().strip("/") for c in options["categories"].split(",") if c.strip()]
+  try:
+    refreshed = downscale.update(dir_assets, dir_target, categories, verbose)
+  except ValueError as e:
+    exitWithError("failed to downscale layers: {}".format(e))
+  if len(refreshed) == 0:
+    print("downscaled layers up to date: {}".format(dir_target))
+  else:
+    print("downscaled {} layers into: {}".format(len(refreshed), dir_target))
+
+  if options["update-layers"]:
+    installed = downscale.install(dir_assets, dir_target, categories, verbose)
+    if len(installed) == 0:
+      print("no {} layers missing from assets".format(downscale.target_size))
+    else:
+      print("added {} layers to assets & updated counts in layers.json".format(len(installed)))
+
+def recolorLayers(_dir, verbose=False):
+  from chargen import palette
+
+  file_variants = options["input"]
+  if not file_variants:
+    exitWithError("recolor requires a variants file (--input=<file>)", usage=True)
+  if not os.path.isfile(file_variants):
+    exitWithError("cannot recolor, variants file not found: {}".format(file_variants),
+        errno.ENOENT)
+
+  print("\nrecoloring layers ...")
+
+  # one JSON variant per line, e.g. {"name": "redhead", "colors": {"hair": "red"}}
+  dir_recolor = options["output"] or os.path.join(_dir, "build", "cache", "recolor")
+  for lidx, variant in readJsonLines(file_variants):
+    colors = variant.get("colors", {})
+    name = variant.get("name") or "-".join("{}-{}".format(c, colors[c]) for c in sorted(colors))
+    dir_target = os.path.join(dir_recolor, name)
+    try:
+      refreshed = palette.update(os.path.join(_dir, "assets"), dir_target, colors, verbose)
+    except (ValueError, KeyError) as e:
+      exitWithError("failed to recolor variant on line {}: {}".format(lidx, e))
+    if len(refreshed) == 0:
+      print("variant '{}' up to date: {}".format(name, dir_target))
+    else:
+      print("recolored {} layers for variant '{}': {}".format(len(refreshed), name, dir_target))
+
+def checkSources(_dir, verbose=False):
+  from chargen import sources
+
+  print("\nchecking asset sources ...")
+
+  dir_assets = os.path.join(_dir, "assets")
+  report, count, parsed = sources.check(dir_assets, os.path.join(_dir, "build", "cache"))
+  if verbose:
+    print("parsed {} of {} sources ({} retrieved from cache)".format(parsed, count,
+        count - parsed))
+  if not report:
+    print("{} sources & their exported images are consistent".format(count))
+    return
+  for source in report:
+    print("\n{}:\n  {}".format(source, "\n  ".join(report[source])))
+  exitWithError("found problems with {} of {} sources".format(len(report), count))
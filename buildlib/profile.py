@@ -0,0 +1,139 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Timing & file operation counters of targets.
+
+import os, threading, time
+
+from .common import formatCount
+
+
+class Profiler:
+  # counters recorded for each target
+  counters = ("files_copied", "bytes_copied", "files_zipped", "bytes_zipped", "files_deleted",
+      "bytes_deleted", "subprocesses", "subprocess_time")
+
+  def __init__(self):
+    self.enabled = False
+    self.tracing = False
+    self.lock = threading.Lock()
+    # current target & nesting depth of spans per thread
+    self.local = threading.local()
+    self.stats = {}
+    self.events = []
+    self.time_origin = time.perf_counter()
+
+  def getTarget(self):
+    return getattr(self.local, "target", None)
+
+  def getStats(self, name):
+    if name not in self.stats:
+      self.stats[name] = dict({"wall": 0.0, "cpu": 0.0}, **{c: 0 for c in self.counters})
+    return self.stats[name]
+
+  def count(self, **amounts):
+    if not self.enabled:
+      return
+    with self.lock:
+      stats = self.getStats(self.getTarget() or "(none)")
+      for key, amount in amounts.items():
+        stats[key] += amount
+
+  def addEvent(self, name, cat, time_start, time_end, args=None):
+    event = {
+      "name": name,
+      "cat": cat,
+      "ph": "X",
+      "ts": round((time_start - self.time_origin) * 1000000),
+      "dur": round((time_end - time_start) * 1000000),
+      "pid": os.getpid(),
+      "tid": threading.get_ident()
+    }
+    if args:
+      event["args"] = args
+    with self.lock:
+      self.events.append(event)
+
+  def target(self, name):
+    return ProfileSpan(self, name, "target")
+
+  def span(self, name, cat, args=None):
+    return ProfileSpan(self, name, cat, args)
+
+  def wrap(self, func):
+    # binds function to current target so that work done in worker threads is attributed to it
+    name = self.getTarget()
+    def wrapped(*args, **kwargs):
+      self.local.target = name
+      try:
+        return func(*args, **kwargs)
+      finally:
+        self.local.target = None
+    return wrapped
+
+  def printSummary(self):
+    columns = ("wall", "cpu", "copied", "zipped", "deleted", "subproc")
+    print("\n{:<16}{:>9}{:>9}{:>16}{:>16}{:>16}{:>9}".format("target", *columns))
+    for name, stats in self.stats.items():
+      print("{:<16}{:>8.2f}s{:>8.2f}s{:>16}{:>16}{:>16}{:>8.2f}s".format(name, stats["wall"],
+          stats["cpu"], formatCount(stats["files_copied"], stats["bytes_copied"]),
+          formatCount(stats["files_zipped"], stats["bytes_zipped"]),
+          formatCount(stats["files_deleted"], stats["bytes_deleted"]), stats["subprocess_time"]))
+
+  def writeTrace(self, filepath):
+    import json
+
+    dir_parent = os.path.dirname(os.path.abspath(filepath))
+    if not os.path.isdir(dir_parent):
+      os.makedirs(dir_parent)
+    fopen = open(filepath, "w", encoding="utf-8")
+    json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, fopen)
+    fopen.close()
+
+class ProfileSpan:
+  # context manager timing a target or an operation, nested operations of the same category are
+  # included in the outermost span only
+  def __init__(self, profiler, name, cat, args=None):
+    self.profiler = profiler
+    self.name = name
+    self.cat = cat
+    self.args = args
+
+  def __enter__(self):
+    prof = self.profiler
+    if not prof.enabled:
+      return self
+    depths = prof.local.__dict__.setdefault("depths", {})
+    self.outer = depths.get(self.cat, 0) == 0
+    depths[self.cat] = depths.get(self.cat, 0) + 1
+    if self.cat == "target":
+      self.parent = prof.getTarget()
+      prof.local.target = self.name
+    self.time_start = time.perf_counter()
+    self.cpu_start = time.thread_time()
+    return self
+
+  def __exit__(self, exc_type, exc_value, tb):
+    prof = self.profiler
+    if not prof.enabled:
+      return
+    time_end = time.perf_counter()
+    prof.local.depths[self.cat] -= 1
+    if self.cat == "target":
+      prof.local.target = self.parent
+      with prof.lock:
+        stats = prof.getStats(self.name)
+        stats["wall"] += time_end - self.time_start
+        # CPU time of the thread running the target (worker processes are not included)
+        stats["cpu"] += time.thread_time() - self.cpu_start
+    elif self.cat == "subprocess":
+      prof.count(subprocesses=1, subprocess_time=time_end - self.time_start)
+    if prof.tracing and (self.outer or self.cat == "target"):
+      prof.addEvent(self.name, self.cat, self.time_start, time_end, self.args)
+
+profiler = Profiler()
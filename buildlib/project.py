@@ -0,0 +1,89 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Project maintenance targets.
+
+import errno, os, re
+
+from .common import dir_root, exitWithError, getConfig, readFile, writeFile
+from .files import deleteDir
+
+
+def init(_dir, verbose=False):
+  from .deps import installModule
+
+  installModule("wget")
+  installModule("markdown")
+  installModule("numpy")
+  installModule("PIL")
+
+def clean(_dir, verbose=False):
+  print("\ncleaning build files ...")
+
+  dir_build = os.path.join(_dir, "build")
+  if os.path.exists(dir_build):
+    if not os.path.isdir(dir_build):
+      exitWithError("cannot remove build directory, file exists: {}".format(dir_build), errno.EEXIST)
+
+    deleteDir(dir_build, verbose)
+    return
+  print("no files to remove")
+
+def updateVersion(_dir, verbose=False):
+  app_ver = getConfig("version")
+
+  print("\nchargen version {}".format(app_ver))
+
+  file_config_js = os.path.join(_dir, "script", "config.js")
+  contents = readFile(file_config_js)
+  changes = re.sub(
+    r"^config\[\"version\"\] = .*;$",
+    "config[\"version\"] = \"{}\";".format(app_ver),
+    contents, 1, re.M)
+  if changes != contents:
+    writeFile(file_config_js, changes)
+    if verbose:
+      print("updated file '{}'".format(file_config_js))
+
+  file_changelog = os.path.join(_dir, "doc", "changelog.txt")
+  contents = readFile(file_changelog)
+  changes = re.sub(r"^next$", app_ver, contents, 1, re.M)
+  if changes != contents:
+    writeFile(file_changelog, changes)
+    if verbose:
+      print("updated file '{}'".format(file_changelog))
+
+  file_config_neu = os.path.join(_dir, "neutralino.config.json")
+  contents = readFile(file_config_neu)
+  changes = re.sub(
+    r"\"version\": .*,$",
+    "\"version\": \"{}\",".format(app_ver),
+    contents, 1, re.M
+  )
+  if changes != contents:
+    writeFile(file_config_neu, changes)
+    if verbose:
+      print("updated file '{}'".format(file_config_neu))
+
+def printChanges(_dir, verbose=False):
+  changelog = getConfig("changelog")
+  if not changelog:
+    exitWithError("cannot parse changelog, 'changelog' not configured in build.conf")
+  changelog = os.path.join(dir_root, os.path.normpath(changelog))
+  if not os.path.isfile(changelog):
+    exitWithError("cannot parse changelog, file not found: {}".format(changelog), errno.ENOENT)
+  lines = []
+  started = False
+  for li in readFile(changelog).split("\n"):
+    if started and not li:
+      break
+    if not started and li and not li.startswith("-"):
+      started = True
+    elif started and li:
+      lines.append(li)
+  print("\n".join(lines))
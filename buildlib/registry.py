@@ -0,0 +1,90 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Targets available to build.py. Actions are referenced as "<module>:<function>" of this
+# package so that target code is only imported when run.
+
+from .common import getConfig, options
+from .runner import targets
+
+
+# modules required to decode & composite images
+imaging = ("numpy", "PIL")
+
+
+def getStageSources():
+  return getConfig("stage_files", "").split(";") + getConfig("stage_dirs", "").split(";")
+
+def getDistDesktopFiles():
+  app_ver = getConfig("version")
+  return ["build/dist/chargen_{}_{}.zip".format(app_ver, p) for p in ("linux_arm64", "linux_armhf",
+      "linux_x64", "mac_arm64", "mac_x64", "win_x64")]
+
+
+targets.add("init", "project:init")
+targets.add("clean", "project:clean")
+targets.add("update-version", "project:updateVersion", fingerprint={
+  "inputs": ("script/config.js", "doc/changelog.txt", "neutralino.config.json"),
+  "config": ("version",)
+})
+targets.add("stage-web", "web:stageWeb", ("update-version",), {
+  "inputs": getStageSources,
+  "outputs": ("build/web",),
+  "config": ("stage_files", "stage_dirs", "stage_exclude", "stage_fingerprint"),
+  "options": ("web-dist",)
+}, requires=("markdown",) + imaging)
+targets.add("watch", "watch:watch", ("stage-web",), requires=("markdown",) + imaging)
+targets.add("dist-web", "web:distWeb", ("stage-web",), {
+  "inputs": ("build/web", "README.md"),
+  "outputs": lambda: ["build/dist/chargen_{}_web.zip".format(getConfig("version"))],
+  "config": ("version",)
+})
+targets.add("stage-desktop", "desktop:stageDesktop", ("stage-web",), {
+  "inputs": ("build/web", "build/neutralinojs", "neutralino.config.json"),
+  "outputs": ("build/desktop/resources", "build/desktop/bin")
+})
+targets.add("run-desktop", "desktop:runDesktop", ("stage-desktop",))
+targets.add("dist-desktop", "desktop:distDesktop", ("stage-desktop",), {
+  "inputs": ("build/desktop/resources", "build/desktop/bin", "build/desktop/neutralino.config.json",
+      "README.md"),
+  "outputs": getDistDesktopFiles,
+  "config": ("version",)
+})
+targets.add("print-changes", "project:printChanges")
+targets.add("cache-layers", "layers:cacheLayers", fingerprint={
+  "inputs": ("assets",),
+  "outputs": ("build/cache/layers",)
+}, requires=imaging)
+targets.add("check-sources", "layers:checkSources")
+targets.add("upscale-layers", "layers:upscaleLayers", fingerprint={
+  "inputs": ("assets",),
+  "outputs": ("build/cache/upscale",)
+}, requires=imaging)
+targets.add("downscale", "layers:downscaleLayers", fingerprint={
+  "inputs": ("assets",),
+  "outputs": lambda: [options["output"] or "build/cache/downscale"],
+  "options": ("output", "categories", "update-layers")
+}, requires=imaging)
+targets.add("recolor", "layers:recolorLayers", fingerprint={
+  "inputs": lambda: ["assets"] + ([options["input"]] if options["input"] else []),
+  "outputs": lambda: [options["output"] or "build/cache/recolor"],
+  "options": ("input", "output")
+}, requires=imaging)
+targets.add("serve", "render:serve", ("cache-layers",), requires=imaging)
+targets.add("export", "render:exportCatalog", ("cache-layers",), requires=imaging)
+targets.add("animate", "render:animate", fingerprint={
+  "inputs": lambda: [options["input"] or "build/render"],
+  "outputs": lambda: [options["output"] or "build/animation"],
+  "options": ("input", "output", "animation")
+}, requires=imaging)
+targets.add("bench", "bench:bench", requires=("markdown",) + imaging)
+targets.add("render", "render:render", ("cache-layers",), {
+  "inputs": lambda: ["assets"] + ([options["input"]] if options["input"] else []),
+  "outputs": lambda: [options["output"] or "build/render"],
+  "options": ("input", "output", "cache-size")
+}, requires=imaging)
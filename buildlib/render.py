@@ -0,0 +1,182 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Sheet rendering targets.
+
+import errno, os, re, time
+
+from .common import exitWithError, options, readJsonLines
+from .files import makeDir
+
+
+def openSheetCache(_dir, comp):
+  # retrieves persistent composite cache or None if disabled
+  from chargen import sheetcache
+
+  if options["cache-size"] == 0:
+    return None
+  return sheetcache.SheetCache(os.path.join(_dir, "build", "cache", "sheets"), comp,
+      options["cache-size"] * 1024 * 1024)
+
+def render(_dir, verbose=False):
+  from chargen import compositor, layercache
+
+  file_selections = options["input"]
+  if not file_selections:
+    exitWithError("render requires a selections file (--input=<file>)", usage=True)
+  if not os.path.isfile(file_selections):
+    exitWithError("cannot render, selections file not found: {}".format(file_selections),
+        errno.ENOENT)
+
+  print("\nrendering character sheets ...")
+
+  dir_render = options["output"] or os.path.join(_dir, "build", "render")
+  if not os.path.exists(dir_render):
+    makeDir(dir_render, verbose)
+
+  # one JSON selection per line in same format passed to PreviewGenerator.set
+  # selections may include colors table of category -> ramp (see assets/palettes.json)
+  selections = []
+  names = []
+  for lidx, selection in readJsonLines(file_selections):
+    selections.append(selection)
+    names.append(selection.get("name", "{:06d}".format(lidx)))
+
+  time_start = time.time()
+  sidx = 0
+  sheet_cache = None
+  try:
+    layer_cache = layercache.LayerCache(os.path.join(_dir, "build", "cache", "layers"))
+    comp = compositor.Compositor(os.path.join(_dir, "assets"), layer_cache)
+    sheet_cache = openSheetCache(_dir, comp)
+    for selection in selections:
+      file_sheet = os.path.join(dir_render, names[sidx] + ".png")
+      # unchanged sheets are copied from cache without decoding or blending
+      data = sheet_cache.get(selection) if sheet_cache else None
+      if data is None:
+        data = compositor.encodeImage(comp.render(selection))
+        if sheet_cache:
+          sheet_cache.put(selection, data)
+      elif verbose:
+        print("cached '{}'".format(file_sheet))
+      fopen = open(file_sheet, "wb")
+      fopen.write(data)
+      fopen.close()
+      if verbose:
+        print("render '{}'".format(file_sheet))
+      sidx += 1
+  except (ValueError, KeyError, OSError) as e:
+    exitWithError("failed to render sheet '{}': {}".format(names[sidx], e))
+  finally:
+    if sheet_cache:
+      sheet_cache.close()
+  time_diff = max(time.time() - time_start, 0.001)
+  print("rendered {} sheets ({:.1f} sheets/s)".format(sidx, sidx / time_diff))
+  if sheet_cache:
+    stats = sheet_cache.getStats()
+    print("{} sheets retrieved from cache ({} invalidated, {} evicted)".format(stats["hits"],
+        stats["invalidated"], stats["evictions"]))
+
+def serve(_dir, verbose=False):
+  import asyncio
+  from chargen import layercache, server
+
+  service = server.RenderService(os.path.join(_dir, "assets"),
+      layercache.LayerCache(os.path.join(_dir, "build", "cache", "layers")))
+  service.sheet_cache = openSheetCache(_dir, service.compositor)
+
+  def started(srv):
+    for sock in srv.sockets:
+      host, port = sock.getsockname()[:2]
+      print("\nrender service listening on http://{}:{}/ (stop with Ctrl+C)".format(host, port))
+
+  try:
+    asyncio.run(service.serve(options["host"], options["port"], started))
+  except KeyboardInterrupt:
+    pass
+  except OSError as e:
+    exitWithError("failed to start render service: {}".format(e))
+  finally:
+    service.close()
+  stats = service.getStats()
+  print("\nserved {} requests, rendered {} sheets ({} sheet cache hits, {} layer cache hits)".format(
+      stats["requests"], stats["rendered"], stats["sheets"]["hits"], stats["layers"]["hits"]))
+
+def animate(_dir, verbose=False):
+  from chargen import animation
+
+  # sheets previously written by render target are used by default
+  source = options["input"] or os.path.join(_dir, "build", "render")
+  if os.path.isdir(source):
+    sheets = [os.path.join(source, f) for f in sorted(os.listdir(source))
+        if f.lower().endswith(".png")]
+  elif os.path.isfile(source):
+    sheets = [source]
+  else:
+    exitWithError("cannot animate, sheet file or directory not found: {}".format(source),
+        errno.ENOENT)
+  fmts = [f.strip() for f in options["animation"].split(",") if f.strip()]
+  for fmt in fmts:
+    if fmt not in animation.formats:
+      exitWithError("unsupported animation format: {}".format(fmt), usage=True)
+
+  print("\nexporting animated previews ...")
+
+  dir_anim = options["output"] or os.path.join(_dir, "build", "animation")
+  time_start = time.time()
+  try:
+    results = animation.exportFiles(sheets, dir_anim, fmts)
+  except (ValueError, OSError) as e:
+    exitWithError("failed to export animated previews: {}".format(e))
+  if verbose:
+    for written in results:
+      for filepath in written:
+        print("animate '{}'".format(filepath))
+  time_diff = max(time.time() - time_start, 0.001)
+  print("exported animations of {} sheets ({:.1f} sheets/s): {}".format(len(sheets),
+      len(sheets) / time_diff, dir_anim))
+
+def exportCatalog(_dir, verbose=False):
+  from chargen import catalog, layercache
+
+  match = re.match(r"^(\d+)/(\d+)$", options["shard"])
+  if not match or not 1 <= int(match.group(1)) <= int(match.group(2)):
+    exitWithError("shard must be formatted as <index>/<count> (e.g. 1/4): {}".format(
+        options["shard"]), usage=True)
+  shard, shards = int(match.group(1)), int(match.group(2))
+  if options["archive"] not in catalog.archive_formats:
+    exitWithError("unsupported archive format: {}".format(options["archive"]), usage=True)
+  if options["part-size"] < 1:
+    exitWithError("part size must be at least 1", usage=True)
+
+  print("\nexporting character catalogue (shard {} of {}) ...".format(shard, shards))
+
+  dir_export = options["output"] or os.path.join(_dir, "build", "export",
+      "{}-of-{}".format(shard, shards))
+  time_start = time.time()
+
+  def progress(name, position):
+    if verbose:
+      print("export '{}'".format(name))
+    elif position % 1000 == 0:
+      print("{} combinations exported ({:.1f}/s)".format(position,
+          position / max(time.time() - time_start, 0.001)))
+
+  try:
+    totals = catalog.export(dir_export, os.path.join(_dir, "assets"),
+        layercache.LayerCache(os.path.join(_dir, "build", "cache", "layers")), shard - 1, shards,
+        options["archive"], options["part-size"], progress=progress)
+  except KeyboardInterrupt:
+    exitWithError("export interrupted, run again with the same options to resume: {}".format(
+        dir_export))
+  except (ValueError, KeyError, OSError) as e:
+    exitWithError("failed to export catalogue: {}".format(e))
+  if totals["resumed"] > 0:
+    print("resumed after {} combinations".format(totals["resumed"]))
+  print("exported {} combinations, {} unique sheets ({} duplicates): {}".format(
+      totals["exported"], totals["sheets"], totals["duplicates"], dir_export))
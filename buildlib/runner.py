@@ -0,0 +1,205 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Target registry & scheduler.
+
+import importlib, os, threading
+
+from . import deps
+from .common import exitWithError, fingerprintPath, getConfig, options, readManifest, \
+    writeManifest
+from .profile import profiler
+
+
+# paths that are inputs of all targets with fingerprints
+fingerprint_common = ("build.py", "buildlib", "chargen")
+
+
+class Targets:
+  names = []
+  actions = {}
+  depends = {}
+  completed = []
+  # targets currently executing & event set when finished
+  running = {}
+  lock = threading.RLock()
+  # inputs & outputs used to determine if target is up to date
+  fingerprints = {}
+  # persistent fingerprints of previous runs (loaded on demand)
+  records = None
+  # Python modules that must be available to run target
+  requires = {}
+
+  def getNames(self):
+    return self.names
+
+  def add(self, name, action, depends=(), fingerprint=None, requires=()):
+    # action is a function or "<module>:<function>" of this package that is imported when run
+    if not callable(action) and (not isinstance(action, str) or action.count(":") != 1):
+      exitWithError("action parameter of Targets.add must be a function or \"<module>:<function>\"")
+    if name in self.actions:
+      exitWithError("cannot re-define target: {}".format(name))
+    for dep in depends:
+      if dep not in self.actions:
+        exitWithError("target '{}' depends on undefined target: {}".format(name, dep))
+    self.names.append(name)
+    self.actions[name] = action
+    self.depends[name] = tuple(depends)
+    self.requires[name] = tuple(requires)
+    if fingerprint:
+      self.fingerprints[name] = fingerprint
+
+  def getAction(self, name):
+    action = self.actions[name]
+    if isinstance(action, str):
+      modname, funcname = action.split(":")
+      action = getattr(importlib.import_module("." + modname, __package__), funcname)
+      self.actions[name] = action
+    return action
+
+  def run(self, name, _dir, verbose=False):
+    if name not in self.actions:
+      exitWithError("target not defined: {}".format(name))
+    for dep in self.depends[name]:
+      self.run(dep, _dir, verbose)
+    self.execute(name, _dir, verbose)
+
+  def execute(self, name, _dir, verbose=False):
+    # runs target action without dependencies, waits if already running in another thread
+    with self.lock:
+      if name in self.completed:
+        if verbose:
+          print("\nnot re-running target: {}".format(name))
+        return
+      event = self.running.get(name)
+      if event is None:
+        self.running[name] = threading.Event()
+    if event is not None:
+      event.wait()
+      return
+    try:
+      if name == "clean":
+        # cleaning resets all targets (only first time run)
+        self.completed = []
+        self.records = {}
+      with profiler.target(name):
+        if self.isUpToDate(name, _dir):
+          print("\ntarget up to date: {}".format(name))
+        else:
+          self.getAction(name)(_dir, verbose)
+          self.record(name, _dir)
+      with self.lock:
+        self.completed.append(name)
+    finally:
+      with self.lock:
+        self.running.pop(name).set()
+
+  def getRecordsFile(self, _dir):
+    return os.path.join(_dir, "build", "fingerprints.json")
+
+  def getRecords(self, _dir):
+    with self.lock:
+      if self.records is None:
+        self.records = readManifest(self.getRecordsFile(_dir))
+      return self.records
+
+  def getFingerprint(self, name, _dir, key):
+    import hashlib
+
+    spec = self.fingerprints[name]
+    paths = spec.get(key, ())
+    if callable(paths):
+      paths = paths()
+    hasher = hashlib.sha1()
+    if key == "inputs":
+      # build scripts are inputs of every target
+      paths = list(fingerprint_common) + list(paths)
+      for ckey in spec.get("config", ()):
+        hasher.update("config:{}={}\n".format(ckey, getConfig(ckey)).encode("utf-8"))
+      for okey in spec.get("options", ()):
+        hasher.update("option:{}={}\n".format(okey, options[okey]).encode("utf-8"))
+    for path in paths:
+      fingerprintPath(hasher, _dir, path)
+    return hasher.hexdigest()
+
+  def isUpToDate(self, name, _dir):
+    if options["force"] or name not in self.fingerprints:
+      return False
+    record = self.getRecords(_dir).get(name)
+    if not record:
+      return False
+    return record["inputs"] == self.getFingerprint(name, _dir, "inputs") \
+        and record["outputs"] == self.getFingerprint(name, _dir, "outputs")
+
+  def record(self, name, _dir):
+    if name not in self.fingerprints:
+      return
+    # fingerprints are taken after running as some targets update their own inputs
+    record = {
+      "inputs": self.getFingerprint(name, _dir, "inputs"),
+      "outputs": self.getFingerprint(name, _dir, "outputs")
+    }
+    with self.lock:
+      records = self.getRecords(_dir)
+      records[name] = record
+      file_records = self.getRecordsFile(_dir)
+      if not os.path.isdir(os.path.dirname(file_records)):
+        os.makedirs(os.path.dirname(file_records))
+      writeManifest(file_records, records)
+
+  def getSchedule(self, names):
+    # retrieves requested targets & all their dependencies
+    schedule = []
+    def add(name):
+      if name in schedule:
+        return
+      for dep in self.depends[name]:
+        add(dep)
+      schedule.append(name)
+    for name in names:
+      add(name)
+    return schedule
+
+  def checkRequirements(self, names, _dir):
+    # exits before any target is run if modules required by targets or dependencies are missing
+    required = []
+    for name in self.getSchedule(names):
+      required += [mod for mod in self.requires[name] if mod not in required]
+    missing = deps.check(required, _dir)
+    if missing:
+      exitWithError("missing Python modules: {} (run 'build.py init' to install)".format(
+          ", ".join(deps.getPackage(mod) for mod in missing)))
+
+  def runParallel(self, names, _dir, verbose=False, jobs=1):
+    # targets whose dependencies are completed are executed concurrently
+    pending = [name for name in self.getSchedule(names) if name not in self.completed]
+    if jobs < 2 or len(pending) < 2:
+      for name in pending:
+        self.execute(name, _dir, verbose)
+      return
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+    futures = {}
+    executor = ThreadPoolExecutor(max_workers=jobs)
+    try:
+      while pending or futures:
+        for name in list(pending):
+          if all(dep in self.completed for dep in self.depends[name]):
+            pending.remove(name)
+            futures[executor.submit(self.execute, name, _dir, verbose)] = name
+        if not futures:
+          exitWithError("unresolvable target dependencies: {}".format(", ".join(pending)))
+        done = wait(futures, return_when=FIRST_COMPLETED)[0]
+        for future in done:
+          futures.pop(future)
+          # re-raises errors (including exit) from target
+          future.result()
+    finally:
+      executor.shutdown(wait=True, cancel_futures=True)
+
+targets = Targets()
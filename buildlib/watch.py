@@ -0,0 +1,389 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Incremental web staging & live reload server.
+#
+# Staged sources are watched with inotify on Linux (other platforms poll modification times).
+# Events are collected until no more arrive for a short time, then only the changed paths are
+# staged & files generated from them are updated. Pages served from build/web subscribe to reload
+# events (server-sent events) that are pushed as soon as staged files changed. The asset manifest
+# is not used by pages so it is updated after reload event was sent.
+
+import asyncio, json, mimetypes, os, struct, sys
+
+from urllib.parse import unquote, urlsplit
+
+from .common import exitWithError, options, printError, printWarning, readManifest, writeManifest
+from .files import deleteFile, isExcluded, syncFiles
+from .web import getStageConfig, updateAssets, updateBundles, updateConfig, updateReadme
+
+
+# seconds without events before changes are staged
+debounce = 0.1
+# seconds between scans of polling watcher
+poll_interval = 0.5
+
+# path of event stream & script injected into served HTML pages to subscribe to it
+reload_path = "/__reload"
+reload_script = "<script>new EventSource(\"{}\").addEventListener(\"reload\", () => \
+location.reload());</script>".format(reload_path)
+
+# inotify event flags (see inotify(7))
+in_modify = 0x2
+in_close_write = 0x8
+in_moved_from = 0x40
+in_moved_to = 0x80
+in_create = 0x100
+in_delete = 0x200
+in_delete_self = 0x400
+in_q_overflow = 0x4000
+in_ignored = 0x8000
+in_isdir = 0x40000000
+in_mask = in_modify | in_close_write | in_moved_from | in_moved_to | in_create | in_delete \
+    | in_delete_self
+
+
+class InotifyWatcher:
+  # watches stage directories recursively & files in root directory using Linux inotify
+  def __init__(self, _dir, files, dirs):
+    import ctypes, ctypes.util
+
+    self._dir = _dir
+    self.files = set(files)
+    self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    if self.fd < 0:
+      raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+    # watched directories relative to _dir indexed by watch descriptor
+    self.watches = {}
+    self.addWatch("")
+    for d in dirs:
+      self.addTree(d)
+
+  def addWatch(self, relpath):
+    import ctypes
+
+    dirpath = os.path.join(self._dir, os.path.normpath(relpath)) if relpath else self._dir
+    wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dirpath), in_mask)
+    if wd < 0:
+      raise OSError(ctypes.get_errno(), "cannot watch directory", dirpath)
+    self.watches[wd] = relpath
+
+  def addTree(self, relpath):
+    # retrieves files of directory that is added to watch
+    found = []
+    for ROOT, DIRS, FILES in os.walk(os.path.join(self._dir, os.path.normpath(relpath))):
+      self.addWatch(os.path.relpath(ROOT, self._dir).replace(os.sep, "/"))
+      for f in FILES:
+        found.append(os.path.relpath(os.path.join(ROOT, f), self._dir).replace(os.sep, "/"))
+    return found
+
+  def start(self, loop, callback):
+    # callback is called with set of changed paths or None if all paths must be checked
+    loop.add_reader(self.fd, lambda: callback(self.read()))
+
+  def read(self):
+    try:
+      data = os.read(self.fd, 64 * 1024)
+    except BlockingIOError:
+      return set()
+    changed = set()
+    pos = 0
+    while pos < len(data):
+      wd, mask, cookie, length = struct.unpack_from("iIII", data, pos)
+      name = os.fsdecode(data[pos+16:pos+16+length].rstrip(b"\0"))
+      pos += 16 + length
+      if mask & in_q_overflow:
+        # events were lost
+        return None
+      if mask & in_ignored:
+        self.watches.pop(wd, None)
+        continue
+      parent = self.watches.get(wd)
+      if parent is None or not name:
+        continue
+      if parent == "" and name not in self.files:
+        # only staged files of root directory are watched
+        continue
+      relpath = parent + "/" + name if parent else name
+      changed.add(relpath)
+      if mask & in_isdir and mask & (in_create | in_moved_to):
+        changed.update(self.addTree(relpath))
+    return changed
+
+  def close(self):
+    os.close(self.fd)
+
+
+class PollingWatcher:
+  # detects changes by comparing modification times & sizes of staged files
+  def __init__(self, _dir, files, dirs):
+    self._dir = _dir
+    self.files = files
+    self.dirs = dirs
+    self.snapshot = self.scan()
+    self.task = None
+
+  def scan(self):
+    snapshot = {}
+    paths = [f for f in self.files if f]
+    for d in self.dirs:
+      for ROOT, DIRS, FILES in os.walk(os.path.join(self._dir, os.path.normpath(d))):
+        paths += [os.path.relpath(os.path.join(ROOT, f), self._dir).replace(os.sep, "/")
+            for f in FILES]
+    for relpath in paths:
+      try:
+        st = os.stat(os.path.join(self._dir, os.path.normpath(relpath)))
+      except OSError:
+        continue
+      snapshot[relpath] = (st.st_mtime_ns, st.st_size)
+    return snapshot
+
+  def read(self):
+    snapshot = self.scan()
+    changed = set(p for p in snapshot if snapshot[p] != self.snapshot.get(p))
+    changed.update(set(self.snapshot) - set(snapshot))
+    self.snapshot = snapshot
+    return changed
+
+  def start(self, loop, callback):
+    async def poll():
+      while True:
+        await asyncio.sleep(poll_interval)
+        changed = await loop.run_in_executor(None, self.read)
+        if changed:
+          callback(changed)
+    self.task = loop.create_task(poll())
+
+  def close(self):
+    if self.task:
+      self.task.cancel()
+
+
+def getWatcher(_dir, files, dirs):
+  if sys.platform.startswith("linux"):
+    try:
+      return InotifyWatcher(_dir, files, dirs)
+    except (OSError, AttributeError) as e:
+      printWarning("inotify not available, watching by polling: {}".format(e))
+  return PollingWatcher(_dir, files, dirs)
+
+
+class WebStage:
+  # keeps staged file entries of stage-web manifest in memory between runs
+  def __init__(self, _dir, verbose=False):
+    self._dir = _dir
+    self.verbose = verbose
+    self.dir_web = os.path.join(_dir, "build", "web")
+    self.file_manifest = os.path.join(_dir, "build", "stage-web.json")
+    manifest = readManifest(self.file_manifest)
+    self.entries = manifest.get("files", {})
+    self.generated = manifest.get("generated", {})
+    self.files, self.dirs, self.exclude = getStageConfig()
+    self.files = [f for f in self.files if f]
+    self.dirs = [d for d in self.dirs if d]
+
+  def isStaged(self, relpath):
+    if isExcluded(relpath, self.exclude):
+      return False
+    return relpath in self.files or any(relpath.startswith(d + "/") for d in self.dirs)
+
+  def update(self, paths, notify):
+    # stages changed paths & calls notify with list of changed files in build/web
+    synced = []
+    removed = []
+    for relpath in sorted(paths):
+      source = os.path.join(self._dir, os.path.normpath(relpath))
+      if os.path.isdir(source):
+        for ROOT, DIRS, FILES in os.walk(source):
+          for f in FILES:
+            filepath = os.path.relpath(os.path.join(ROOT, f), self._dir).replace(os.sep, "/")
+            if self.isStaged(filepath):
+              synced.append(filepath)
+      elif os.path.isfile(source):
+        if self.isStaged(relpath):
+          synced.append(relpath)
+      elif not os.path.exists(source):
+        removed += [p for p in self.entries if p == relpath or p.startswith(relpath + "/")]
+    entries, changed = syncFiles(self._dir, sorted(set(synced)), self.dir_web, self.entries,
+        self.verbose)
+    self.entries.update(entries)
+    removed = sorted(set(removed))
+    for relpath in removed:
+      target = os.path.join(self.dir_web, os.path.normpath(relpath))
+      deleteFile(target, self.verbose)
+      self.entries.pop(relpath)
+      # directories left empty are removed
+      dirpath = os.path.dirname(target)
+      while dirpath != self.dir_web and os.path.isdir(dirpath) and not os.listdir(dirpath):
+        os.rmdir(dirpath)
+        dirpath = os.path.dirname(dirpath)
+
+    generated_old = self.generated
+    self.generated = dict(generated_old)
+    written = updateReadme(self._dir, self.generated, generated_old, self.verbose)
+    written += updateConfig(self._dir, self.entries, changed, self.generated, generated_old,
+        self.verbose)
+    written += updateBundles(self._dir, self.entries, self.generated, generated_old, self.verbose)
+    updated = sorted(set(changed + removed + written))
+    if updated:
+      print("updated {}".format(", ".join(updated)))
+      notify(updated)
+
+    if any(p.startswith("assets/") for p in changed + removed):
+      updateAssets(self._dir, self.entries, changed, self.generated, generated_old, self.verbose)
+    writeManifest(self.file_manifest, {"files": self.entries, "generated": self.generated})
+
+
+class ReloadServer:
+  # serves files of build/web & pushes reload events to pages
+  def __init__(self, dir_web):
+    self.dir_web = os.path.realpath(dir_web)
+    # writers of subscribed event streams
+    self.clients = set()
+
+  def getFile(self, target):
+    # retrieves path of requested file or None if not found or outside of web directory
+    path = unquote(urlsplit(target).path)
+    filepath = os.path.realpath(os.path.join(self.dir_web, os.path.normpath(path.lstrip("/"))))
+    if filepath != self.dir_web and not filepath.startswith(self.dir_web + os.sep):
+      return None
+    if os.path.isdir(filepath):
+      filepath = os.path.join(filepath, "index.html")
+    return filepath if os.path.isfile(filepath) else None
+
+  def notify(self, paths):
+    data = "event: reload\ndata: {}\n\n".format(json.dumps(paths)).encode("utf-8")
+    for writer in list(self.clients):
+      if writer.is_closing():
+        self.clients.discard(writer)
+        continue
+      writer.write(data)
+
+  async def handle(self, reader, writer):
+    try:
+      while True:
+        line = await reader.readline()
+        if not line:
+          break
+        headers = {}
+        while True:
+          header = await reader.readline()
+          if header in (b"\r\n", b"\n", b""):
+            break
+          key, _, value = header.decode("latin-1").partition(":")
+          headers[key.strip().lower()] = value.strip()
+        try:
+          method, target, version = line.decode("latin-1").split()
+        except ValueError:
+          break
+
+        if method == "GET" and urlsplit(target).path == reload_path:
+          writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+              + b"Cache-Control: no-store\r\nConnection: keep-alive\r\n\r\n")
+          await writer.drain()
+          self.clients.add(writer)
+          # stream stays open until page is closed
+          await reader.read()
+          break
+
+        filepath = self.getFile(target) if method in ("GET", "HEAD") else None
+        if filepath is None:
+          status, ctype, data = "404 Not Found", "text/plain", b"not found"
+        else:
+          status = "200 OK"
+          ctype = mimetypes.guess_type(filepath)[0] or "application/octet-stream"
+          fopen = open(filepath, "rb")
+          data = fopen.read()
+          fopen.close()
+          if ctype == "text/html":
+            data = data.replace(b"</body>", reload_script.encode("utf-8") + b"\n</body>", 1)
+        keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        head = ["HTTP/1.1 " + status, "Content-Type: " + ctype,
+            "Content-Length: {}".format(len(data)), "Cache-Control: no-store",
+            "Connection: " + ("keep-alive" if keep_alive else "close")]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1")
+            + (data if method != "HEAD" else b""))
+        await writer.drain()
+        if not keep_alive:
+          break
+    except (ConnectionError, asyncio.IncompleteReadError):
+      pass
+    finally:
+      self.clients.discard(writer)
+      writer.close()
+
+
+def watch(_dir, verbose=False):
+  if options["web-dist"]:
+    # changed files would be staged under their original names only
+    exitWithError("fingerprinted web distribution files cannot be watched (omit -w)")
+  stage = WebStage(_dir, verbose)
+  reload_server = ReloadServer(stage.dir_web)
+  state = {"pending": set(), "timer": None, "running": False}
+
+  async def run():
+    loop = asyncio.get_running_loop()
+    watcher = getWatcher(_dir, stage.files, stage.dirs)
+
+    def notify(paths):
+      loop.call_soon_threadsafe(reload_server.notify, paths)
+
+    def restage(paths):
+      # staging errors are reported without stopping watch
+      try:
+        stage.update(paths, notify)
+      except SystemExit:
+        pass
+      except Exception as e:
+        printError("failed to stage changes: {}".format(e))
+
+    def flush():
+      state["timer"] = None
+      if state["running"]:
+        # changes during staging are staged afterwards
+        state["timer"] = loop.call_later(debounce, flush)
+        return
+      paths = state["pending"]
+      state["pending"] = set()
+      state["running"] = True
+      future = loop.run_in_executor(None, restage, paths)
+      future.add_done_callback(lambda f: state.update(running=False))
+
+    def changed(paths):
+      if paths is None:
+        # inotify queue overflowed, all staged files are checked
+        paths = set(stage.entries) | set(stage.files)
+        for d in stage.dirs:
+          paths.add(d)
+      if not paths:
+        return
+      state["pending"].update(paths)
+      if state["timer"] is not None:
+        state["timer"].cancel()
+      state["timer"] = loop.call_later(debounce, flush)
+
+    watcher.start(loop, changed)
+    server = await asyncio.start_server(reload_server.handle, options["host"], options["port"])
+    for sock in server.sockets:
+      host, port = sock.getsockname()[:2]
+      print("\nwatching {} using {} & serving http://{}:{}/ (stop with Ctrl+C)".format(
+          ", ".join(stage.files + stage.dirs),
+          "inotify" if isinstance(watcher, InotifyWatcher) else "polling", host, port))
+    try:
+      async with server:
+        await server.serve_forever()
+    finally:
+      watcher.close()
+
+  try:
+    asyncio.run(run())
+  except KeyboardInterrupt:
+    pass
+  except OSError as e:
+    exitWithError("failed to start watch server: {}".format(e))
@@ -0,0 +1,504 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Web staging & distribution targets.
+
+import errno, hashlib, json, os, posixpath, re
+
+from .archive import packDir, packFile, packMembers
+from .common import exitWithError, getConfig, options, printWarning, readFile, readManifest, \
+    writeFile, writeManifest
+from .files import cloneFile, getStatKey, hashFile, isExcluded, isGeneratedStale, \
+    listStageFiles, makeDir, removeStale, syncFiles
+
+
+templates = {}
+templates["html-head"] = "<html>\n\
+<head>\n\
+{{head}}\n\
+</head>\
+\n<body>"
+templates["html-tail"] = "</body>\n</html>"
+templates["favicon-data"] = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAABAAAAAQBAMAAADt3eJSAAAAJ1BMVEVHcEzytYYAAABhPAA2Njbkhnb/2rCYWUE9GwD6+voskrrX19cedpDJqZNvAAAAAXRSTlMAQObYZgAAAFRJREFUCNdjYIADJiUlCEPFxQnCVAIBBbCUCpThqKQkAma4CSmmgBmCQABiMEs0SjQagBjRB2W2ghmRy7KmghmlYonhIAaDeaBoMdgOZmNjAwYsAACaGQ2gK4O7gQAAAABJRU5ErkJggg=="
+templates["favicon"] = "<link rel=\"icon\" href=\"{}\">".format(templates["favicon-data"])
+templates["button-uplevel"] = "<a class=\"button\" href=\"../\" name=\"top\"><span class=\"button\">Back</span></a>"
+templates["button-totop"] = "<a class=\"button\" href=\"#top\"><span class=\"button\">Back to Top</span></a>"
+# fingerprinted files never change so they are served from cache without revalidation, other
+# requests (e.g. pages) always go to the network
+templates["service-worker"] = """"use strict";
+
+const cacheName = "chargen-{{cache}}";
+const precache = {{precache}};
+
+self.addEventListener("install", (evt) => {
+  evt.waitUntil(caches.open(cacheName).then((cache) => cache.addAll(precache)));
+});
+
+self.addEventListener("activate", (evt) => {
+  // remove caches of previous versions
+  evt.waitUntil(caches.keys().then((keys) => Promise.all(keys.filter((key) => {
+    return key.startsWith("chargen-") && key !== cacheName;
+  }).map((key) => caches.delete(key)))));
+});
+
+self.addEventListener("fetch", (evt) => {
+  evt.respondWith(caches.match(evt.request).then((res) => res || fetch(evt.request)));
+});
+"""
+
+# number of hex digits of content hash in fingerprinted file names
+fingerprint_length = 8
+file_service_worker = "service-worker.js"
+
+
+def stageWeb(_dir, verbose=False):
+  print("\nstaging web files ...")
+
+  dir_build = os.path.join(_dir, "build")
+  dir_web = os.path.join(dir_build, "web")
+  if not os.path.isdir(dir_web):
+    makeDir(dir_web, verbose)
+
+  # staged files are only copied when changed since last run
+  file_manifest = os.path.join(dir_build, "stage-web.json")
+  manifest = readManifest(file_manifest)
+  entries_old = manifest.get("files", {})
+  generated_old = manifest.get("generated", {})
+  generated = {}
+  if not options["web-dist"]:
+    resetFingerprints(entries_old, generated_old)
+
+  staged = listStageFiles(_dir, *getStageConfig())
+  entries, changed = syncFiles(_dir, staged, dir_web, entries_old, verbose)
+  if len(changed) == 0:
+    print("staged files up to date: {}".format(dir_web))
+  else:
+    print("staged {} new or changed files".format(len(changed)))
+
+  dir_assets = os.path.join(dir_web, "assets")
+  if not os.path.isdir(dir_assets):
+    exitWithError("no assets staged (missing directory: {})".format(dir_assets), errno.ENOENT)
+
+  updateReadme(_dir, generated, generated_old, verbose)
+  updateAssets(_dir, entries, changed, generated, generated_old, verbose)
+  updateConfig(_dir, entries, changed, generated, generated_old, verbose)
+  updateBundles(_dir, entries, generated, generated_old, verbose)
+  if options["web-dist"]:
+    updateFingerprints(_dir, entries, generated, generated_old, verbose)
+
+  # remove files no longer staged
+  keep = set(entries)
+  for gen in generated.values():
+    keep.update(gen["outputs"])
+  removed = removeStale(dir_web, keep, verbose)
+  if removed > 0:
+    print("removed {} stale files".format(removed))
+
+  writeManifest(file_manifest, {"files": entries, "generated": generated})
+
+def getStageConfig():
+  # retrieves (files, directories, exclude patterns) to be staged
+  files_stage = getConfig("stage_files", "").split(";")
+  dirs_stage = getConfig("stage_dirs", "").split(";")
+  exclude = [p for p in getConfig("stage_exclude", "").split(";") if p]
+  return files_stage, dirs_stage, exclude
+
+# Files generated from staged sources are only written when their inputs changed. Each function
+# records the input & outputs in generated & retrieves paths of outputs that were written.
+
+def updateReadme(_dir, generated, generated_old, verbose=False):
+  # convert README to HTML
+  dir_web = os.path.join(_dir, "build", "web")
+  file_readme_source = os.path.join(_dir, "assets", "README.md")
+  file_readme = os.path.join(dir_web, "assets", "README.html")
+  generated["readme"] = {"input": hashFile(file_readme_source), "outputs": ["assets/README.html"]}
+  if not isGeneratedStale(dir_web, generated["readme"], generated_old.get("readme")):
+    return []
+  import markdown
+  html = markdown.markdown(readFile(file_readme_source))
+  html_head = [
+    "  <title>Assets Info</title>",
+    # ~ "<link rel=\"icon\" href=\"{}\">".format(templates["favicon"]),
+    templates["favicon"],
+    "<link rel=\"stylesheet\" href=\"../script/main.css\">",
+    "<script type=\"module\" src=\"../script/nav.js\"></script>"
+  ]
+  html_head = re.sub(r"^{{head}}$", "\n  ".join(html_head), templates["html-head"], 1, re.M)
+  html = "\n".join((html_head, templates["button-uplevel"], html, templates["button-totop"],
+      templates["html-tail"]))
+  writeFile(file_readme, html)
+  if verbose:
+    print("generated '{}'".format(file_readme))
+  return generated["readme"]["outputs"]
+
+def updateAssets(_dir, entries, changed, generated, generated_old, verbose=False):
+  # optimized images & asset manifest
+  dir_build = os.path.join(_dir, "build")
+  dir_web = os.path.join(dir_build, "web")
+  dir_assets = os.path.join(dir_web, "assets")
+  written = []
+
+  # optimize new & changed images, results are cached by content
+  images = [relpath for relpath in changed if relpath.endswith(".png")]
+  if len(images) > 0:
+    print("\noptimizing {} images ...".format(len(images)))
+    from chargen import pngopt
+    results = pngopt.optimizeFiles([os.path.join(dir_web, os.path.normpath(r)) for r in images],
+        os.path.join(dir_build, "cache", "png"))
+    size_orig = sum(r[0] for r in results)
+    size_opt = sum(r[1] for r in results)
+    if verbose:
+      print("{} results retrieved from cache".format(len([r for r in results if r[2]])))
+    print("reduced images from {} to {} bytes ({:.1f}%)".format(size_orig, size_opt,
+        100 - (size_opt * 100 / max(size_orig, 1))))
+    for relpath in images:
+      if relpath in entries:
+        entries[relpath]["target"] = getStatKey(os.path.join(dir_web, os.path.normpath(relpath)))
+
+  # manifest of layer files is compiled from optimized images so that hashes match staged files,
+  # it is compiled again when any staged asset changes
+  assets_hash = hashlib.sha1()
+  for relpath in sorted(entries):
+    if relpath.startswith("assets/"):
+      assets_hash.update("{}:{}\n".format(relpath, entries[relpath]["hash"]).encode("utf-8"))
+  generated["manifest"] = {"input": assets_hash.hexdigest(), "outputs": ["assets/manifest.json"]}
+  if isGeneratedStale(dir_web, generated["manifest"], generated_old.get("manifest")):
+    print("\ncompiling asset manifest ...")
+    from chargen import manifest as asset_manifest
+    try:
+      compiled, unlisted = asset_manifest.build(dir_assets)
+    except ValueError as e:
+      exitWithError(str(e))
+    if unlisted:
+      printWarning("files not defined in layers.json are excluded from manifest:\n  "
+          + "\n  ".join(unlisted))
+    file_asset_manifest = os.path.join(dir_assets, "manifest.json")
+    asset_manifest.write(compiled, file_asset_manifest)
+    written += generated["manifest"]["outputs"]
+    if verbose:
+      print("generated '{}' ({} layers)".format(file_asset_manifest, len(compiled["files"])))
+  return written
+
+def updateConfig(_dir, entries, changed, generated, generated_old, verbose=False):
+  # configuration is always derived from source so that options of previous runs don't persist
+  dir_web = os.path.join(_dir, "build", "web")
+  file_config_source = os.path.join(_dir, "script", "config.js")
+  file_config_js = os.path.join(dir_web, "script", "config.js")
+  generated["config"] = {
+    "input": "{}:{}".format(hashFile(file_config_source), options["web-dist"]),
+    "outputs": ["script/config.js"]
+  }
+  # staged copy replaces previously written configuration
+  if "script/config.js" not in changed \
+      and not isGeneratedStale(dir_web, generated["config"], generated_old.get("config")):
+    return []
+  contents = readFile(file_config_source)
+  changes = re.sub(
+    r"^config\[\"asset-info\"\] = .*$",
+    "config[\"asset-info\"] = \"assets/README.html\"",
+    contents, 1, re.M
+  )
+
+  if options["web-dist"]:
+    contents = changes
+    changes = re.sub(
+      r"^config\[\"web-dist\"\] = false",
+      "config[\"web-dist\"] = true",
+      contents, 1, re.M
+    )
+    if changes != contents and verbose:
+      print("configured for web distribution: {}".format(file_config_js))
+  if changes == readFile(file_config_js):
+    return []
+  writeFile(file_config_js, changes)
+  entries["script/config.js"]["target"] = getStatKey(file_config_js)
+  return generated["config"]["outputs"]
+
+# Module scripts & stylesheets of each page are replaced by a bundle including their imports, see
+# chargen.bundle. Pages are rewritten in place, their entries are recorded so that they can be
+# bundled again once rewritten.
+
+def getPageRefs(relpath, contents, pattern, staged):
+  # retrieves paths of staged files referenced by tags matching pattern
+  refs = []
+  for match in re.finditer(pattern, contents, re.M):
+    ref = resolveRef(relpath, match.group(2))
+    if ref in staged:
+      refs.append(ref)
+  return refs
+
+def replacePageRefs(relpath, contents, pattern, refs, target):
+  # replaces first tag referencing refs with reference to target & removes the others
+  state = {"replaced": False}
+  def replace(match):
+    if resolveRef(relpath, match.group(2)) not in refs:
+      return match.group(0)
+    if state["replaced"]:
+      return ""
+    state["replaced"] = True
+    return match.group(1) + getRef(relpath, target) + match.group(3)
+  return re.sub(pattern, replace, contents, 0, re.M)
+
+def updateBundles(_dir, entries, generated, generated_old, verbose=False):
+  from chargen import bundle
+
+  dir_web = os.path.join(_dir, "build", "web")
+  bundle_old = generated_old.get("bundle", {})
+  tags = {
+    ".js": r"^([ \t]*<script type=\"module\" src=\")([^\"]*)(\"></script>\n?)",
+    ".css": r"^([ \t]*<link rel=\"stylesheet\" href=\")([^\"]*)(\">\n?)"
+  }
+  pages = sorted(r for r in entries if r.endswith(".html"))
+  pages += [r for r in generated.get("readme", {}).get("outputs", []) if r not in pages]
+  page_entries = {}
+  for relpath in pages:
+    contents = readFile(os.path.join(dir_web, os.path.normpath(relpath)))
+    page_entries[relpath] = {}
+    for ext, pattern in tags.items():
+      refs = getPageRefs(relpath, contents, pattern, [r for r in entries if r.endswith(ext)])
+      if not refs:
+        refs = bundle_old.get("pages", {}).get(relpath, {}).get(ext, [])
+      if refs:
+        page_entries[relpath][ext] = refs
+
+  input_hash = hashlib.sha1("{}:{}\n".format(options["web-dist"],
+      json.dumps(page_entries, sort_keys=True)).encode("utf-8"))
+  for relpath in sorted(entries):
+    if relpath.endswith((".js", ".css")):
+      input_hash.update("{}:{}\n".format(relpath, entries[relpath]["target"]).encode("utf-8"))
+  generated["bundle"] = {
+    "input": input_hash.hexdigest(),
+    "outputs": bundle_old.get("outputs", []),
+    "modules": bundle_old.get("modules", []),
+    "pages": page_entries
+  }
+  written = []
+  if isGeneratedStale(dir_web, generated["bundle"], bundle_old):
+    print("\nbundling scripts & stylesheets ...")
+    outputs = []
+    modules = set()
+    for refs in set(tuple(e[ext]) + (ext,) for e in page_entries.values() for ext in e):
+      refs, ext = list(refs[:-1]), refs[-1]
+      try:
+        if ext == ".js":
+          # debugging messages are left out of web distributions
+          contents, sourcemap = bundle.bundleScripts(dir_web, refs, options["web-dist"])
+        else:
+          contents, sourcemap = bundle.bundleStyles(dir_web, refs)
+      except ValueError as e:
+        exitWithError("failed to bundle {}: {}".format(", ".join(refs), e))
+      written += bundle.write(dir_web, refs, ext, contents, sourcemap)
+      bundle_path = bundle.getBundlePath(refs, ext)
+      outputs += [bundle_path, bundle_path + ".map"]
+      modules.update(resolveRef(bundle_path, s) for s in sourcemap["sources"])
+      if verbose:
+        print("bundled {} files into '{}' ({} bytes)".format(len(sourcemap["sources"]),
+            os.path.join(dir_web, os.path.normpath(bundle_path)), len(contents)))
+    generated["bundle"]["outputs"] = sorted(outputs)
+    generated["bundle"]["modules"] = sorted(modules)
+
+  for relpath in pages:
+    filepath = os.path.join(dir_web, os.path.normpath(relpath))
+    contents = readFile(filepath)
+    changes = contents
+    for ext, refs in page_entries[relpath].items():
+      changes = replacePageRefs(relpath, changes, tags[ext], refs,
+          bundle.getBundlePath(refs, ext))
+    if changes != contents:
+      writeFile(filepath, changes)
+      written.append(relpath)
+      if relpath in entries:
+        entries[relpath]["target"] = getStatKey(filepath)
+  return written
+
+# Static files of web distributions are copied to names containing a hash of their contents (e.g.
+# script/main.js => script/main.1a2b3c4d.js) & referenced by those names only, so that browsers
+# can cache them indefinitely. Staged originals are kept for incremental staging but are not
+# included in distribution archives. Pages are rewritten in place.
+
+def getFingerprintPath(relpath, digest):
+  root, ext = posixpath.splitext(relpath)
+  return "{}.{}{}".format(root, digest[:fingerprint_length], ext)
+
+def resolveRef(relpath, ref):
+  # retrieves path relative to web directory of file referenced in relpath, None if external
+  if not ref or ref.startswith(("#", "/")) or ":" in ref:
+    return None
+  return posixpath.normpath(posixpath.join(posixpath.dirname(relpath), ref.split("#")[0]))
+
+def getRef(relpath, target):
+  # retrieves reference to target from file relpath
+  return posixpath.relpath(target, posixpath.dirname(relpath) or ".")
+
+def rewriteCss(relpath, contents, files):
+  def replace(match):
+    target = files.get(resolveRef(relpath, match.group(2)))
+    if target is None:
+      return match.group(0)
+    return "url({0}{1}{0})".format(match.group(1), getRef(relpath, target))
+  return re.sub(r"url\((['\"]?)([^'\")]+)\1\)", replace, contents)
+
+def rewriteConfig(contents, files):
+  # JavaScript resolves fingerprinted assets by their original path (see util.getUrl)
+  fingerprints = {o: f for o, f in files.items() if o.startswith("assets/")}
+  contents = re.sub(
+    r"^config\[\"fingerprints\"\] ?= ?.*$",
+    lambda m: "config[\"fingerprints\"] = {};".format(json.dumps(fingerprints, sort_keys=True,
+        separators=(",", ":"))),
+    contents, 1, re.M
+  )
+  return re.sub(
+    r"^config\[\"service-worker\"\] ?= ?false",
+    "config[\"service-worker\"] = true",
+    contents, 1, re.M
+  )
+
+def rewritePage(relpath, contents, files, originals, modules):
+  # references of previous runs are mapped back to originals so that pages can be rewritten again
+  def replace(match):
+    ref = resolveRef(relpath, match.group(2))
+    if ref is None:
+      return match.group(0)
+    orig = originals.get(ref, ref)
+    target = files.get(orig, orig)
+    if target == ref:
+      return match.group(0)
+    return "{}=\"{}\"".format(match.group(1), getRef(relpath, target))
+  contents = re.sub(r"\b(src|href)=\"([^\"]*)\"", replace, contents)
+
+  # modules import each other by original names, import map redirects them to fingerprinted files
+  contents = re.sub(r"^[ \t]*<script type=\"importmap\">.*?</script>\n", "", contents, 0,
+      re.M | re.S)
+  if not modules:
+    return contents
+  imports = {}
+  for orig, target in files.items():
+    if orig in modules:
+      # relative addresses of import maps must be prefixed to not be taken for module names
+      key, value = ["./" + r if not r.startswith("../") else r
+          for r in (getRef(relpath, orig), getRef(relpath, target))]
+      imports[key] = value
+  return re.sub(
+    r"^([ \t]*)(<script type=\"module\")",
+    lambda m: "{0}<script type=\"importmap\">{1}</script>\n{0}{2}".format(m.group(1),
+        json.dumps({"imports": imports}, sort_keys=True), m.group(2)),
+    contents, 1, re.M
+  )
+
+def updateFingerprints(_dir, entries, generated, generated_old, verbose=False):
+  # fingerprints staged files, rewrites references & writes service worker precaching them
+  dir_web = os.path.join(_dir, "build", "web")
+  patterns = [p for p in getConfig("stage_fingerprint", "").split(";") if p]
+  fingerprint_old = generated_old.get("fingerprint", {})
+  files = {}
+  written = []
+
+  def link(relpath, source):
+    target = os.path.join(dir_web, os.path.normpath(relpath))
+    if not os.path.isfile(target):
+      cloneFile(source, target, True)
+      written.append(relpath)
+
+  def write(relpath, contents):
+    target = os.path.join(dir_web, os.path.normpath(relpath))
+    if not os.path.isfile(target) or readFile(target) != contents:
+      writeFile(target, contents)
+      written.append(relpath)
+
+  # bundled sources are not referenced by pages, their bundles are fingerprinted instead
+  bundled = generated.get("bundle", {})
+  staged = sorted(r for r in entries if isExcluded(r, patterns)
+      and r not in bundled.get("modules", []))
+  staged += [r for r in bundled.get("outputs", []) if isExcluded(r, patterns)]
+  # files referencing other fingerprinted files are rewritten after those
+  rewritten = [r for r in staged if r.endswith(".css") or r == "script/config.js"
+      or r in bundled.get("outputs", [])]
+  for relpath in staged:
+    if relpath not in rewritten:
+      source = os.path.join(dir_web, os.path.normpath(relpath))
+      files[relpath] = getFingerprintPath(relpath, hashFile(source))
+      link(files[relpath], source)
+  for relpath in rewritten:
+    contents = readFile(os.path.join(dir_web, os.path.normpath(relpath)))
+    if relpath.endswith(".css"):
+      contents = rewriteCss(relpath, contents, files)
+    else:
+      contents = rewriteConfig(contents, files)
+    files[relpath] = getFingerprintPath(relpath,
+        hashlib.sha1(contents.encode("utf-8")).hexdigest())
+    write(files[relpath], contents)
+
+  precache = sorted(files.values())
+  write(file_service_worker, templates["service-worker"]
+      .replace("{{cache}}", hashlib.sha1("\n".join(precache).encode("utf-8")).hexdigest()[:8])
+      .replace("{{precache}}", json.dumps(precache, indent=2)))
+
+  # bundles import nothing, only remaining modules need an import map
+  modules = [r for r in files if r.endswith(".js") and r not in bundled.get("outputs", [])]
+  originals = {f: o for o, f in fingerprint_old.get("files", {}).items()}
+  originals.update({f: o for o, f in files.items()})
+  pages = sorted(r for r in entries if r.endswith(".html"))
+  pages += [r for r in generated.get("readme", {}).get("outputs", []) if r not in pages]
+  for relpath in pages:
+    filepath = os.path.join(dir_web, os.path.normpath(relpath))
+    contents = readFile(filepath)
+    changes = rewritePage(relpath, contents, files, originals, modules)
+    if changes != contents:
+      writeFile(filepath, changes)
+      written.append(relpath)
+      if relpath in entries:
+        entries[relpath]["target"] = getStatKey(filepath)
+
+  generated["fingerprint"] = {
+    "outputs": precache + [file_service_worker],
+    "files": files,
+    "pages": pages
+  }
+  print("fingerprinted {} files ({} written)".format(len(files), len(written)))
+  if verbose:
+    for relpath in written:
+      print("generated '{}'".format(os.path.join(dir_web, os.path.normpath(relpath))))
+  return written
+
+def resetFingerprints(entries_old, generated_old):
+  # pages rewritten by a previous run are staged & generated again without fingerprints
+  fingerprint_old = generated_old.pop("fingerprint", None)
+  if fingerprint_old is None:
+    return
+  for relpath in fingerprint_old["pages"]:
+    entries_old.pop(relpath, None)
+    if relpath in generated_old.get("readme", {}).get("outputs", []):
+      generated_old.pop("readme")
+
+def distWeb(_dir, verbose=False):
+  print("\ncreating web distribution ...")
+
+  app_ver = getConfig("version")
+  dir_build = os.path.join(_dir, "build")
+  dir_web = os.path.join(dir_build, "web")
+  dir_dist = os.path.join(dir_build, "dist")
+  file_dist = os.path.join(dir_dist, "chargen_{}_web.zip".format(app_ver))
+  if not os.path.exists(dir_dist):
+    makeDir(dir_dist, verbose)
+  # bundled sources (included in source maps) & originals of fingerprinted files are not
+  # referenced by distributed pages
+  generated = readManifest(os.path.join(dir_build, "stage-web.json")).get("generated", {})
+  excluded = set(generated.get("bundle", {}).get("modules", []))
+  excluded.update(generated.get("fingerprint", {}).get("files", {}))
+  if not excluded:
+    packDir(dir_web, file_dist, False, False, verbose)
+    packFile(os.path.join(_dir, "README.md"), file_dist, True, verbose, "README.md")
+    return
+  members = []
+  for ROOT, DIRS, FILES in os.walk(dir_web):
+    for f in sorted(FILES):
+      relpath = os.path.relpath(os.path.join(ROOT, f), dir_web).replace(os.sep, "/")
+      if relpath not in excluded:
+        members.append((os.path.join(ROOT, f), relpath))
+  members.append((os.path.join(_dir, "README.md"), "README.md"))
+  packMembers(file_dist, members, verbose)
@@ -0,0 +1,125 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Animated preview export.
+#
+# Uses the same slice table & frame sequence as PreviewGenerator.buildAnimation/renderAnimation
+# (script/PreviewGenerator.js) to write a walk cycle for each facing direction as animated GIF or
+# APNG. A sheet is copied once into a frame-major buffer so that every frame is a contiguous view
+# that images are created from without copying, the buffer is reused for sheets of the same size.
+
+import multiprocessing, os
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+from PIL import Image
+
+from . import compositor
+
+
+# sheet columns of animation frames in the order of PreviewGenerator slice table rows
+frame_columns = (1, 0, 2)
+# slice table rows drawn by renderAnimation (frames 0, 1, 0, 2)
+frame_sequence = (0, 1, 0, 2)
+# same as PreviewGenerator.frameDelay (ms)
+frame_delay = 250
+# sheet rows of facing directions, slice table contains south, north & east
+directions = {
+  "south": 2,
+  "north": 0,
+  "east": 1,
+  "west": 3
+}
+
+# PIL format, file extension & disposal method clearing frame to background
+formats = {
+  "gif": ("GIF", ".gif", 2),
+  "apng": ("PNG", ".png", 1)
+}
+
+
+class Animator:
+  def __init__(self):
+    # frame-major copy of current sheet (rows, columns, frame height, frame width, RGBA)
+    self.buffer = None
+
+  def load(self, pixels):
+    # copies sheet into frame buffer, retrieves frame size
+    height, width = pixels.shape[:2]
+    if height % compositor.frames_y != 0 or width % compositor.frames_x != 0:
+      raise ValueError("sheet dimensions not divisible into {}x{} frames: {}x{}".format(
+          compositor.frames_x, compositor.frames_y, width, height))
+    fheight = height // compositor.frames_y
+    fwidth = width // compositor.frames_x
+    shape = (compositor.frames_y, compositor.frames_x, fheight, fwidth, 4)
+    if self.buffer is None or self.buffer.shape != shape:
+      self.buffer = numpy.empty(shape, dtype=numpy.uint8)
+    frames = pixels.reshape(compositor.frames_y, fheight, compositor.frames_x, fwidth, 4)
+    numpy.copyto(self.buffer, frames.transpose(0, 2, 1, 3, 4))
+    return fwidth, fheight
+
+  def getFrames(self, direction):
+    # retrieves images of animation sequence, repeated frames are the same image
+    row = directions[direction]
+    fheight, fwidth = self.buffer.shape[2:4]
+    images = [Image.frombuffer("RGBA", (fwidth, fheight), self.buffer[row, column], "raw", "RGBA",
+        0, 1) for column in frame_columns]
+    return [images[idx] for idx in frame_sequence]
+
+  def save(self, filepath, direction, fmt="gif"):
+    frames = self.getFrames(direction)
+    # previous frame is cleared before drawing next as animated preview does
+    pil_format, ext, disposal = formats[fmt]
+    frames[0].save(filepath, pil_format, save_all=True, append_images=frames[1:],
+        duration=frame_delay, loop=0, disposal=disposal)
+
+  def export(self, pixels, dir_target, name, fmts=("gif",), dirs=None):
+    # writes animation of each direction, retrieves list of written files
+    self.load(pixels)
+    written = []
+    for direction in dirs or directions:
+      for fmt in fmts:
+        filepath = os.path.join(dir_target, "{}-{}{}".format(name, direction, formats[fmt][1]))
+        self.save(filepath, direction, fmt)
+        written.append(filepath)
+    return written
+
+
+# animator of worker process, reused for every sheet it exports
+animator = None
+
+def exportFile(filepath, dir_target, fmts=("gif",), dirs=None):
+  global animator
+  if animator is None:
+    animator = Animator()
+  img = Image.open(filepath)
+  pixels = numpy.asarray(img.convert("RGBA"))
+  img.close()
+  name = os.path.splitext(os.path.basename(filepath))[0]
+  return animator.export(pixels, dir_target, name, fmts, dirs)
+
+def exportFiles(filepaths, dir_target, fmts=("gif",), dirs=None, jobs=None):
+  # exports animations of sheet files, retrieves list of written files for each sheet
+  for fmt in fmts:
+    if fmt not in formats:
+      raise ValueError("unsupported animation format: {}".format(fmt))
+  if not os.path.isdir(dir_target):
+    os.makedirs(dir_target)
+  jobs = jobs or os.cpu_count() or 1
+  if jobs < 2 or len(filepaths) < 8:
+    return [exportFile(f, dir_target, fmts, dirs) for f in filepaths]
+  # workers are spawned as this may be called from a scheduler thread
+  executor = ProcessPoolExecutor(max_workers=jobs,
+      mp_context=multiprocessing.get_context("spawn"))
+  count = len(filepaths)
+  try:
+    return list(executor.map(exportFile, filepaths, [dir_target] * count, [fmts] * count,
+        [dirs] * count, chunksize=max(1, count // (jobs * 4))))
+  finally:
+    executor.shutdown()
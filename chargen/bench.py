@@ -0,0 +1,47 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Benchmark timing helpers.
+#
+# Each case is run a number of untimed warmup iterations followed by timed iterations. An
+# optional setup function is called before every iteration & is not included in timings.
+
+import math, time
+
+
+def percentile(samples, pct):
+  # nearest-rank percentile of unsorted samples
+  ordered = sorted(samples)
+  rank = max(1, math.ceil(pct / 100 * len(ordered)))
+  return ordered[rank - 1]
+
+def summarize(samples):
+  return {
+    "iterations": len(samples),
+    "min": min(samples),
+    "median": percentile(samples, 50),
+    "p95": percentile(samples, 95),
+    "max": max(samples),
+    "mean": sum(samples) / len(samples),
+    "samples": samples
+  }
+
+def measure(func, setup=None, warmup=1, iterations=5):
+  # retrieves summary of wall times in seconds
+  if iterations < 1:
+    raise ValueError("number of iterations must be at least 1")
+  samples = []
+  for it in range(warmup + iterations):
+    if setup:
+      setup()
+    time_start = time.perf_counter()
+    func()
+    time_diff = time.perf_counter() - time_start
+    if it >= warmup:
+      samples.append(time_diff)
+  return summarize(samples)
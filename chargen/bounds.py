@@ -0,0 +1,120 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Opaque region index.
+#
+# Most layers cover only a small part of each frame. The tight bounds of non-transparent pixels
+# of every frame of every layer are recorded once (empty frames as None) so that compositing can
+# blend only those regions. Layers are only decoded again when their content changed.
+
+import json, os
+
+import numpy
+
+from .layercache import decodeLayer, getSizes, hashFile, scanLayers
+from .layercache import loadIndex as loadLayerIndex
+
+
+file_index = "bounds.json"
+index_version = 1
+
+
+def getFrameBounds(pixels, fwidth, fheight):
+  # retrieves opaque bounds (x, y, width, height) of each frame, None for empty frames
+  opaque = pixels[..., 3] > 0
+  rows = opaque.shape[0] // fheight
+  cols = opaque.shape[1] // fwidth
+  grid = opaque[:rows * fheight, :cols * fwidth].reshape(rows, fheight, cols, fwidth)
+  # any opaque pixel by frame row/column of each frame
+  along_x = grid.any(axis=1)
+  along_y = grid.any(axis=3)
+  bounds = []
+  for row in range(rows):
+    for col in range(cols):
+      xs = numpy.flatnonzero(along_x[row, col])
+      if len(xs) == 0:
+        bounds.append(None)
+        continue
+      ys = numpy.flatnonzero(along_y[row, :, col])
+      bounds.append([int(xs[0]), int(ys[0]), int(xs[-1] - xs[0] + 1), int(ys[-1] - ys[0] + 1)])
+  return bounds
+
+def getRowRects(bounds, fwidth, fheight, cols):
+  # retrieves (frame row, x, y, width, height) in sheet coordinates enclosing the non-empty frames
+  # of each row, rows are blended separately as they can be offset in different directions
+  rects = []
+  for row in range(len(bounds) // cols):
+    frames = [(col, f) for col, f in enumerate(bounds[row*cols:(row+1)*cols]) if f is not None]
+    if not frames:
+      continue
+    x0 = min(col * fwidth + f[0] for col, f in frames)
+    x1 = max(col * fwidth + f[0] + f[2] for col, f in frames)
+    y0 = min(f[1] for col, f in frames)
+    y1 = max(f[1] + f[3] for col, f in frames)
+    rects.append((row, x0, row * fheight + y0, x1 - x0, y1 - y0))
+  return numpy.array(rects, dtype=numpy.int32).reshape(-1, 5)
+
+def loadIndex(dir_cache):
+  file_bounds = os.path.join(dir_cache, file_index)
+  if not os.path.isfile(file_bounds):
+    return {"version": index_version, "layers": {}}
+  fopen = open(file_bounds, "r", encoding="utf-8")
+  try:
+    index = json.load(fopen)
+  except ValueError:
+    index = {}
+  fopen.close()
+  if index.get("version") != index_version:
+    return {"version": index_version, "layers": {}}
+  return index
+
+def load(dir_cache):
+  # retrieves frame bounds indexed by layer path relative to assets directory, only entries of
+  # the same content as the layer cache in dir_cache are used so that bounds always match the
+  # pixels retrieved from it
+  hashes = {}
+  for info in loadLayerIndex(dir_cache)["sizes"].values():
+    for filepath, entry in info["layers"].items():
+      hashes[filepath] = entry["hash"]
+  return {filepath: entry["frames"] for filepath, entry in loadIndex(dir_cache)["layers"].items()
+      if hashes.get(filepath) == entry["hash"]}
+
+def update(dir_assets, dir_cache, verbose=False):
+  # records bounds of new & changed layers, returns list of refreshed layer paths
+  if not os.path.isdir(dir_cache):
+    os.makedirs(dir_cache)
+  index_old = loadIndex(dir_cache)
+  layers_old = index_old["layers"]
+  index = {"version": index_version, "layers": {}}
+  refreshed = []
+  for size in getSizes(dir_assets):
+    fwidth, fheight = [int(d) for d in size.split("x")]
+    for filepath in scanLayers(dir_assets, size):
+      file_layer = os.path.join(dir_assets, os.path.normpath(filepath))
+      stat = os.stat(file_layer)
+      entry = dict(layers_old[filepath]) if filepath in layers_old else None
+      if entry and (entry["mtime"] != stat.st_mtime_ns or entry["bytes"] != stat.st_size):
+        digest = hashFile(file_layer)
+        entry = dict(entry, hash=digest) if digest == entry["hash"] else None
+      if entry is None:
+        width, height, data = decodeLayer(file_layer)
+        pixels = numpy.frombuffer(data, dtype=numpy.uint8).reshape((height, width, 4))
+        entry = {"hash": hashFile(file_layer), "frames": getFrameBounds(pixels, fwidth, fheight)}
+        refreshed.append(filepath)
+        if verbose:
+          print("bounds '{}'".format(file_layer))
+      entry.update(mtime=stat.st_mtime_ns, bytes=stat.st_size)
+      index["layers"][filepath] = entry
+
+  if index != index_old:
+    file_bounds = os.path.join(dir_cache, file_index)
+    fopen = open(file_bounds + ".tmp", "w", encoding="utf-8")
+    json.dump(index, fopen, separators=(",", ":"), sort_keys=True)
+    fopen.close()
+    os.replace(file_bounds + ".tmp", file_bounds)
+  return refreshed
@@ -0,0 +1,374 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Script & stylesheet bundling.
+#
+# ES modules reachable from the entry scripts of a page are concatenated in evaluation order (depth
+# first, imports before importers) into a single module. Imports are removed & exports become
+# plain declarations so all modules share one scope, top level names must therefore be unique.
+# Only named imports of relative modules are supported. Stylesheets are bundled the same way
+# following @import rules.
+#
+# Comments & whitespace are stripped but line breaks are kept, so automatic semicolon insertion is
+# unaffected & each line of a bundle maps to a single line of its source (see concatenate).
+
+import json, os, posixpath, re
+
+
+# JavaScript tokens, regular expression literals are matched separately as they depend on context
+re_js_token = re.compile(r"""
+  (?P<space>\s+)
+  |(?P<comment>//[^\n]*|/\*.*?(?:\*/|$))
+  |(?P<string>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+  |(?P<template>`(?:\\.|[^`\\])*`)
+  |(?P<word>[\w$]+)
+  |(?P<punct>.)
+""", re.S | re.X)
+re_js_regex = re.compile(r"/(?:\\.|\[(?:\\.|[^\]\\\n])*\]|[^/\\\n\[])+/[A-Za-z]*")
+# a slash following these tokens begins a regular expression rather than a division
+regex_preceding = set("(,=:[!&|?{};+-*%<>~^") | {"return", "typeof", "case", "do", "else", "in",
+    "of", "new", "delete", "void", "throw", "yield", "await"}
+declarations = ("const", "let", "var", "function", "class")
+
+re_css_token = re.compile(r"""
+  (?P<space>\s+)
+  |(?P<comment>/\*.*?(?:\*/|$))
+  |(?P<string>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+  |(?P<url>url\(\s*(?:"[^"\n]*"|'[^'\n]*'|[^)\s]*)\s*\))
+  |(?P<word>[^\s"'/{}:;,>()]+|/)
+  |(?P<punct>.)
+""", re.S | re.X)
+# characters that never need to be separated from neighbouring tokens by whitespace
+css_separators = set("{};,>()")
+
+vlq_digits = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+
+
+class Token:
+  def __init__(self, kind, value, line, col, space=False):
+    self.kind = kind
+    self.value = value
+    self.line = line
+    self.col = col
+    # token was preceded by whitespace or a comment on the same line
+    self.space = space
+
+
+# --- UTILITY FUNCTIONS --- #
+
+def readSource(dir_root, relpath):
+  filepath = os.path.join(dir_root, os.path.normpath(relpath))
+  if not os.path.isfile(filepath):
+    raise ValueError("file not found: {}".format(relpath))
+  fopen = open(filepath, "r", encoding="utf-8")
+  contents = fopen.read().replace("\r\n", "\n")
+  fopen.close()
+  return contents
+
+def resolvePath(relpath, ref):
+  # retrieves path relative to root directory of file referenced in relpath
+  return posixpath.normpath(posixpath.join(posixpath.dirname(relpath), ref))
+
+def getBundlePath(relpaths, ext):
+  # bundles are named after their entries (e.g. script/debug-main.bundle.js)
+  stems = [posixpath.splitext(posixpath.basename(r))[0] for r in relpaths]
+  return posixpath.join(posixpath.dirname(relpaths[0]), "-".join(stems) + ".bundle" + ext)
+
+def tokenize(contents, pattern, js=False):
+  # retrieves significant tokens, whitespace & comments only set space of following token
+  tokens = []
+  line, line_start, pos = 0, 0, 0
+  space = False
+  while pos < len(contents):
+    match = None
+    if js and contents[pos] == "/" and contents[pos+1:pos+2] not in ("/", "*") \
+        and (not tokens or tokens[-1].value in regex_preceding):
+      match = re_js_regex.match(contents, pos)
+      kind = "regex"
+    if match is None:
+      match = pattern.match(contents, pos)
+      kind = match.lastgroup
+    value = match.group(0)
+    if kind in ("space", "comment"):
+      space = True
+    else:
+      tokens.append(Token(kind, value, line, pos - line_start, space))
+      space = False
+    newlines = value.count("\n")
+    if newlines:
+      line += newlines
+      line_start = pos + value.rindex("\n") + 1
+      space = False
+    pos = match.end()
+  return tokens
+
+def needsSpace(prev, token, js=True):
+  if not token.space:
+    return False
+  if not js:
+    return prev.value[-1] not in css_separators and prev.value[-1] != ":" \
+        and token.value[0] not in css_separators
+  pair = prev.value[-1] + token.value[0]
+  return (re.match(r"[\w$]{2}", pair) is not None or pair in ("++", "--", "//", "/*", "+-", "-+")
+      or (prev.kind == "regex" and re.match(r"[\w$]", token.value[0]) is not None))
+
+def joinLines(tokens, js=True):
+  # retrieves [(source line, source column, text)] keeping line breaks of source
+  lines = []
+  prev = None
+  for token in tokens:
+    if prev is None or token.line != prev.line + prev.value.count("\n"):
+      lines.append([token.line, token.col, token.value])
+    else:
+      lines[-1][2] += (" " if needsSpace(prev, token, js) else "") + token.value
+    prev = token
+  return lines
+
+
+# --- JAVASCRIPT --- #
+
+def isStatementStart(tokens, idx):
+  if idx == 0:
+    return True
+  prev = tokens[idx-1]
+  if prev.value in (";", "{", "}", ")", "else"):
+    return True
+  # line break ends statement if previous token cannot be continued (automatic semicolon)
+  return prev.line < tokens[idx].line and (prev.kind in ("word", "string") or prev.value == "]")
+
+def findClosing(tokens, idx):
+  # retrieves index of token closing bracket at idx
+  depth = 0
+  for pos in range(idx, len(tokens)):
+    if tokens[pos].kind != "punct":
+      continue
+    if tokens[pos].value in "([{":
+      depth += 1
+    elif tokens[pos].value in ")]}":
+      depth -= 1
+      if depth == 0:
+        return pos
+  raise ValueError("unbalanced '{}' at line {}".format(tokens[idx].value, tokens[idx].line + 1))
+
+def stripDebug(tokens):
+  # replaces message.debug(...) statements with empty statements
+  result = []
+  idx = 0
+  while idx < len(tokens):
+    if [t.value for t in tokens[idx:idx+4]] == ["message", ".", "debug", "("] \
+        and isStatementStart(tokens, idx):
+      end = findClosing(tokens, idx + 3)
+      if end + 1 < len(tokens) and tokens[end+1].value == ";":
+        end += 1
+      result.append(Token("punct", ";", tokens[idx].line, tokens[idx].col, tokens[idx].space))
+      idx = end + 1
+      continue
+    result.append(tokens[idx])
+    idx += 1
+  return result
+
+def parseModule(relpath, tokens):
+  # removes import & export statements, retrieves (tokens, [(module, [names])], exported names,
+  # top level names)
+  result = []
+  imports = []
+  exported = []
+  names = []
+  depth = 0
+  idx = 0
+  while idx < len(tokens):
+    token = tokens[idx]
+    if depth == 0 and token.kind == "word" and token.value == "import" \
+        and idx + 1 < len(tokens) and tokens[idx+1].value == "{":
+      end = findClosing(tokens, idx + 1)
+      imported = [t.value for t in tokens[idx+2:end] if t.value != ","]
+      if "as" in imported or end + 2 >= len(tokens) or tokens[end+1].value != "from" \
+          or tokens[end+2].kind != "string":
+        raise ValueError("unsupported import at line {} of {}".format(token.line + 1, relpath))
+      spec = tokens[end+2].value[1:-1]
+      if not spec.startswith(("./", "../")):
+        raise ValueError("cannot bundle module '{}' imported by {}".format(spec, relpath))
+      imports.append((resolvePath(relpath, spec), imported))
+      idx = end + 3
+      if idx < len(tokens) and tokens[idx].value == ";":
+        idx += 1
+      continue
+    if depth == 0 and token.kind == "word" and token.value in ("import", "export"):
+      if token.value == "import" or idx + 2 >= len(tokens) \
+          or tokens[idx+1].value not in declarations:
+        raise ValueError("unsupported {} at line {} of {}".format(token.value, token.line + 1,
+            relpath))
+      exported.append(tokens[idx+2].value)
+      # declaration takes place of export keyword
+      tokens[idx+1].space = token.space
+      idx += 1
+      continue
+    if depth == 0 and token.kind == "word" and token.value in declarations \
+        and idx + 1 < len(tokens) and tokens[idx+1].kind == "word":
+      names.append(tokens[idx+1].value)
+    if token.kind == "punct":
+      if token.value in "([{":
+        depth += 1
+      elif token.value in ")]}":
+        depth -= 1
+    result.append(token)
+    idx += 1
+  return result, imports, exported, names
+
+def bundleScripts(dir_root, entries, strip_debug=False):
+  # retrieves (bundle, source map) of modules imported by entry scripts, paths are relative to
+  # dir_root
+  modules = {}
+  order = []
+  owners = {}
+
+  def load(relpath):
+    if relpath in modules:
+      return
+    contents = readSource(dir_root, relpath)
+    tokens = tokenize(contents, re_js_token, True)
+    if strip_debug:
+      tokens = stripDebug(tokens)
+    tokens, imports, exported, names = parseModule(relpath, tokens)
+    modules[relpath] = {"contents": contents, "tokens": tokens, "exported": exported}
+    for name in names:
+      if name in owners:
+        raise ValueError("top level name '{}' declared in {} & {}".format(name, owners[name],
+            relpath))
+      owners[name] = relpath
+    # imports are evaluated first, a module that is already being loaded is part of a circular
+    # import & is evaluated after its dependencies like in the browser
+    for dependency, imported in imports:
+      load(dependency)
+      missing = [n for n in imported if n not in modules[dependency]["exported"]]
+      if missing:
+        raise ValueError("{} imports {} not exported by {}".format(relpath, ", ".join(missing),
+            dependency))
+    order.append(relpath)
+
+  for entry in entries:
+    load(entry)
+  return concatenate(dir_root, entries, order, modules, ".js")
+
+
+# --- CSS --- #
+
+def bundleStyles(dir_root, entries):
+  # retrieves (bundle, source map) of stylesheets & their imports
+  bundle_dir = posixpath.dirname(entries[0])
+  modules = {}
+  order = []
+
+  def load(relpath):
+    if relpath in modules:
+      return
+    contents = readSource(dir_root, relpath)
+    # imported stylesheet is included only once even if circular
+    modules[relpath] = {"contents": contents, "tokens": []}
+    tokens = modules[relpath]["tokens"]
+    source = tokenize(contents, re_css_token)
+    idx = 0
+    while idx < len(source):
+      token = source[idx]
+      if token.value == "@import" and idx + 1 < len(source):
+        target = source[idx+1]
+        end = idx + 2
+        while end < len(source) and source[end].value != ";":
+          end += 1
+        if target.kind == "url":
+          target = target.value[4:-1].strip().strip("\"'")
+        elif target.kind == "string":
+          target = target.value[1:-1]
+        else:
+          raise ValueError("unsupported import at line {} of {}".format(token.line + 1, relpath))
+        load(resolvePath(relpath, target))
+        idx = end + 1
+        continue
+      if token.kind == "url":
+        # references are relative to bundle
+        ref = token.value[4:-1].strip()
+        quote = ref[0] if ref[:1] in ("\"", "'") else ""
+        ref = ref.strip("\"'")
+        if ref and not ref.startswith(("/", "#", "data:")) and ":" not in ref:
+          ref = posixpath.relpath(resolvePath(relpath, ref), bundle_dir or ".")
+        token.value = "url({0}{1}{0})".format(quote, ref)
+      elif token.value == "}" and tokens and tokens[-1].value == ";":
+        # last declaration of a block needs no terminator
+        tokens.pop()
+      tokens.append(token)
+      idx += 1
+    order.append(relpath)
+
+  for entry in entries:
+    load(entry)
+  return concatenate(dir_root, entries, order, modules, ".css")
+
+
+# --- OUTPUT --- #
+
+def encodeVlq(value):
+  value = (-value << 1) | 1 if value < 0 else value << 1
+  encoded = ""
+  while True:
+    digit = value & 31
+    value >>= 5
+    encoded += vlq_digits[digit | (32 if value else 0)]
+    if not value:
+      return encoded
+
+def concatenate(dir_root, entries, order, modules, ext):
+  # retrieves (bundle, source map) of modules in order
+  bundle_path = getBundlePath(entries, ext)
+  bundle_dir = posixpath.dirname(bundle_path)
+  lines = []
+  mappings = []
+  # source map fields are relative to previous segment
+  last = [0, 0, 0]
+  for source_idx, relpath in enumerate(order):
+    for line, col, text in joinLines(modules[relpath]["tokens"], ext == ".js"):
+      lines.append(text)
+      segment = [source_idx, line, col]
+      mappings.append("A" + "".join(encodeVlq(segment[i] - last[i]) for i in range(3)))
+      last = segment
+      # continuation lines of multiline tokens (e.g. template literals) are not mapped
+      mappings += [""] * text.count("\n")
+
+  name_map = posixpath.basename(bundle_path) + ".map"
+  if ext == ".css":
+    lines.append("/*# sourceMappingURL={} */".format(name_map))
+  else:
+    lines.append("//# sourceMappingURL={}".format(name_map))
+  sourcemap = {
+    "version": 3,
+    "file": posixpath.basename(bundle_path),
+    "sources": [posixpath.relpath(r, bundle_dir or ".") for r in order],
+    "sourcesContent": [modules[r]["contents"] for r in order],
+    "names": [],
+    "mappings": ";".join(mappings)
+  }
+  return "\n".join(lines) + "\n", sourcemap
+
+def write(dir_root, entries, ext, bundle, sourcemap):
+  # writes bundle & source map if changed, retrieves list of written paths relative to dir_root
+  bundle_path = getBundlePath(entries, ext)
+  written = []
+  for relpath, contents in ((bundle_path, bundle),
+      (bundle_path + ".map", json.dumps(sourcemap, separators=(",", ":")))):
+    filepath = os.path.join(dir_root, os.path.normpath(relpath))
+    if os.path.isfile(filepath):
+      fopen = open(filepath, "r", encoding="utf-8")
+      unchanged = fopen.read() == contents
+      fopen.close()
+      if unchanged:
+        continue
+    fopen = open(filepath + ".tmp", "w", encoding="utf-8")
+    fopen.write(contents)
+    fopen.close()
+    os.replace(filepath + ".tmp", filepath)
+    written.append(relpath)
+  return written
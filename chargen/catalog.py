@@ -0,0 +1,296 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Full catalogue export.
+#
+# Every valid combination of base & outfit layers is enumerated lazily per frame size. Outfit
+# layers with a body mapping follow the same rules as LayerManager.getBodyMapping & only indexes
+# whose images exist are used. Work can be split into shards (every n-th combination) & sheets are
+# streamed into archive parts that are finalized one at a time. Progress is checkpointed after each
+# part so that an interrupted export resumes from the last finished part. Sheets with identical
+# pixels are stored only once & an index lists the sheet used by every combination.
+
+import hashlib, io, json, math, os, re, tarfile, time
+
+from zipfile import ZIP_STORED, ZipFile, ZipInfo
+
+from . import compositor, layercache, lru
+
+
+file_checkpoint = "checkpoint.json"
+file_index = "index.jsonl"
+# changing this invalidates checkpoints of unfinished exports
+export_version = 1
+
+archive_formats = ("tar", "zip")
+part_size_default = 1000
+layer_bytes_default = 256 * 1024 * 1024
+
+
+# --- ENUMERATION --- #
+
+def getSizes(comp):
+  return [size for size in comp.layers if re.match(r"^\d+x\d+$", size)]
+
+def getAvailable(dir_assets, size):
+  # retrieves paths of existing layer images relative to assets directory
+  return set(layercache.scanLayers(dir_assets, size))
+
+def getCount(comp, size, category, layer, body=None):
+  count = comp.getLayerInfo(size, category, layer, body)
+  return count["indexes"] if isinstance(count, dict) else count
+
+def getOutfitOptions(comp, size, body, body_idx, available):
+  # retrieves list of (index, body mapping) usable for each outfit layer, index 0 is empty layer
+  options = []
+  for layer in compositor.outfit_layers:
+    info = comp.getLayerInfo(size, "outfit", layer)
+    choices = [(0, None)]
+    for idx in range(1, getCount(comp, size, "outfit", layer) + 1):
+      suffix = None
+      if isinstance(info, dict):
+        suffix = compositor.getBodyMapping(info["bodymap"], idx, body, body_idx)
+        if not suffix:
+          continue
+      if compositor.getOutfitImagePath(size, layer, idx, suffix) not in available:
+        continue
+      if layer == "detail" and compositor.getOutfitImagePath(size, layer, idx, "rear") \
+          not in available:
+        continue
+      choices.append((idx, suffix))
+    options.append(choices)
+  return options
+
+def getBaseOptions(comp, size, body, available):
+  # retrieves list of usable indexes for each base layer
+  options = []
+  for layer in compositor.base_layers:
+    choices = []
+    for idx in range(1, getCount(comp, size, "base", layer, body) + 1):
+      if compositor.getBaseImagePath(size, body, layer, idx) not in available:
+        continue
+      if layer in compositor.rear_layers and compositor.getBaseImagePath(size, body, layer, idx,
+          "rear") not in available:
+        continue
+      choices.append(idx)
+    options.append(choices)
+  return options
+
+def getName(size, body, base, outfit):
+  nodes = [size, body]
+  nodes += ["{}{}".format(layer, idx) for layer, idx in zip(compositor.base_layers, base)]
+  nodes += ["{}{}".format(layer, idx) for layer, (idx, suffix) in zip(compositor.outfit_layers,
+      outfit) if idx > 0]
+  return "-".join(nodes)
+
+def iterBlocks(comp, sizes=None):
+  # generates (size, body, options of each base & outfit layer) for every body index, outfit
+  # options are (index, body mapping) as mapping depends on body index
+  body_pos = compositor.base_layers.index("body")
+  for size in sizes or getSizes(comp):
+    available = getAvailable(comp.dir_assets, size)
+    for body in comp.getSizeInfo(size)["base"]["body"]:
+      base_options = getBaseOptions(comp, size, body, available)
+      for body_idx in base_options[body_pos]:
+        options = list(base_options)
+        options[body_pos] = [body_idx]
+        yield size, body, options + getOutfitOptions(comp, size, body, body_idx, available)
+
+def iterCombinations(comp, sizes=None, start=0, step=1):
+  # generates (size, body, base indexes, outfit options) of every step-th combination beginning at
+  # start, combinations are decoded from their position so that skipped ones cost nothing
+  base_count = len(compositor.base_layers)
+  offset = 0
+  for size, body, options in iterBlocks(comp, sizes):
+    count = math.prod(len(o) for o in options)
+    first = start - offset if start >= offset else -(offset - start) % step
+    for pos in range(first, count, step):
+      choices = []
+      for opts in reversed(options):
+        pos, digit = divmod(pos, len(opts))
+        choices.append(opts[digit])
+      choices.reverse()
+      yield size, body, tuple(choices[:base_count]), tuple(choices[base_count:])
+    offset += count
+
+def getSelection(size, body, base, outfit):
+  fwidth, fheight = compositor.parseSize(size)
+  return {
+    "size": {"width": fwidth, "height": fheight},
+    "type": body,
+    "layers": {
+      "base": dict(zip(compositor.base_layers, base)),
+      "outfit": {layer: idx for layer, (idx, suffix) in zip(compositor.outfit_layers, outfit)},
+      "bodymap": {layer: suffix for layer, (idx, suffix) in zip(compositor.outfit_layers, outfit)
+          if suffix}
+    }
+  }
+
+def iterSelections(comp, sizes=None, start=0, step=1):
+  # generates (name, selection) of combinations in a stable order
+  for combination in iterCombinations(comp, sizes, start, step):
+    yield getName(*combination), getSelection(*combination)
+
+def getTotal(comp, sizes=None):
+  return sum(math.prod(len(o) for o in options) for size, body, options in iterBlocks(comp, sizes))
+
+
+# --- ARCHIVES --- #
+
+class ArchivePart:
+  # archive that members are streamed into, only complete once closed
+  def __init__(self, filepath, fmt):
+    self.filepath = filepath
+    self.fmt = fmt
+    self.count = 0
+    if fmt == "tar":
+      self.archive = tarfile.open(filepath + ".tmp", "w")
+    else:
+      self.archive = ZipFile(filepath + ".tmp", "w")
+
+  def add(self, arcname, data):
+    if self.fmt == "tar":
+      tinfo = tarfile.TarInfo(arcname)
+      tinfo.size = len(data)
+      tinfo.mtime = int(time.time())
+      self.archive.addfile(tinfo, io.BytesIO(data))
+    else:
+      zinfo = ZipInfo(arcname, time.localtime()[:6])
+      # sheets are already compressed
+      zinfo.compress_type = ZIP_STORED
+      self.archive.writestr(zinfo, data)
+    self.count += 1
+
+  def close(self):
+    self.archive.close()
+    os.replace(self.filepath + ".tmp", self.filepath)
+
+  def discard(self):
+    self.archive.close()
+    os.remove(self.filepath + ".tmp")
+
+
+# --- EXPORT --- #
+
+def getPartPath(dir_export, part, fmt):
+  return os.path.join(dir_export, "catalog-{:04d}.{}".format(part, fmt))
+
+def loadCheckpoint(dir_export, settings):
+  # retrieves checkpoint of unfinished export with same settings or None
+  filepath = os.path.join(dir_export, file_checkpoint)
+  if not os.path.isfile(filepath):
+    return None
+  fopen = open(filepath, "r", encoding="utf-8")
+  try:
+    checkpoint = json.load(fopen)
+  except ValueError:
+    checkpoint = None
+  fopen.close()
+  if not checkpoint or checkpoint.get("settings") != settings:
+    return None
+  return checkpoint
+
+def writeCheckpoint(dir_export, checkpoint):
+  filepath = os.path.join(dir_export, file_checkpoint)
+  fopen = open(filepath + ".tmp", "w", encoding="utf-8")
+  json.dump(checkpoint, fopen, indent=2, sort_keys=True)
+  fopen.close()
+  os.replace(filepath + ".tmp", filepath)
+
+def restore(dir_export, checkpoint, fmt):
+  # discards output written after checkpoint, retrieves hashes of sheets already stored
+  file_idx = os.path.join(dir_export, file_index)
+  stored = set()
+  if os.path.isfile(file_idx):
+    fopen = open(file_idx, "r+b")
+    fopen.truncate(checkpoint["index_bytes"])
+    fopen.seek(0)
+    for line in fopen:
+      stored.add(json.loads(line)["sheet"])
+    fopen.close()
+  for obj in os.listdir(dir_export):
+    match = re.match(r"^catalog-(\d+)\.{}(\.tmp)?$".format(fmt), obj)
+    if match and (match.group(2) or int(match.group(1)) >= checkpoint["parts"]):
+      os.remove(os.path.join(dir_export, obj))
+  return stored
+
+def export(dir_export, dir_assets=None, layer_cache=None, shard=0, shards=1, fmt="tar",
+    part_size=part_size_default, sizes=None, progress=None):
+  # exports combinations of a shard, returns table of totals
+  if fmt not in archive_formats:
+    raise ValueError("unsupported archive format: {}".format(fmt))
+  if shards < 1 or shard < 0 or shard >= shards:
+    raise ValueError("invalid shard {} of {}".format(shard, shards))
+  if not os.path.isdir(dir_export):
+    os.makedirs(dir_export)
+
+  comp = compositor.Compositor(dir_assets, layer_cache, lru.LRUCache(layer_bytes_default))
+  sizes = sizes or getSizes(comp)
+  settings = {"version": export_version, "shard": shard, "shards": shards, "format": fmt,
+      "part_size": part_size, "sizes": sizes}
+  checkpoint = loadCheckpoint(dir_export, settings)
+  totals = {"resumed": 0, "exported": 0, "sheets": 0, "duplicates": 0}
+  if checkpoint:
+    if checkpoint.get("complete"):
+      totals["resumed"] = checkpoint["position"]
+      return totals
+    stored = restore(dir_export, checkpoint, fmt)
+    totals["resumed"] = checkpoint["position"]
+  else:
+    checkpoint = {"settings": settings, "position": 0, "parts": 0, "index_bytes": 0}
+    stored = set()
+    restore(dir_export, checkpoint, fmt)
+
+  # every n-th combination is assigned to the same shard, combinations finished before
+  # interruption are skipped
+  selections = iterSelections(comp, sizes, shard + checkpoint["position"] * shards, shards)
+  fidx = open(os.path.join(dir_export, file_index), "ab")
+  part = None
+  position = checkpoint["position"]
+  try:
+    for name, selection in selections:
+      pixels = comp.render(selection)
+      hasher = hashlib.sha1("{}x{}\n".format(pixels.shape[1], pixels.shape[0]).encode("utf-8"))
+      hasher.update(pixels.data)
+      digest = hasher.hexdigest()
+      if digest in stored:
+        totals["duplicates"] += 1
+      else:
+        if part is None:
+          part = ArchivePart(getPartPath(dir_export, checkpoint["parts"], fmt), fmt)
+        part.add("sheets/{}.png".format(digest), compositor.encodeImage(pixels))
+        stored.add(digest)
+        totals["sheets"] += 1
+      fidx.write((json.dumps({"name": name, "sheet": digest, "selection": selection},
+          sort_keys=True) + "\n").encode("utf-8"))
+      position += 1
+      totals["exported"] += 1
+      if progress:
+        progress(name, position)
+
+      if part is not None and part.count >= part_size:
+        part.close()
+        part = None
+        fidx.flush()
+        checkpoint.update(position=position, parts=checkpoint["parts"] + 1,
+            index_bytes=fidx.tell())
+        writeCheckpoint(dir_export, checkpoint)
+  except BaseException:
+    # unfinished part is redone when export is resumed
+    if part is not None:
+      part.discard()
+    fidx.close()
+    raise
+  if part is not None:
+    part.close()
+    checkpoint["parts"] += 1
+  fidx.close()
+  checkpoint.update(position=position, index_bytes=os.path.getsize(os.path.join(dir_export,
+      file_index)), complete=True)
+  writeCheckpoint(dir_export, checkpoint)
+  return totals
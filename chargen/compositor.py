@@ -0,0 +1,250 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Headless sprite sheet compositor.
+#
+# Follows the same draw order as PreviewGenerator.renderPreview (script/PreviewGenerator.js) so
+# that character sheets can be generated in batches without a browser.
+
+import errno, io, json, math, os
+
+import numpy
+from PIL import Image
+
+from . import bounds as layer_bounds
+from .layers import base_layers, frames_x, frames_y, getBaseImagePath, getBodyMapping, \
+    getIndexString, getOutfitImagePath, outfit_layers, parseSize, rear_layers, unique_layers
+
+
+dir_assets_default = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "assets")
+
+# outfit layers drawn on head
+head_layers = ("hair", "mask", "hat")
+# position in draw list where hair is inserted so that it is drawn under ears
+hair_draw_index = 5
+
+# head layer offsets relative to 48x64 frames
+head_offsets = {
+  "child": (0, 6),
+  "dwarf": (0, 4),
+  "elder": (4, 5),
+  "tall": (0, -5)
+}
+
+
+# --- UTILITY FUNCTIONS --- #
+
+def getSizeString(width, height):
+  return "{}x{}".format(width, height)
+
+def getHeadOffset(body, fwidth, fheight):
+  offset = head_offsets.get(body)
+  if not offset:
+    return (0, 0)
+  return (math.floor(offset[0] * (fwidth / 48)), math.floor(offset[1] * (fheight / 64)))
+
+def getSelectionKey(selection):
+  # canonical representation of selection, name does not affect result
+  selection = dict(selection)
+  selection.pop("name", None)
+  if "size" in selection:
+    selection["size"] = getSizeString(*parseSize(selection["size"]))
+  return json.dumps(selection, sort_keys=True, separators=(",", ":"))
+
+def saveImage(pixels, filepath):
+  Image.fromarray(pixels, "RGBA").save(filepath, "PNG")
+
+def encodeImage(pixels):
+  out = io.BytesIO()
+  Image.fromarray(pixels, "RGBA").save(out, "PNG")
+  return out.getvalue()
+
+
+class Compositor:
+  def __init__(self, dir_assets=None, layer_cache=None, cache=None, bounds=None):
+    self.dir_assets = dir_assets or dir_assets_default
+    # optional LayerCache instance to retrieve pre-decoded layers from
+    self.layer_cache = layer_cache
+    fopen = open(os.path.join(self.dir_assets, "layers.json"), "r", encoding="utf-8")
+    self.layers = json.load(fopen)
+    fopen.close()
+    # opaque frame bounds indexed by layer path (see bounds.update), indexed alongside layer cache
+    # by default & bounds of layers not in index are found when layer is loaded
+    if bounds is None:
+      bounds = layer_bounds.load(layer_cache.dir_cache) if layer_cache is not None else {}
+    self.bounds = bounds
+    # decoded layers indexed by path relative to assets directory & replaced colors, any mapping
+    # with get & item assignment can be used (e.g. lru.LRUCache to bound memory)
+    self.cache = cache if cache is not None else {}
+    # palette swapping is set up when first selection with colors is rendered
+    self.recolorer = None
+
+  def getSizeInfo(self, size):
+    if size not in self.layers:
+      raise ValueError("no layer information for size: {}".format(size))
+    return self.layers[size]
+
+  def getLayerInfo(self, size, category, layer, body=None):
+    info = self.getSizeInfo(size)[category]
+    if category == "base" and layer in unique_layers:
+      return info["body"][body].get(layer, 0)
+    return info.get(layer, 0)
+
+  def checkIndex(self, size, category, layer, idx, body=None):
+    count = self.getLayerInfo(size, category, layer, body)
+    if isinstance(count, dict):
+      count = count["indexes"]
+    idx = int(idx)
+    if idx < 1 or idx > count:
+      raise ValueError("{} layer '{}' index out of range for {}: {}".format(category, layer, size,
+          idx))
+    return idx
+
+  def getDrawList(self, selection):
+    if "size" not in selection or "type" not in selection:
+      raise ValueError("selection must define 'size' & 'type'")
+    fwidth, fheight = parseSize(selection["size"])
+    size = getSizeString(fwidth, fheight)
+    body = selection["type"]
+    if body not in self.getSizeInfo(size)["base"]["body"]:
+      raise ValueError("unknown body type for {}: {}".format(size, body))
+
+    layers = selection.get("layers", {})
+    sel_base = layers.get("base", {})
+    sel_outfit = layers.get("outfit", {})
+    bodymap = layers.get("bodymap")
+    visible = selection.get("visible", base_layers)
+    offset_head = getHeadOffset(body, fwidth, fheight)
+    offset_none = (0, 0)
+
+    # preserve order that images should be drawn, hidden layers keep their position so that
+    # spliced layers are inserted at the same index as in preview
+    draw = []
+    for layer in base_layers:
+      idx = self.checkIndex(size, "base", layer, sel_base.get(layer, 1), body)
+      offset = offset_none if layer in unique_layers else offset_head
+      draw.append((getBaseImagePath(size, body, layer, idx), offset, layer not in visible))
+
+    for layer in rear_layers:
+      draw.insert(0, (getBaseImagePath(size, body, layer, sel_base.get(layer, 1), "rear"),
+          offset_head, layer not in visible))
+
+    for layer in outfit_layers:
+      idx = int(sel_outfit.get(layer, 0))
+      if idx == 0:
+        # ignore empty layers
+        continue
+      idx = self.checkIndex(size, "outfit", layer, idx)
+      if bodymap is not None:
+        suffix = bodymap.get(layer)
+      else:
+        info = self.getLayerInfo(size, "outfit", layer)
+        suffix = None
+        if isinstance(info, dict):
+          suffix = getBodyMapping(info["bodymap"], idx, body, sel_base.get("body", 1))
+          if not suffix:
+            raise ValueError("outfit layer '{}' index {} not available for body {}-{}".format(
+                layer, idx, body, getIndexString(sel_base.get("body", 1))))
+      offset = offset_head if layer in head_layers else offset_none
+      entry = (getOutfitImagePath(size, layer, idx, suffix), offset, False)
+      if layer == "hair":
+        # draw hair under ears
+        draw.insert(hair_draw_index, entry)
+      else:
+        draw.append(entry)
+
+    # detail layer has separate rear layer & is bottom-most layer
+    if int(sel_outfit.get("detail", 0)) > 0:
+      draw.insert(0, (getOutfitImagePath(size, "detail", sel_outfit["detail"], "rear"), offset_none,
+          False))
+
+    return [(filepath, offset) for filepath, offset, hide in draw if not hide]
+
+  def getRecolorer(self):
+    if self.recolorer is None:
+      from .palette import Recolorer
+      self.recolorer = Recolorer(self.dir_assets)
+    return self.recolorer
+
+  def loadLayer(self, filepath, colors=None):
+    # colors is optional table of color category -> ramp name (see palette.Recolorer)
+    layer_colors = ()
+    if colors:
+      layer_colors = self.getRecolorer().getColors(filepath.split("/")[-2], colors)
+    key = (filepath, layer_colors)
+    layer = self.cache.get(key)
+    if layer is not None:
+      return layer
+    if self.layer_cache is not None and filepath in self.layer_cache:
+      pixels = self.layer_cache.getPixels(filepath)
+    else:
+      file_layer = os.path.join(self.dir_assets, os.path.normpath(filepath))
+      if not os.path.isfile(file_layer):
+        raise FileNotFoundError(errno.ENOENT, "layer not found", file_layer)
+      img = Image.open(file_layer)
+      pixels = numpy.asarray(img.convert("RGBA"))
+      img.close()
+    fwidth, fheight = parseSize(filepath.split("/")[0])
+    frames = self.bounds.get(filepath)
+    if frames is None:
+      frames = layer_bounds.getFrameBounds(pixels, fwidth, fheight)
+    # recoloring keeps alpha so bounds are the same for all colors
+    if layer_colors:
+      pixels = self.getRecolorer().recolor(pixels, filepath.split("/")[-2], dict(layer_colors))
+    pixels = pixels.astype(numpy.float32) / 255
+    # layers are stored with premultiplied alpha so blending is a single multiply-add
+    pixels[..., :3] *= pixels[..., 3:]
+    layer = (pixels, numpy.repeat(1 - pixels[..., 3:], 4, axis=2),
+        layer_bounds.getRowRects(frames, fwidth, fheight, frames_x))
+    self.cache[key] = layer
+    return layer
+
+  def blend(self, canvas, layer, offset, fheight):
+    # only opaque region of each frame row is blended, empty rows are skipped
+    src, inverse, rects = layer
+    offset_x, offset_y = offset
+    # east/west facing frames are offset horizontally in opposite directions
+    shift = (0, offset_x, 0, -offset_x)
+    cheight, cwidth = canvas.shape[:2]
+    for row, x, y, w, h in rects.tolist():
+      dx = shift[row]
+      x0 = max(0, x + dx)
+      x1 = min(cwidth, x + w + dx)
+      y0 = max(0, y + offset_y)
+      y1 = min(cheight, y + h + offset_y)
+      if x0 >= x1 or y0 >= y1:
+        continue
+      sx = x0 - dx
+      sy = y0 - offset_y
+      region = canvas[y0:y1, x0:x1]
+      region *= inverse[sy:sy+y1-y0, sx:sx+x1-x0]
+      region += src[sy:sy+y1-y0, sx:sx+x1-x0]
+
+  def render(self, selection):
+    fwidth, fheight = parseSize(selection["size"])
+    draw = self.getDrawList(selection)
+    canvas = numpy.zeros((fheight * frames_y, fwidth * frames_x, 4), dtype=numpy.float32)
+    colors = selection.get("colors")
+    for filepath, offset in draw:
+      self.blend(canvas, self.loadLayer(filepath, colors), offset, fheight)
+
+    # convert from premultiplied alpha, fully transparent pixels stay 0
+    canvas[..., :3] /= numpy.maximum(canvas[..., 3:], 1 / 255)
+    canvas *= 255
+    canvas += 0.5
+    numpy.minimum(canvas, 255, out=canvas)
+    return canvas.astype(numpy.uint8)
+
+  def renderMany(self, selections):
+    for selection in selections:
+      yield self.render(selection)
+
+
+def renderMany(selections, dir_assets=None, layer_cache=None):
+  return Compositor(dir_assets, layer_cache).renderMany(selections)
@@ -0,0 +1,180 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Pixel art reduction of 48x64 layers to 24x32.
+#
+# Each 2x2 block is replaced by its most frequent color (darkest on ties so that outlines survive)
+# & is only opaque if at least half of it is, so colors & alpha values are never mixed. Layers of a
+# category are reduced together as a batch. Head offsets are not part of layer images, they are
+# scaled for the frame size when drawn (see compositor.getHeadOffset) so head layers are reduced
+# at the standard body position like the existing 24x32 layers.
+
+import json, os, shutil
+
+import numpy
+from PIL import Image
+
+from . import layercache
+from .scalex import pack, unpack
+
+
+source_size = "48x64"
+target_size = "24x32"
+# changing this invalidates reduced layers
+method_version = 1
+
+
+def reduce(pixels):
+  # reduces image or batch of images to half width & height
+  packed = pack(pixels)
+  height, width = packed.shape[-2:]
+  if height % 2 or width % 2:
+    raise ValueError("cannot reduce image with odd dimensions: {}x{}".format(width, height))
+  lead = packed.shape[:-2]
+  # the 4 pixels of each block along last axis
+  blocks = packed.reshape(lead + (height // 2, 2, width // 2, 2))
+  blocks = numpy.moveaxis(blocks, -3, -2).reshape(lead + (height // 2, width // 2, 4))
+  opaque = blocks != 0
+  counts = ((blocks[..., :, numpy.newaxis] == blocks[..., numpy.newaxis, :])
+      & opaque[..., numpy.newaxis, :]).sum(axis=-1)
+  rgb = unpack(blocks)[..., :3].astype(numpy.int32)
+  luma = rgb[..., 0] * 299 + rgb[..., 1] * 587 + rgb[..., 2] * 114
+  score = numpy.where(opaque, counts * (1 << 20) - luma, -1)
+  chosen = numpy.take_along_axis(blocks, score.argmax(axis=-1)[..., numpy.newaxis], axis=-1)[..., 0]
+  return unpack(numpy.where(opaque.sum(axis=-1) >= 2, chosen, 0))
+
+def getTargetPath(filepath):
+  return "/".join([target_size] + filepath.split("/")[1:])
+
+def getCategory(filepath):
+  # retrieves category directory of layer relative to frame size directory (e.g. outfit/hair)
+  return "/".join(filepath.split("/")[1:-1])
+
+def scanCategories(dir_assets, categories=None):
+  # retrieves paths of source layers in categories (all if None) relative to assets directory
+  layers = layercache.scanLayers(dir_assets, source_size)
+  if categories is None:
+    return layers
+  unknown = set(categories) - set(getCategory(f) for f in layers)
+  if unknown:
+    raise ValueError("no {} layers in categories: {}".format(source_size,
+        ", ".join(sorted(unknown))))
+  return [f for f in layers if getCategory(f) in categories]
+
+def loadIndex(dir_target):
+  file_index = os.path.join(dir_target, "index.json")
+  if not os.path.isfile(file_index):
+    return {}
+  fopen = open(file_index, "r", encoding="utf-8")
+  try:
+    index = json.load(fopen)
+  except ValueError:
+    index = {}
+  fopen.close()
+  if index.get("version") != method_version:
+    return {}
+  return index.get("layers", {})
+
+def update(dir_assets, dir_target, categories=None, verbose=False):
+  # writes reduced copy of layers to target directory, returns list of refreshed source layers
+  index_old = loadIndex(dir_target)
+  index = dict(index_old)
+  refreshed = []
+  # layers are reduced by category as a batch (frames are even sized so blocks never cross them)
+  batches = {}
+  for filepath in scanCategories(dir_assets, categories):
+    file_layer = os.path.join(dir_assets, os.path.normpath(filepath))
+    digest = layercache.hashFile(file_layer)
+    index[filepath] = digest
+    file_reduced = os.path.join(dir_target, os.path.normpath(getTargetPath(filepath)))
+    if index_old.get(filepath) == digest and os.path.isfile(file_reduced):
+      continue
+    img = Image.open(file_layer)
+    pixels = numpy.asarray(img.convert("RGBA"))
+    img.close()
+    batches.setdefault((getCategory(filepath), pixels.shape), []).append((filepath, pixels))
+
+  for batch in batches.values():
+    reduced = reduce(numpy.stack([b[1] for b in batch]))
+    for idx in range(len(batch)):
+      file_reduced = os.path.join(dir_target, os.path.normpath(getTargetPath(batch[idx][0])))
+      if not os.path.isdir(os.path.dirname(file_reduced)):
+        os.makedirs(os.path.dirname(file_reduced))
+      Image.fromarray(reduced[idx], "RGBA").save(file_reduced, "PNG")
+      refreshed.append(batch[idx][0])
+      if verbose:
+        print("reduce '{}'".format(file_reduced))
+
+  # remove layers that no longer exist in assets
+  for filepath in list(index):
+    if not os.path.isfile(os.path.join(dir_assets, os.path.normpath(filepath))):
+      file_reduced = os.path.join(dir_target, os.path.normpath(getTargetPath(filepath)))
+      if os.path.isfile(file_reduced):
+        os.remove(file_reduced)
+      index.pop(filepath)
+  if index != index_old:
+    if not os.path.isdir(dir_target):
+      os.makedirs(dir_target)
+    fopen = open(os.path.join(dir_target, "index.json"), "w", encoding="utf-8")
+    json.dump({"version": method_version, "layers": index}, fopen, indent=2, sort_keys=True)
+    fopen.close()
+  return refreshed
+
+def install(dir_assets, dir_target, categories=None, verbose=False):
+  # copies reduced layers that don't exist in assets & raises counts in layers.json, existing
+  # layers are never replaced, returns list of installed layers
+  file_layers = os.path.join(dir_assets, "layers.json")
+  fopen = open(file_layers, "r", encoding="utf-8")
+  layers = json.load(fopen)
+  fopen.close()
+  info_source = layers[source_size]
+  info_target = layers.setdefault(target_size, {"base": {"body": {}}, "outfit": {}})
+
+  installed = []
+  for filepath in scanCategories(dir_assets, categories):
+    targetpath = getTargetPath(filepath)
+    file_installed = os.path.join(dir_assets, os.path.normpath(targetpath))
+    size, layer, body, idx, suffix = layercache.parseLayerPath(targetpath)
+    category = targetpath.split("/")[1]
+    parent_source = info_source[category]
+    parent_target = info_target.setdefault(category, {})
+    if body is not None:
+      parent_source = parent_source["body"][body]
+      parent_target = parent_target.setdefault("body", {}).setdefault(body, {})
+    count_source = parent_source.get(layer, 0)
+    # layers not listed in layers.json are not installed
+    if os.path.exists(file_installed) or idx > (count_source["indexes"]
+        if isinstance(count_source, dict) else count_source):
+      continue
+    if not os.path.isdir(os.path.dirname(file_installed)):
+      os.makedirs(os.path.dirname(file_installed))
+    shutil.copyfile(os.path.join(dir_target, os.path.normpath(targetpath)), file_installed)
+    installed.append(targetpath)
+    if verbose:
+      print("install '{}'".format(file_installed))
+
+    count = parent_target.get(layer, 0)
+    if isinstance(count_source, dict):
+      # body mapping of indexes that are new to target size is same as source size
+      if not isinstance(count, dict):
+        count = {"indexes": count, "bodymap": {}}
+      if idx > count["indexes"]:
+        for key, mapping in count_source["bodymap"].items():
+          if int(key.split("-")[0]) == idx:
+            count["bodymap"][key] = mapping
+      count["indexes"] = max(count["indexes"], idx)
+    else:
+      count = max(count, idx)
+    parent_target[layer] = count
+
+  if installed:
+    fopen = open(file_layers + ".tmp", "w", encoding="utf-8")
+    fopen.write(json.dumps(layers, indent=2) + "\n")
+    fopen.close()
+    os.replace(file_layers + ".tmp", file_layers)
+  return installed
@@ -0,0 +1,225 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Decoded layer cache.
+#
+# Every layer of a frame size is decoded once & stored as raw RGBA in a single blob file. An
+# index records the offset & dimensions of each layer so that consumers can memory-map the blob
+# & retrieve layers as NumPy views without decoding or copying.
+
+import errno, hashlib, json, mmap, os, re
+
+import numpy
+from PIL import Image
+
+
+file_index = "index.json"
+index_version = 1
+
+# matches layer filenames (e.g. 001.png, 001-rear.png, 001-standard-003.png)
+re_layer = re.compile(r"^(\d+)(?:-(.+))?\.png$")
+
+
+def getSizes(dir_assets):
+  sizes = []
+  for obj in sorted(os.listdir(dir_assets)):
+    if re.match(r"^\d+x\d+$", obj) and os.path.isdir(os.path.join(dir_assets, obj)):
+      sizes.append(obj)
+  return sizes
+
+def parseLayerPath(filepath):
+  # retrieves (size, layer, body, index, suffix) from path relative to assets directory
+  nodes = filepath.split("/")
+  match = re_layer.match(nodes[-1])
+  if not match or len(nodes) < 4:
+    return None
+  body = None
+  if nodes[1] == "base" and nodes[2] == "body":
+    if len(nodes) != 6:
+      return None
+    body = nodes[3]
+  elif len(nodes) != 4:
+    return None
+  return (nodes[0], nodes[-2], body, int(match.group(1)), match.group(2))
+
+def scanLayers(dir_assets, size):
+  # retrieves paths of all layer images for a frame size relative to assets directory
+  layers = []
+  for category in ("base", "outfit"):
+    dir_category = os.path.join(dir_assets, size, category)
+    if not os.path.isdir(dir_category):
+      continue
+    for ROOT, DIRS, FILES in os.walk(dir_category):
+      DIRS.sort()
+      for f in sorted(FILES):
+        filepath = os.path.relpath(os.path.join(ROOT, f), dir_assets).replace(os.sep, "/")
+        if parseLayerPath(filepath):
+          layers.append(filepath)
+  return layers
+
+def hashFile(filepath):
+  fopen = open(filepath, "rb")
+  digest = hashlib.sha1(fopen.read()).hexdigest()
+  fopen.close()
+  return digest
+
+def decodeLayer(filepath):
+  img = Image.open(filepath)
+  rgba = img.convert("RGBA")
+  data = (rgba.width, rgba.height, rgba.tobytes())
+  img.close()
+  return data
+
+def loadIndex(dir_cache):
+  file_cache = os.path.join(dir_cache, file_index)
+  if not os.path.isfile(file_cache):
+    return {"version": index_version, "sizes": {}}
+  fopen = open(file_cache, "r", encoding="utf-8")
+  try:
+    index = json.load(fopen)
+  except ValueError:
+    index = {}
+  fopen.close()
+  if index.get("version") != index_version:
+    # incompatible or corrupt index is rebuilt
+    return {"version": index_version, "sizes": {}}
+  return index
+
+def writeIndex(dir_cache, index):
+  file_cache = os.path.join(dir_cache, file_index)
+  fopen = open(file_cache + ".tmp", "w", encoding="utf-8")
+  json.dump(index, fopen, indent=2, sort_keys=True)
+  fopen.close()
+  os.replace(file_cache + ".tmp", file_cache)
+
+def readBlob(filepath):
+  if not os.path.isfile(filepath) or os.path.getsize(filepath) == 0:
+    return None
+  fopen = open(filepath, "rb")
+  blob = mmap.mmap(fopen.fileno(), 0, access=mmap.ACCESS_READ)
+  fopen.close()
+  return blob
+
+def update(dir_assets, dir_cache, verbose=False):
+  # decodes new & changed layers, returns list of refreshed layer paths
+  if not os.path.isdir(dir_cache):
+    os.makedirs(dir_cache)
+  index_old = loadIndex(dir_cache)
+  index = {"version": index_version, "sizes": {}}
+  refreshed = []
+  for size in getSizes(dir_assets):
+    info_old = index_old["sizes"].get(size, {})
+    layers_old = info_old.get("layers", {})
+    file_blob = os.path.join(dir_cache, size + ".rgba")
+    blob_old = readBlob(file_blob)
+
+    layers = {}
+    chunks = []
+    offset = 0
+    changed = blob_old is None and len(layers_old) > 0
+    for filepath in scanLayers(dir_assets, size):
+      file_layer = os.path.join(dir_assets, os.path.normpath(filepath))
+      stat = os.stat(file_layer)
+      entry = dict(layers_old[filepath]) if filepath in layers_old else None
+      data = None
+      if entry and blob_old is not None:
+        if entry["mtime"] == stat.st_mtime_ns and entry["bytes"] == stat.st_size:
+          data = blob_old[entry["offset"]:entry["offset"]+entry["length"]]
+        else:
+          digest = hashFile(file_layer)
+          if digest == entry["hash"]:
+            data = blob_old[entry["offset"]:entry["offset"]+entry["length"]]
+          entry = dict(entry, hash=digest)
+      if data is None:
+        width, height, data = decodeLayer(file_layer)
+        entry = {
+          "hash": hashFile(file_layer),
+          "width": width,
+          "height": height
+        }
+        refreshed.append(filepath)
+        changed = True
+        if verbose:
+          print("decode '{}'".format(file_layer))
+      l_size, l_layer, l_body, l_idx, l_suffix = parseLayerPath(filepath)
+      entry.update({
+        "layer": l_layer,
+        "body": l_body,
+        "index": l_idx,
+        "suffix": l_suffix,
+        "mtime": stat.st_mtime_ns,
+        "bytes": stat.st_size,
+        "offset": offset,
+        "length": len(data)
+      })
+      if entry["offset"] != layers_old.get(filepath, {}).get("offset"):
+        changed = True
+      layers[filepath] = entry
+      chunks.append(data)
+      offset += len(data)
+    if set(layers_old) - set(layers):
+      # layers were removed
+      changed = True
+
+    if blob_old is not None:
+      blob_old.close()
+    if changed or not os.path.isfile(file_blob):
+      # replace rather than overwrite so that open maps of old blob remain valid
+      fopen = open(file_blob + ".tmp", "wb")
+      for data in chunks:
+        fopen.write(data)
+      fopen.close()
+      os.replace(file_blob + ".tmp", file_blob)
+      if verbose:
+        print("write '{}'".format(file_blob))
+    index["sizes"][size] = {"blob": size + ".rgba", "layers": layers}
+
+  if index != index_old:
+    writeIndex(dir_cache, index)
+  return refreshed
+
+
+class LayerCache:
+  def __init__(self, dir_cache):
+    self.dir_cache = dir_cache
+    self.index = loadIndex(dir_cache)
+    # memory-mapped blobs indexed by frame size
+    self.blobs = {}
+    self.layers = {}
+    self.keys = {}
+    for size, info in self.index["sizes"].items():
+      for filepath, entry in info["layers"].items():
+        self.layers[filepath] = (size, entry)
+        self.keys[(size, entry["layer"], entry["body"], entry["index"], entry["suffix"])] = filepath
+
+  def __contains__(self, filepath):
+    return filepath in self.layers
+
+  def getBlob(self, size):
+    if size not in self.blobs:
+      file_blob = os.path.join(self.dir_cache, self.index["sizes"][size]["blob"])
+      blob = readBlob(file_blob)
+      if blob is None:
+        raise FileNotFoundError(errno.ENOENT, "layer cache blob not found", file_blob)
+      self.blobs[size] = blob
+    return self.blobs[size]
+
+  def getPixels(self, filepath):
+    # retrieves read-only view of RGBA data using path relative to assets directory
+    if filepath not in self.layers:
+      raise KeyError("layer not cached: {}".format(filepath))
+    size, entry = self.layers[filepath]
+    pixels = numpy.frombuffer(self.getBlob(size), dtype=numpy.uint8, count=entry["length"],
+        offset=entry["offset"])
+    return pixels.reshape((entry["height"], entry["width"], 4))
+
+  def get(self, size, layer, body, idx, suffix=None):
+    key = (size, layer, body, int(idx), suffix)
+    if key not in self.keys:
+      raise KeyError("layer not cached: {}".format(key))
+    return self.getPixels(self.keys[key])
@@ -0,0 +1,103 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Layer definitions & image paths.
+#
+# Rules for how layers.json maps to layer images, shared by the compositor, asset manifest &
+# source checks. Doesn't depend on NumPy or Pillow so that targets which don't decode images can
+# use it.
+
+import re
+
+
+# horizontal and vertical frame counts
+frames_x = 3
+frames_y = 4
+
+base_layers = ("body", "arms", "head", "eyes", "ears")
+outfit_layers = ("shoes", "legs", "torso", "mask", "hair", "hat", "detail")
+# base layers that are unique to each body type
+unique_layers = ("arms", "body")
+# base layers that have a separate "rear" layer (in order of last draw to first draw)
+rear_layers = ("ears", "head")
+
+
+def getIndexString(idx):
+  idx = int(idx)
+  return "{:03d}".format(idx) if idx < 100 else str(idx)
+
+def parseSize(size):
+  # accepts "WxH" string or {"width": W, "height": H} table as used by PreviewGenerator.set
+  if isinstance(size, dict):
+    return int(size["width"]), int(size["height"])
+  tmp = str(size).split("x")
+  if len(tmp) != 2:
+    raise ValueError("malformed frame size: {}".format(size))
+  return int(tmp[0]), int(tmp[1])
+
+def getBaseImagePath(size, body, layer, idx, suffix=None):
+  if layer in unique_layers:
+    filepath = "/".join((size, "base", "body", body, layer, getIndexString(idx)))
+  else:
+    filepath = "/".join((size, "base", layer, getIndexString(idx)))
+  if suffix:
+    filepath += "-" + suffix
+  return filepath + ".png"
+
+def getOutfitImagePath(size, layer, idx, suffix=None):
+  filepath = "/".join((size, "outfit", layer, getIndexString(idx)))
+  if suffix:
+    filepath += "-" + suffix
+  return filepath + ".png"
+
+def getBodyMapping(bodymap, idx, body, body_idx):
+  # same rules as LayerManager.getBodyMapping, returns None if layer should not be mapped
+  key = "{}-{}-{}".format(idx, body, body_idx)
+  if key in bodymap:
+    mapping = bodymap[key]
+    if mapping is None:
+      return None
+  else:
+    mapping = body_idx
+  return "{}-{}".format(body, getIndexString(mapping))
+
+def getExpected(layers):
+  # retrieves (required, optional) layer paths as defined by layers.json
+  # optional paths are body type variants of outfit layers indexed by (size, layer, index, body),
+  # a body type must have either all or none of the variants it is mapped to
+  required = set()
+  optional = {}
+  for size, info in layers.items():
+    if not re.match(r"^\d+x\d+$", size):
+      continue
+    bodies = info["base"]["body"]
+    for layer in base_layers:
+      if layer in unique_layers:
+        for body in bodies:
+          for idx in range(1, bodies[body].get(layer, 0) + 1):
+            required.add(getBaseImagePath(size, body, layer, idx))
+        continue
+      for idx in range(1, info["base"].get(layer, 0) + 1):
+        required.add(getBaseImagePath(size, None, layer, idx))
+        if layer in rear_layers:
+          required.add(getBaseImagePath(size, None, layer, idx, "rear"))
+    for layer, count in info["outfit"].items():
+      if not isinstance(count, dict):
+        for idx in range(1, count + 1):
+          required.add(getOutfitImagePath(size, layer, idx))
+          if layer == "detail":
+            required.add(getOutfitImagePath(size, layer, idx, "rear"))
+        continue
+      for idx in range(1, count["indexes"] + 1):
+        for body in bodies:
+          variants = optional.setdefault((size, layer, idx, body), set())
+          for body_idx in range(1, bodies[body].get("body", 0) + 1):
+            mapping = getBodyMapping(count["bodymap"], idx, body, body_idx)
+            if mapping:
+              variants.add(getOutfitImagePath(size, layer, idx, mapping))
+  return required, optional
@@ -0,0 +1,87 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Least recently used cache bounded by size in bytes.
+
+import threading
+
+from collections import OrderedDict
+
+
+def getSize(value):
+  # retrieves number of bytes used by arrays, bytes or tuples of them
+  if isinstance(value, (tuple, list)):
+    return sum(getSize(v) for v in value)
+  if hasattr(value, "nbytes"):
+    return value.nbytes
+  return len(value)
+
+
+class LRUCache:
+  def __init__(self, max_bytes, sizeof=getSize):
+    self.max_bytes = max_bytes
+    self.sizeof = sizeof
+    self.entries = OrderedDict()
+    self.bytes = 0
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    # caches may be shared by worker threads
+    self.lock = threading.Lock()
+
+  def __contains__(self, key):
+    with self.lock:
+      return key in self.entries
+
+  def __len__(self):
+    return len(self.entries)
+
+  def get(self, key, default=None):
+    with self.lock:
+      entry = self.entries.get(key)
+      if entry is None:
+        self.misses += 1
+        return default
+      self.entries.move_to_end(key)
+      self.hits += 1
+      return entry[0]
+
+  def put(self, key, value):
+    size = self.sizeof(value)
+    with self.lock:
+      if key in self.entries:
+        self.bytes -= self.entries.pop(key)[1]
+      if size > self.max_bytes:
+        # value would evict everything else
+        return
+      self.entries[key] = (value, size)
+      self.bytes += size
+      while self.bytes > self.max_bytes:
+        self.bytes -= self.entries.popitem(last=False)[1][1]
+        self.evictions += 1
+
+  def __setitem__(self, key, value):
+    self.put(key, value)
+
+  def clear(self):
+    with self.lock:
+      self.entries.clear()
+      self.bytes = 0
+
+  def getStats(self):
+    with self.lock:
+      lookups = self.hits + self.misses
+      return {
+        "entries": len(self.entries),
+        "bytes": self.bytes,
+        "max_bytes": self.max_bytes,
+        "hits": self.hits,
+        "misses": self.misses,
+        "evictions": self.evictions,
+        "hit_rate": self.hits / lookups if lookups > 0 else 0.0
+      }
@@ -0,0 +1,104 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Compiled asset manifest.
+#
+# Layer images are scanned once & checked against the counts in layers.json. The manifest lists
+# every layer file that exists with its dimensions, opaque bounds of each frame & content hash so
+# that clients don't need to request images to find out that they are missing or empty.
+
+import hashlib, json, os, re
+
+import numpy
+from PIL import Image
+
+from .bounds import getFrameBounds
+from .layers import getExpected, getIndexString, parseSize
+
+
+manifest_version = 1
+# number of hex digits of content hashes
+hash_length = 16
+
+
+def scanFiles(dir_assets):
+  # retrieves paths of all PNG images in frame size directories relative to assets directory
+  files = []
+  def scan(dirpath, relpath):
+    with os.scandir(dirpath) as entries:
+      for entry in entries:
+        if entry.is_dir():
+          scan(entry.path, relpath + entry.name + "/")
+        elif entry.name.endswith(".png"):
+          files.append(relpath + entry.name)
+  with os.scandir(dir_assets) as entries:
+    for entry in entries:
+      if entry.is_dir() and re.match(r"^\d+x\d+$", entry.name):
+        scan(entry.path, entry.name + "/")
+  return sorted(files)
+
+def validate(layers, files):
+  # retrieves (errors, unlisted files), files not defined in layers.json are not errors
+  required, optional = getExpected(layers)
+  files = set(files)
+  errors = []
+  for filepath in sorted(required - files):
+    errors.append("missing layer: {}".format(filepath))
+  listed = set(required)
+  for key, variants in sorted(optional.items()):
+    found = variants & files
+    listed.update(found)
+    if found and found != variants:
+      for filepath in sorted(variants - found):
+        errors.append("missing {} variant of {} {}: {}".format(key[3], key[1],
+            getIndexString(key[2]), filepath))
+  return errors, sorted(files - listed)
+
+def describeFile(filepath, fwidth, fheight):
+  fopen = open(filepath, "rb")
+  data = fopen.read()
+  fopen.close()
+  img = Image.open(filepath)
+  pixels = numpy.asarray(img.convert("RGBA"))
+  img.close()
+  bounds = getFrameBounds(pixels, fwidth, fheight)
+  info = {
+    "width": pixels.shape[1],
+    "height": pixels.shape[0],
+    "hash": hashlib.sha1(data).hexdigest()[:hash_length],
+    "frames": bounds
+  }
+  if all(b is None for b in bounds):
+    info["empty"] = True
+  return info
+
+def build(dir_assets):
+  # retrieves (manifest, unlisted files), raises ValueError if layers.json does not match files
+  fopen = open(os.path.join(dir_assets, "layers.json"), "r", encoding="utf-8")
+  layers = json.load(fopen)
+  fopen.close()
+  files = scanFiles(dir_assets)
+  errors, unlisted = validate(layers, files)
+  if errors:
+    raise ValueError("assets do not match layers.json:\n  " + "\n  ".join(errors))
+  unlisted = set(unlisted)
+  manifest = {"version": manifest_version, "files": {}}
+  for filepath in files:
+    if filepath in unlisted:
+      continue
+    fwidth, fheight = parseSize(filepath.split("/")[0])
+    manifest["files"][filepath] = describeFile(os.path.join(dir_assets, os.path.normpath(filepath)),
+        fwidth, fheight)
+  return manifest, sorted(unlisted)
+
+def write(manifest, filepath):
+  # replaced rather than overwritten as staged copies may be hard linked
+  fopen = open(filepath + ".tmp", "w", encoding="utf-8")
+  json.dump(manifest, fopen, separators=(",", ":"), sort_keys=True)
+  fopen.close()
+  os.replace(filepath + ".tmp", filepath)
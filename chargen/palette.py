@@ -0,0 +1,206 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Palette swap recoloring.
+#
+# Color categories (skin, hair, etc.) are defined in assets/palettes.json with the layers they
+# apply to & named ramps of replacement colors ordered from lightest to darkest. A category either
+# lists the source colors that are replaced by ramp colors of the same position or, without a
+# source list, the palette of each layer is extracted & its colors are mapped onto the ramp by
+# brightness. Colors are replaced through lookup tables applied to whole images or batches.
+
+import hashlib, json, os
+
+import numpy
+from PIL import Image
+
+from . import layercache
+
+
+file_palettes = "palettes.json"
+# changing this invalidates cached variants
+palette_version = 1
+
+mask_rgb = numpy.uint32(0x00ffffff)
+mask_alpha = numpy.uint32(0xff000000)
+
+
+def parseColor(color):
+  # retrieves packed RGB value of "#RRGGBB" string (same byte order as little-endian RGBA view)
+  value = color.lstrip("#")
+  if len(value) != 6:
+    raise ValueError("malformed color: {}".format(color))
+  r, g, b = (int(value[idx:idx+2], 16) for idx in (0, 2, 4))
+  return r | (g << 8) | (b << 16)
+
+def pack(pixels):
+  return numpy.ascontiguousarray(pixels, dtype=numpy.uint8).view("<u4")[..., 0]
+
+def unpack(packed):
+  return numpy.ascontiguousarray(packed, dtype="<u4")[..., numpy.newaxis].view(numpy.uint8)
+
+def getLuminance(rgb):
+  rgb = numpy.asarray(rgb, dtype=numpy.uint32)
+  return 0.299 * (rgb & 0xff) + 0.587 * ((rgb >> 8) & 0xff) + 0.114 * ((rgb >> 16) & 0xff)
+
+def extractPalette(pixels):
+  # retrieves packed RGB values of visible colors ordered from lightest to darkest
+  packed = pack(pixels)
+  colors = numpy.unique(packed[(packed & mask_alpha) != 0] & mask_rgb)
+  order = numpy.argsort(-getLuminance(colors), kind="stable")
+  return colors[order]
+
+def loadPalettes(dir_assets):
+  fopen = open(os.path.join(dir_assets, file_palettes), "r", encoding="utf-8")
+  palettes = json.load(fopen)
+  fopen.close()
+  return palettes
+
+def applyTables(packed, tables):
+  # replaces colors of batch (first axis) using a (sources, targets) table for each image
+  keys = []
+  values = []
+  for idx in range(len(tables)):
+    sources, targets = tables[idx]
+    keys.append((numpy.uint64(idx) << numpy.uint64(32)) | numpy.asarray(sources, dtype=numpy.uint64))
+    values.append(numpy.asarray(targets, dtype=numpy.uint32))
+  keys = numpy.concatenate(keys) if keys else numpy.empty(0, dtype=numpy.uint64)
+  values = numpy.concatenate(values) if values else numpy.empty(0, dtype=numpy.uint32)
+  if len(keys) == 0:
+    return packed.copy()
+  order = numpy.argsort(keys)
+  keys = keys[order]
+  values = values[order]
+
+  batch = numpy.arange(packed.shape[0], dtype=numpy.uint64).reshape((-1,) + (1,) * (packed.ndim - 1))
+  lookup = (batch << numpy.uint64(32)) | (packed & mask_rgb).astype(numpy.uint64)
+  pos = numpy.minimum(numpy.searchsorted(keys, lookup), len(keys) - 1)
+  hit = (keys[pos] == lookup) & ((packed & mask_alpha) != 0)
+  return numpy.where(hit, values[pos] | (packed & mask_alpha), packed)
+
+
+class Recolorer:
+  def __init__(self, dir_assets, palettes=None):
+    self.palettes = palettes if palettes is not None else loadPalettes(dir_assets)
+    # categories indexed by layer name
+    self.categories = {}
+    for category, info in self.palettes.items():
+      for layer in info["layers"]:
+        self.categories.setdefault(layer, []).append(category)
+
+  def getRamp(self, category, name):
+    if category not in self.palettes:
+      raise ValueError("unknown color category: {}".format(category))
+    ramps = self.palettes[category]["ramps"]
+    if name not in ramps:
+      raise ValueError("unknown {} color: {}".format(category, name))
+    return [parseColor(c) for c in ramps[name]]
+
+  def getColors(self, layer, colors):
+    # retrieves colors of selection that apply to layer as sorted (category, ramp) tuple
+    return tuple(sorted((c, colors[c]) for c in self.categories.get(layer, ()) if c in colors))
+
+  def getTable(self, palette, colors):
+    # retrieves (sources, targets) lookup table for layer palette & (category, ramp) pairs
+    table = {}
+    for category, name in colors:
+      info = self.palettes[category]
+      ramp = self.getRamp(category, name)
+      if "source" in info:
+        sources = [parseColor(c) for c in info["source"]]
+        if len(sources) != len(ramp):
+          raise ValueError("{} color '{}' must have {} entries".format(category, name,
+              len(sources)))
+        targets = ramp
+      else:
+        keep = set(parseColor(c) for c in info.get("keep", ()))
+        sources = [int(c) for c in palette if int(c) not in keep]
+        last = max(len(sources) - 1, 1)
+        targets = [ramp[round(idx * (len(ramp) - 1) / last)] for idx in range(len(sources))]
+      for source, target in zip(sources, targets):
+        table.setdefault(source, target)
+    sources = sorted(table)
+    return sources, [table[s] for s in sources]
+
+  def getKey(self, colors):
+    # identifies replacement colors so that cached variants are invalidated when ramps change
+    spec = [(c, n, self.palettes[c]["ramps"][n], self.palettes[c].get("source"),
+        self.palettes[c].get("keep")) for c, n in colors]
+    return hashlib.sha1(json.dumps([palette_version, spec]).encode("utf-8")).hexdigest()
+
+  def recolor(self, pixels, layer, colors):
+    # recolors image or batch of images of the same layer
+    colors = self.getColors(layer, colors)
+    if not colors:
+      return pixels
+    batch = pixels if pixels.ndim == 4 else pixels[numpy.newaxis]
+    packed = pack(batch)
+    tables = [self.getTable(extractPalette(batch[idx]), colors) for idx in range(len(batch))]
+    result = unpack(applyTables(packed, tables))
+    return result if pixels.ndim == 4 else result[0]
+
+
+def update(dir_assets, dir_target, colors, verbose=False):
+  # writes recolored copies of layers affected by colors table (category -> ramp), returns list of
+  # refreshed layers
+  recolorer = Recolorer(dir_assets)
+  for category, name in colors.items():
+    recolorer.getRamp(category, name)
+  file_index = os.path.join(dir_target, "index.json")
+  index_old = {}
+  if os.path.isfile(file_index):
+    fopen = open(file_index, "r", encoding="utf-8")
+    try:
+      index_old = json.load(fopen)
+    except ValueError:
+      pass
+    fopen.close()
+  index = {}
+  refreshed = []
+  for size in layercache.getSizes(dir_assets):
+    # layers with the same name & dimensions are recolored together as a batch
+    batches = {}
+    for filepath in layercache.scanLayers(dir_assets, size):
+      layer = layercache.parseLayerPath(filepath)[1]
+      layer_colors = recolorer.getColors(layer, colors)
+      if not layer_colors:
+        continue
+      file_layer = os.path.join(dir_assets, os.path.normpath(filepath))
+      key = layercache.hashFile(file_layer) + ":" + recolorer.getKey(layer_colors)
+      index[filepath] = key
+      file_variant = os.path.join(dir_target, os.path.normpath(filepath))
+      if index_old.get(filepath) == key and os.path.isfile(file_variant):
+        continue
+      img = Image.open(file_layer)
+      pixels = numpy.asarray(img.convert("RGBA"))
+      img.close()
+      batches.setdefault((layer, pixels.shape), []).append((filepath, pixels))
+
+    for (layer, shape), batch in batches.items():
+      recolored = recolorer.recolor(numpy.stack([b[1] for b in batch]), layer, colors)
+      for idx in range(len(batch)):
+        filepath = batch[idx][0]
+        file_variant = os.path.join(dir_target, os.path.normpath(filepath))
+        if not os.path.isdir(os.path.dirname(file_variant)):
+          os.makedirs(os.path.dirname(file_variant))
+        Image.fromarray(recolored[idx], "RGBA").save(file_variant, "PNG")
+        refreshed.append(filepath)
+        if verbose:
+          print("recolor '{}'".format(file_variant))
+
+  for filepath in set(index_old) - set(index):
+    file_variant = os.path.join(dir_target, os.path.normpath(filepath))
+    if os.path.isfile(file_variant):
+      os.remove(file_variant)
+  if index != index_old:
+    if not os.path.isdir(dir_target):
+      os.makedirs(dir_target)
+    fopen = open(file_index, "w", encoding="utf-8")
+    json.dump(index, fopen, indent=2, sort_keys=True)
+    fopen.close()
+  return refreshed
@@ -0,0 +1,120 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Lossless PNG optimization.
+#
+# Images are re-encoded as indexed colour when they contain no more than 256 colours (otherwise
+# as RGBA) with maximum compression & without ancillary chunks. A re-encoded image is only used
+# if it is smaller & decodes to the same pixels. Results are cached by content hash of the source.
+
+import hashlib, io, multiprocessing, os
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+from PIL import Image
+
+
+# changing this invalidates cached results
+optimizer_version = 1
+
+
+def getPixels(img):
+  # RGBA pixels with color of fully transparent pixels cleared as it is never visible
+  pixels = numpy.array(img.convert("RGBA"))
+  pixels[pixels[..., 3] == 0] = 0
+  return pixels
+
+def encodePalette(pixels):
+  # retrieves indexed image & tRNS data or None if image has more than 256 colors
+  flat = numpy.ascontiguousarray(pixels).view(numpy.uint32).ravel()
+  colors, inverse = numpy.unique(flat, return_inverse=True)
+  if len(colors) > 256:
+    return None
+  table = colors.view(numpy.uint8).reshape(-1, 4)
+  # translucent entries come first so that tRNS chunk can omit opaque entries
+  order = numpy.argsort(table[:, 3] == 255, kind="stable")
+  table = table[order]
+  remap = numpy.empty(len(order), dtype=numpy.uint8)
+  remap[order] = numpy.arange(len(order), dtype=numpy.uint8)
+  img = Image.fromarray(remap[inverse.ravel()].reshape(pixels.shape[:2]), "P")
+  img.putpalette(table[:, :3].tobytes())
+  translucent = int(numpy.count_nonzero(table[:, 3] < 255))
+  transparency = table[:translucent, 3].tobytes() if translucent > 0 else None
+  return img, transparency
+
+def encode(img, transparency=None):
+  params = {"optimize": True}
+  if transparency is not None:
+    params["transparency"] = transparency
+  out = io.BytesIO()
+  img.save(out, "PNG", **params)
+  return out.getvalue()
+
+def optimizeData(data):
+  # retrieves smallest lossless encoding of PNG data
+  img = Image.open(io.BytesIO(data))
+  reference = getPixels(img)
+  img.close()
+
+  candidates = []
+  indexed = encodePalette(reference)
+  if indexed:
+    candidates.append(encode(*indexed))
+  candidates.append(encode(Image.fromarray(reference, "RGBA")))
+
+  best = data
+  for candidate in candidates:
+    if len(candidate) >= len(best):
+      continue
+    img = Image.open(io.BytesIO(candidate))
+    if numpy.array_equal(getPixels(img), reference):
+      best = candidate
+    img.close()
+  return best
+
+def writeData(filepath, data):
+  # replaces file so that a partially written file is never left behind
+  fopen = open(filepath + ".tmp", "wb")
+  fopen.write(data)
+  fopen.close()
+  os.replace(filepath + ".tmp", filepath)
+
+def optimizeFile(filepath, dir_cache):
+  # optimizes image in place, returns (original size, optimized size, cache hit)
+  fopen = open(filepath, "rb")
+  data = fopen.read()
+  fopen.close()
+  key = hashlib.sha1(data + "v{}".format(optimizer_version).encode("utf-8")).hexdigest()
+  file_cache = os.path.join(dir_cache, key + ".png")
+  hit = os.path.isfile(file_cache)
+  if hit:
+    fopen = open(file_cache, "rb")
+    optimized = fopen.read()
+    fopen.close()
+  else:
+    optimized = optimizeData(data)
+    writeData(file_cache, optimized)
+  if optimized != data:
+    writeData(filepath, optimized)
+  return len(data), len(optimized), hit
+
+def optimizeFiles(filepaths, dir_cache, jobs=None):
+  if not os.path.isdir(dir_cache):
+    os.makedirs(dir_cache)
+  jobs = jobs or os.cpu_count() or 1
+  if jobs < 2 or len(filepaths) < 8:
+    return [optimizeFile(f, dir_cache) for f in filepaths]
+  # forking is not safe from threads of the parallel target scheduler (-j)
+  executor = ProcessPoolExecutor(max_workers=jobs,
+      mp_context=multiprocessing.get_context("spawn"))
+  try:
+    return list(executor.map(optimizeFile, filepaths, [dir_cache] * len(filepaths),
+        chunksize=max(1, len(filepaths) // (jobs * 4))))
+  finally:
+    executor.shutdown()
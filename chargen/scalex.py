@@ -0,0 +1,162 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Scale2x/Scale3x (EPX) pixel art upscaling.
+#
+# Images are RGBA arrays of shape (..., height, width, 4) so that a single image or a batch of
+# images with the same dimensions can be scaled in one call. Pixels are compared as packed 32-bit
+# values & each output sub-pixel is selected for all pixels at once.
+
+import json, os
+
+import numpy
+from PIL import Image
+
+from . import layercache
+
+
+factors = (2, 3, 4)
+
+
+def pack(pixels):
+  # retrieves pixels as 32-bit values, color of fully transparent pixels is ignored
+  pixels = numpy.array(pixels, dtype=numpy.uint8)
+  pixels[pixels[..., 3] == 0] = 0
+  return numpy.ascontiguousarray(pixels).view(numpy.uint32)[..., 0]
+
+def unpack(packed):
+  return numpy.ascontiguousarray(packed)[..., numpy.newaxis].view(numpy.uint8)
+
+def getNeighbors(packed):
+  # retrieves 3x3 neighborhood (A, B, C, D, E, F, G, H, I) with edges extended
+  pad = [(0, 0)] * (packed.ndim - 2) + [(1, 1), (1, 1)]
+  padded = numpy.pad(packed, pad, mode="edge")
+  height, width = packed.shape[-2:]
+  return [padded[..., y:y+height, x:x+width] for y in range(3) for x in range(3)]
+
+def interleave(parts, factor):
+  # combines factor*factor sub-pixel arrays (row-major) into an image scaled by factor
+  shape = parts[0].shape
+  out = numpy.empty(shape[:-2] + (shape[-2], factor, shape[-1], factor), dtype=parts[0].dtype)
+  for idx in range(len(parts)):
+    out[..., :, idx // factor, :, idx % factor] = parts[idx]
+  return out.reshape(shape[:-2] + (shape[-2] * factor, shape[-1] * factor))
+
+def scale2xPacked(packed):
+  _, B, _, D, E, F, _, H, _ = getNeighbors(packed)
+  active = (B != H) & (D != F)
+  return interleave((
+    numpy.where(active & (D == B), D, E),
+    numpy.where(active & (B == F), F, E),
+    numpy.where(active & (D == H), D, E),
+    numpy.where(active & (H == F), F, E)
+  ), 2)
+
+def scale3xPacked(packed):
+  A, B, C, D, E, F, G, H, I = getNeighbors(packed)
+  active = (B != H) & (D != F)
+  db = active & (D == B)
+  bf = active & (B == F)
+  dh = active & (D == H)
+  hf = active & (H == F)
+  return interleave((
+    numpy.where(db, D, E),
+    numpy.where((db & (E != C)) | (bf & (E != A)), B, E),
+    numpy.where(bf, F, E),
+    numpy.where((db & (E != G)) | (dh & (E != A)), D, E),
+    E,
+    numpy.where((bf & (E != I)) | (hf & (E != C)), F, E),
+    numpy.where(dh, D, E),
+    numpy.where((dh & (E != I)) | (hf & (E != G)), H, E),
+    numpy.where(hf, F, E)
+  ), 3)
+
+def scale(pixels, factor=2):
+  # scales image or batch of images by 2, 3 or 4 (Scale2x applied twice)
+  if factor not in factors:
+    raise ValueError("unsupported scale factor: {}".format(factor))
+  packed = pack(pixels)
+  if factor == 3:
+    packed = scale3xPacked(packed)
+  else:
+    for it in range(factor // 2):
+      packed = scale2xPacked(packed)
+  return unpack(packed)
+
+def scaleSheet(pixels, factor, fwidth, fheight):
+  # scales each frame of sheet separately so that neighboring frames don't bleed into each other
+  height, width = pixels.shape[-3:-1]
+  rows = height // fheight
+  cols = width // fwidth
+  if rows * fheight != height or cols * fwidth != width:
+    raise ValueError("sheet dimensions ({}x{}) are not a multiple of frame size ({}x{})".format(
+        width, height, fwidth, fheight))
+  lead = pixels.shape[:-3]
+  frames = pixels.reshape(lead + (rows, fheight, cols, fwidth, 4))
+  frames = numpy.moveaxis(frames, -3, -4)
+  scaled = scale(frames, factor)
+  scaled = numpy.moveaxis(scaled, -4, -3)
+  return scaled.reshape(lead + (height * factor, width * factor, 4))
+
+def loadIndex(dir_target):
+  file_index = os.path.join(dir_target, "index.json")
+  if not os.path.isfile(file_index):
+    return {}
+  fopen = open(file_index, "r", encoding="utf-8")
+  try:
+    index = json.load(fopen)
+  except ValueError:
+    index = {}
+  fopen.close()
+  return index
+
+def update(dir_assets, dir_target, factor=2, verbose=False):
+  # writes scaled copy of every layer to target directory, returns list of refreshed layers
+  index_old = loadIndex(dir_target)
+  index = {}
+  refreshed = []
+  for size in layercache.getSizes(dir_assets):
+    fwidth, fheight = (int(v) for v in size.split("x"))
+    # layers with the same dimensions are scaled together as a batch
+    batches = {}
+    for filepath in layercache.scanLayers(dir_assets, size):
+      file_layer = os.path.join(dir_assets, os.path.normpath(filepath))
+      digest = layercache.hashFile(file_layer)
+      index[filepath] = digest
+      file_scaled = os.path.join(dir_target, os.path.normpath(filepath))
+      if index_old.get(filepath) == digest and os.path.isfile(file_scaled):
+        continue
+      img = Image.open(file_layer)
+      pixels = numpy.asarray(img.convert("RGBA"))
+      img.close()
+      batches.setdefault(pixels.shape, []).append((filepath, pixels))
+
+    for batch in batches.values():
+      scaled = scaleSheet(numpy.stack([b[1] for b in batch]), factor, fwidth, fheight)
+      for idx in range(len(batch)):
+        filepath = batch[idx][0]
+        file_scaled = os.path.join(dir_target, os.path.normpath(filepath))
+        if not os.path.isdir(os.path.dirname(file_scaled)):
+          os.makedirs(os.path.dirname(file_scaled))
+        Image.fromarray(scaled[idx], "RGBA").save(file_scaled, "PNG")
+        refreshed.append(filepath)
+        if verbose:
+          print("scale {}x '{}'".format(factor, file_scaled))
+
+  # remove layers that no longer exist in assets
+  for filepath in set(index_old) - set(index):
+    file_scaled = os.path.join(dir_target, os.path.normpath(filepath))
+    if os.path.isfile(file_scaled):
+      os.remove(file_scaled)
+  if index != index_old:
+    if not os.path.isdir(dir_target):
+      os.makedirs(dir_target)
+    fopen = open(os.path.join(dir_target, "index.json"), "w", encoding="utf-8")
+    json.dump(index, fopen, indent=2, sort_keys=True)
+    fopen.close()
+  return refreshed
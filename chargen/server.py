@@ -0,0 +1,199 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Local HTTP render service.
+#
+# Endpoints:
+#   GET  /render?size=48x64&type=standard&head=2&hair=5&color.hair=red
+#   GET  /render?selection=<JSON>
+#   POST /render (JSON selection in body, same format passed to PreviewGenerator.set)
+#   GET  /stats
+#
+# Sheets are composited in a thread pool so that the event loop is never blocked. Decoded layers
+# & encoded sheets are kept in LRU caches bounded by size & identical requests that arrive while a
+# sheet is being rendered share the result. Sheets missing from memory are looked up in an optional
+# persistent cache (see sheetcache) before being composited.
+
+import asyncio, json, os, threading, time
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlsplit
+
+from . import compositor, lru
+
+
+layer_bytes_default = 256 * 1024 * 1024
+sheet_bytes_default = 64 * 1024 * 1024
+
+status_text = {
+  200: "OK",
+  400: "Bad Request",
+  404: "Not Found",
+  405: "Method Not Allowed",
+  500: "Internal Server Error"
+}
+
+
+def parseQuery(query):
+  # retrieves selection from query parameters
+  params = dict(parse_qsl(query))
+  if "selection" in params:
+    return json.loads(params["selection"])
+  selection = {"layers": {"base": {}, "outfit": {}}}
+  for key, value in params.items():
+    if key in ("size", "type", "name"):
+      selection[key] = value
+    elif key in compositor.base_layers:
+      selection["layers"]["base"][key] = int(value)
+    elif key in compositor.outfit_layers:
+      selection["layers"]["outfit"][key] = int(value)
+    elif key == "visible":
+      selection["visible"] = [v for v in value.split(",") if v]
+    elif key.startswith("color."):
+      selection.setdefault("colors", {})[key[6:]] = value
+    else:
+      raise ValueError("unknown parameter: {}".format(key))
+  return selection
+
+
+class RenderService:
+  def __init__(self, dir_assets=None, layer_cache=None, workers=None,
+      layer_bytes=layer_bytes_default, sheet_bytes=sheet_bytes_default, sheet_cache=None):
+    self.layers = lru.LRUCache(layer_bytes)
+    self.sheets = lru.LRUCache(sheet_bytes)
+    self.compositor = compositor.Compositor(dir_assets, layer_cache, self.layers)
+    # optional sheetcache.SheetCache instance
+    self.sheet_cache = sheet_cache
+    self.executor = ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1)
+    # futures of sheets being rendered indexed by selection key
+    self.pending = {}
+    self.counters = {"requests": 0, "rendered": 0, "shared": 0, "errors": 0, "render_time": 0.0}
+    # counters are also updated by worker threads
+    self.lock = threading.Lock()
+
+  def renderSheet(self, selection):
+    if self.sheet_cache is not None:
+      data = self.sheet_cache.get(selection)
+      if data is not None:
+        return data
+    time_start = time.perf_counter()
+    data = compositor.encodeImage(self.compositor.render(selection))
+    if self.sheet_cache is not None:
+      self.sheet_cache.put(selection, data)
+    with self.lock:
+      self.counters["render_time"] += time.perf_counter() - time_start
+      self.counters["rendered"] += 1
+    return data
+
+  async def getSheet(self, selection):
+    # retrieves encoded sheet & whether it was served from memory
+    key = compositor.getSelectionKey(selection)
+    data = self.sheets.get(key)
+    if data is not None:
+      return data, True
+    future = self.pending.get(key)
+    if future is not None:
+      self.counters["shared"] += 1
+      return await asyncio.shield(future), True
+    future = asyncio.get_running_loop().run_in_executor(self.executor, self.renderSheet, selection)
+    self.pending[key] = future
+    try:
+      data = await future
+    finally:
+      self.pending.pop(key, None)
+    self.sheets.put(key, data)
+    return data, False
+
+  def getStats(self):
+    with self.lock:
+      stats = dict(self.counters)
+    stats["layers"] = self.layers.getStats()
+    stats["sheets"] = self.sheets.getStats()
+    if self.sheet_cache is not None:
+      stats["disk"] = self.sheet_cache.getStats()
+    return stats
+
+  async def dispatch(self, method, target, body):
+    # retrieves (status, content type, data, extra headers)
+    url = urlsplit(target)
+    if url.path == "/stats":
+      if method != "GET":
+        return 405, "text/plain", b"method not allowed", {}
+      return 200, "application/json", json.dumps(self.getStats(), indent=2).encode("utf-8"), {}
+    if url.path != "/render":
+      return 404, "text/plain", b"not found", {}
+    if method == "GET":
+      selection = parseQuery(url.query)
+    elif method == "POST":
+      selection = json.loads(body.decode("utf-8"))
+    else:
+      return 405, "text/plain", b"method not allowed", {}
+    if not isinstance(selection, dict):
+      raise ValueError("selection must be a JSON object")
+    data, hit = await self.getSheet(selection)
+    return 200, "image/png", data, {"X-Cache": "hit" if hit else "miss"}
+
+  async def handle(self, reader, writer):
+    try:
+      while True:
+        line = await reader.readline()
+        if not line:
+          break
+        headers = {}
+        while True:
+          header = await reader.readline()
+          if header in (b"\r\n", b"\n", b""):
+            break
+          key, _, value = header.decode("latin-1").partition(":")
+          headers[key.strip().lower()] = value.strip()
+        try:
+          method, target, version = line.decode("latin-1").split()
+          body = await reader.readexactly(int(headers.get("content-length", 0)))
+        except ValueError:
+          method, target, version, body = None, None, "HTTP/1.0", b""
+
+        self.counters["requests"] += 1
+        extra = {}
+        try:
+          if method is None:
+            raise ValueError("malformed request")
+          status, ctype, data, extra = await self.dispatch(method, target, body)
+        except FileNotFoundError as e:
+          status, ctype, data = 404, "text/plain", str(e).encode("utf-8")
+        except (ValueError, KeyError, TypeError) as e:
+          status, ctype, data = 400, "text/plain", str(e).encode("utf-8")
+        except Exception as e:
+          status, ctype, data = 500, "text/plain", str(e).encode("utf-8")
+        if status >= 400:
+          self.counters["errors"] += 1
+
+        keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        head = ["HTTP/1.1 {} {}".format(status, status_text.get(status, "")),
+            "Content-Type: " + ctype, "Content-Length: {}".format(len(data)),
+            "Connection: " + ("keep-alive" if keep_alive else "close")]
+        head += ["{}: {}".format(k, v) for k, v in extra.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + data)
+        await writer.drain()
+        if not keep_alive:
+          break
+    except (ConnectionError, asyncio.IncompleteReadError):
+      pass
+    finally:
+      writer.close()
+
+  async def serve(self, host, port, started=None):
+    server = await asyncio.start_server(self.handle, host, port)
+    if started:
+      started(server)
+    async with server:
+      await server.serve_forever()
+
+  def close(self):
+    self.executor.shutdown(wait=True, cancel_futures=True)
+    if self.sheet_cache is not None:
+      self.sheet_cache.close()
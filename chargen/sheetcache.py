@@ -0,0 +1,226 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Persistent composite sheet cache.
+#
+# Encoded sheets are stored by a key derived from the canonical selection & the content hashes of
+# the layer files it draws (plus palettes when colors are replaced), so a changed source image
+# never matches an old entry. Entries referencing files whose content changed are removed when the
+# cache is opened & least recently used entries are evicted when the size limit is exceeded.
+
+import hashlib, json, os, threading, time
+
+from . import compositor
+
+
+file_index = "index.json"
+# changing this invalidates cached sheets (e.g. when compositing output changes)
+cache_version = 1
+
+max_bytes_default = 512 * 1024 * 1024
+
+
+def hashFile(filepath):
+  hasher = hashlib.sha1()
+  fopen = open(filepath, "rb")
+  for chunk in iter(lambda: fopen.read(65536), b""):
+    hasher.update(chunk)
+  fopen.close()
+  return hasher.hexdigest()
+
+
+class SheetCache:
+  def __init__(self, dir_cache, comp, max_bytes=max_bytes_default):
+    self.dir_cache = dir_cache
+    # compositor used to resolve layer files drawn by a selection
+    self.compositor = comp
+    self.max_bytes = max_bytes
+    # content hashes of source files indexed by path relative to assets directory
+    self.files = {}
+    # entry info (bytes, last use & hashes of layers) indexed by key
+    self.entries = {}
+    self.bytes = 0
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.invalidated = 0
+    self.dirty = False
+    # cache may be shared by worker threads
+    self.lock = threading.RLock()
+    if not os.path.isdir(dir_cache):
+      os.makedirs(dir_cache)
+    self.load()
+
+  def getSheetPath(self, key):
+    return os.path.join(self.dir_cache, key[:2], key + ".png")
+
+  def getFileHash(self, filepath):
+    # retrieves content hash of file relative to assets directory, re-hashed only if stats change
+    file_source = os.path.join(self.compositor.dir_assets, os.path.normpath(filepath))
+    st = os.stat(file_source)
+    stat_key = [st.st_mtime_ns, st.st_size]
+    with self.lock:
+      info = self.files.get(filepath)
+      if info and info["stat"] == stat_key:
+        return info["hash"]
+    digest = hashFile(file_source)
+    with self.lock:
+      self.files[filepath] = {"stat": stat_key, "hash": digest}
+      self.dirty = True
+    return digest
+
+  def getKey(self, selection):
+    # retrieves (key, hashes of source files) of selection
+    sources = [filepath for filepath, offset in self.compositor.getDrawList(selection)]
+    if selection.get("colors"):
+      sources.append("palettes.json")
+    hashes = {filepath: self.getFileHash(filepath) for filepath in sources}
+    hasher = hashlib.sha1("v{}\n{}\n".format(cache_version,
+        compositor.getSelectionKey(selection)).encode("utf-8"))
+    for filepath in sources:
+      hasher.update("{}:{}\n".format(filepath, hashes[filepath]).encode("utf-8"))
+    return hasher.hexdigest(), hashes
+
+  def get(self, selection):
+    # retrieves encoded sheet or None if not cached
+    key = self.getKey(selection)[0]
+    with self.lock:
+      entry = self.entries.get(key)
+      if entry is None:
+        self.misses += 1
+        return None
+      try:
+        fopen = open(self.getSheetPath(key), "rb")
+      except FileNotFoundError:
+        # removed externally
+        self.remove(key)
+        self.misses += 1
+        return None
+      data = fopen.read()
+      fopen.close()
+      entry["used"] = time.time()
+      self.hits += 1
+      self.dirty = True
+      return data
+
+  def put(self, selection, data):
+    key, hashes = self.getKey(selection)
+    if len(data) > self.max_bytes:
+      return
+    file_sheet = self.getSheetPath(key)
+    with self.lock:
+      if key in self.entries:
+        self.remove(key)
+      if not os.path.isdir(os.path.dirname(file_sheet)):
+        os.makedirs(os.path.dirname(file_sheet))
+      # replace so that a partially written sheet is never read
+      fopen = open(file_sheet + ".tmp", "wb")
+      fopen.write(data)
+      fopen.close()
+      os.replace(file_sheet + ".tmp", file_sheet)
+      self.entries[key] = {"bytes": len(data), "used": time.time(), "sources": hashes}
+      self.bytes += len(data)
+      self.dirty = True
+      self.evict()
+
+  def remove(self, key):
+    with self.lock:
+      entry = self.entries.pop(key)
+      self.bytes -= entry["bytes"]
+      self.dirty = True
+      file_sheet = self.getSheetPath(key)
+      if os.path.isfile(file_sheet):
+        os.remove(file_sheet)
+
+  def evict(self):
+    # removes least recently used entries until size limit is met
+    with self.lock:
+      if self.bytes <= self.max_bytes:
+        return
+      for key in sorted(self.entries, key=lambda k: self.entries[k]["used"]):
+        self.remove(key)
+        self.evictions += 1
+        if self.bytes <= self.max_bytes:
+          break
+
+  def load(self):
+    file_cache = os.path.join(self.dir_cache, file_index)
+    index = {}
+    if os.path.isfile(file_cache):
+      fopen = open(file_cache, "r", encoding="utf-8")
+      try:
+        index = json.load(fopen)
+      except ValueError:
+        index = {}
+      fopen.close()
+    if index.get("version") != cache_version:
+      index = {"files": {}, "entries": {}}
+    self.files = index["files"]
+
+    # entries are invalidated when any of their sources changed or was removed
+    for filepath in list(self.files):
+      try:
+        self.getFileHash(filepath)
+      except FileNotFoundError:
+        self.files.pop(filepath)
+    for key, entry in index["entries"].items():
+      if not os.path.isfile(self.getSheetPath(key)):
+        continue
+      for filepath, digest in entry["sources"].items():
+        if self.files.get(filepath, {}).get("hash") != digest:
+          self.invalidated += 1
+          break
+      else:
+        self.entries[key] = entry
+        self.bytes += entry["bytes"]
+
+    # sheets without an entry are left over from invalidation or an unfinished run
+    for ROOT, DIRS, FILES in os.walk(self.dir_cache):
+      for f in FILES:
+        if f.endswith(".png") and f[:-4] not in self.entries:
+          os.remove(os.path.join(ROOT, f))
+    self.dirty = self.dirty or len(self.entries) != len(index["entries"])
+    self.evict()
+
+  def flush(self):
+    # writes index if modified since loaded or last written
+    with self.lock:
+      if not self.dirty:
+        return
+      # hashes of files no longer used by any entry are dropped
+      used = set()
+      for entry in self.entries.values():
+        used.update(entry["sources"])
+      index = {
+        "version": cache_version,
+        "files": {f: info for f, info in self.files.items() if f in used},
+        "entries": self.entries
+      }
+      file_cache = os.path.join(self.dir_cache, file_index)
+      fopen = open(file_cache + ".tmp", "w", encoding="utf-8")
+      json.dump(index, fopen, sort_keys=True)
+      fopen.close()
+      os.replace(file_cache + ".tmp", file_cache)
+      self.dirty = False
+
+  def close(self):
+    self.flush()
+
+  def getStats(self):
+    with self.lock:
+      lookups = self.hits + self.misses
+      return {
+        "entries": len(self.entries),
+        "bytes": self.bytes,
+        "max_bytes": self.max_bytes,
+        "hits": self.hits,
+        "misses": self.misses,
+        "evictions": self.evictions,
+        "invalidated": self.invalidated,
+        "hit_rate": self.hits / lookups if lookups > 0 else 0.0
+      }
@@ -0,0 +1,314 @@
+# ****************************************************
+# * Copyright (C) 2023 - Jordan Irwin (AntumDeluge)  *
+# ****************************************************
+# * This software is licensed under the MIT license. *
+# * See: LICENSE.txt for details.                    *
+# ****************************************************
+
+
+# Consistency check of GIMP sources & exported layer images.
+#
+# Compressed XCF sources (*.xcf.bz2) are decompressed & their headers parsed in a process pool.
+# Parsed canvas & layer dimensions are cached by content hash of the source so that only new &
+# changed sources are decompressed. Exported images are read only as far as their PNG header &
+# compared with the layer files that layers.json defines for index & category of each source.
+
+import bz2, hashlib, json, multiprocessing, os, re, struct
+
+from concurrent.futures import ProcessPoolExecutor
+
+from .layers import frames_x, frames_y, getExpected, parseSize
+
+
+file_cache = "sources.json"
+# changing this invalidates cached source information
+cache_version = 1
+
+# exports older than their source by no more than this (in seconds) are not considered stale, as
+# files of a checkout are written in arbitrary order
+stale_tolerance = 2
+
+# XCF property types
+prop_end = 0
+prop_visible = 8
+prop_offsets = 15
+prop_group_item = 29
+
+# matches compressed sources & retrieves name without extension
+re_source = re.compile(r"^(.+)\.xcf\.bz2$")
+# matches exported layer images & retrieves layer index
+re_export = re.compile(r"^(\d+)(?:-.+)?\.png$")
+
+
+# --- UTILITY FUNCTIONS --- #
+
+def hashFile(filepath):
+  fopen = open(filepath, "rb")
+  digest = hashlib.sha1(fopen.read()).hexdigest()
+  fopen.close()
+  return digest
+
+def readString(data, pos):
+  # retrieves (string, next position) of length prefixed & null terminated string
+  length = struct.unpack_from(">I", data, pos)[0]
+  pos += 4
+  return data[pos:pos+max(length-1, 0)].decode("utf-8", "replace"), pos + length
+
+def readProperties(data, pos):
+  # retrieves ({type: payload}, next position) of property list
+  props = {}
+  while True:
+    ptype, length = struct.unpack_from(">II", data, pos)
+    pos += 8
+    if ptype == prop_end:
+      return props, pos
+    props[ptype] = data[pos:pos+length]
+    pos += length
+
+def parseXcf(data):
+  # retrieves canvas & layer dimensions of uncompressed XCF data
+  if data[:9] != b"gimp xcf ":
+    raise ValueError("not an XCF file")
+  tag = data[9:13]
+  if tag == b"file":
+    version = 0
+  elif tag[:1] == b"v" and tag[1:].isdigit():
+    version = int(tag[1:])
+  else:
+    raise ValueError("unknown XCF version: {}".format(tag))
+  width, height = struct.unpack_from(">II", data, 14)
+  pos = 26
+  # precision field was introduced with version 4
+  if version >= 4:
+    pos += 4
+  pos = readProperties(data, pos)[1]
+  # pointers are 64 bit since version 11
+  psize = 8 if version >= 11 else 4
+  pointers = []
+  while True:
+    pointer = int.from_bytes(data[pos:pos+psize], "big")
+    pos += psize
+    if pointer == 0:
+      break
+    pointers.append(pointer)
+
+  layers = []
+  for pointer in pointers:
+    lwidth, lheight = struct.unpack_from(">II", data, pointer)
+    name, pos = readString(data, pointer + 12)
+    props = readProperties(data, pos)[0]
+    x, y = struct.unpack(">ii", props[prop_offsets]) if prop_offsets in props else (0, 0)
+    visible = struct.unpack(">I", props[prop_visible])[0] != 0 if prop_visible in props else True
+    layers.append({
+      "name": name,
+      "width": lwidth,
+      "height": lheight,
+      "x": x,
+      "y": y,
+      "visible": visible,
+      "group": prop_group_item in props
+    })
+  return {"version": version, "width": width, "height": height, "layers": layers}
+
+def readSource(filepath):
+  # retrieves (content hash, parsed information or error message) of compressed source
+  fopen = open(filepath, "rb")
+  data = fopen.read()
+  fopen.close()
+  digest = hashlib.sha1(data).hexdigest()
+  try:
+    return digest, parseXcf(bz2.decompress(data))
+  except (ValueError, OSError, EOFError, struct.error) as e:
+    return digest, str(e) or type(e).__name__
+
+def readPngSize(filepath):
+  # retrieves dimensions from IHDR chunk without decoding image
+  fopen = open(filepath, "rb")
+  header = fopen.read(24)
+  fopen.close()
+  if len(header) < 24 or header[:8] != b"\x89PNG\r\n\x1a\n" or header[12:16] != b"IHDR":
+    return None
+  return struct.unpack(">II", header[16:24])
+
+def getSheetSize(size):
+  fwidth, fheight = parseSize(size)
+  return fwidth * frames_x, fheight * frames_y
+
+def scanSources(dir_assets):
+  # retrieves paths of compressed sources relative to assets directory
+  sources = []
+  for ROOT, DIRS, FILES in os.walk(dir_assets):
+    DIRS.sort()
+    for f in sorted(FILES):
+      if re_source.match(f):
+        sources.append(os.path.relpath(os.path.join(ROOT, f), dir_assets).replace(os.sep, "/"))
+  return sources
+
+def getExports(dir_assets, source):
+  # images exported from a numbered source share its index (e.g. 001.xcf.bz2 => 001.png,
+  # 001-rear.png), other sources (e.g. eyes.xcf.bz2) cover all layer images of their directory
+  dir_source = os.path.join(dir_assets, os.path.dirname(source))
+  match = re.match(r"^(\d+)", re_source.match(os.path.basename(source)).group(1))
+  exports = []
+  for f in sorted(os.listdir(dir_source)):
+    m = re_export.match(f)
+    if m and (not match or m.group(1) == match.group(1)):
+      exports.append("/".join((os.path.dirname(source), f)))
+  return exports
+
+def getExpectedExports(expected, source):
+  # retrieves (required, {index: {body: variants}}) of exports that layers.json defines (see
+  # layers.getExpected) for index & category of a source
+  required, optional = expected
+  dirname = source.rsplit("/", 1)[0]
+  match = re.match(r"^(\d+)", re_source.match(source.split("/")[-1]).group(1))
+  def isExport(filepath):
+    m = re_export.match(filepath.split("/")[-1])
+    return m is not None and filepath.rsplit("/", 1)[0] == dirname \
+        and (not match or int(m.group(1)) == int(match.group(1)))
+  exports = {f for f in required if isExport(f)}
+  variants = {}
+  for key, paths in optional.items():
+    paths = {f for f in paths if isExport(f)}
+    if paths:
+      variants.setdefault(key[2], {})[key[3]] = paths
+  return exports, variants
+
+def getMissingExports(expected, source, exports):
+  # retrieves sorted paths of exports defined by layers.json that were not found
+  required, optional = getExpectedExports(expected, source)
+  exports = set(exports)
+  missing = required - exports
+  for variants in optional.values():
+    if not any(exports & v for v in variants.values()):
+      # at least one body type must be exported
+      missing.update(*variants.values())
+      continue
+    for v in variants.values():
+      if exports & v:
+        missing.update(v - exports)
+  return sorted(missing)
+
+
+# --- CACHE --- #
+
+def loadCache(dir_cache):
+  filepath = os.path.join(dir_cache, file_cache)
+  if not os.path.isfile(filepath):
+    return {}
+  fopen = open(filepath, "r", encoding="utf-8")
+  try:
+    cache = json.load(fopen)
+  except ValueError:
+    cache = {}
+  fopen.close()
+  if cache.get("version") != cache_version:
+    return {}
+  return cache.get("sources", {})
+
+def writeCache(dir_cache, sources):
+  if not os.path.isdir(dir_cache):
+    os.makedirs(dir_cache)
+  filepath = os.path.join(dir_cache, file_cache)
+  fopen = open(filepath + ".tmp", "w", encoding="utf-8")
+  json.dump({"version": cache_version, "sources": sources}, fopen, indent=2, sort_keys=True)
+  fopen.close()
+  os.replace(filepath + ".tmp", filepath)
+
+def readSources(dir_assets, dir_cache, jobs=None):
+  # retrieves parsed information of all sources & number of sources that were decompressed
+  cache = loadCache(dir_cache)
+  by_hash = {e["hash"]: e["info"] for e in cache.values()}
+  sources = {}
+  pending = []
+  for source in scanSources(dir_assets):
+    filepath = os.path.join(dir_assets, os.path.normpath(source))
+    st = os.stat(filepath)
+    stat = [st.st_mtime_ns, st.st_size]
+    entry = cache.get(source)
+    if entry and entry["stat"] == stat:
+      sources[source] = entry
+      continue
+    # touched or moved sources are recognized by content
+    digest = hashFile(filepath)
+    if digest in by_hash:
+      sources[source] = {"stat": stat, "hash": digest, "info": by_hash[digest]}
+    else:
+      sources[source] = {"stat": stat}
+      pending.append(source)
+
+  if pending:
+    filepaths = [os.path.join(dir_assets, os.path.normpath(s)) for s in pending]
+    jobs = jobs or os.cpu_count() or 1
+    if jobs < 2 or len(pending) < 4:
+      results = [readSource(f) for f in filepaths]
+    else:
+      # spawned rather than forked, targets may run in threads
+      executor = ProcessPoolExecutor(max_workers=min(jobs, len(pending)),
+          mp_context=multiprocessing.get_context("spawn"))
+      try:
+        results = list(executor.map(readSource, filepaths))
+      finally:
+        executor.shutdown()
+    for source, (digest, info) in zip(pending, results):
+      sources[source].update(hash=digest, info=info)
+
+  writeCache(dir_cache, sources)
+  return sources, len(pending)
+
+
+# --- CHECKS --- #
+
+def checkSource(dir_assets, source, info, expected):
+  # retrieves list of problems found with a source & its exported images
+  problems = []
+  if isinstance(info, str):
+    return ["cannot parse source: {}".format(info)]
+
+  size = source.split("/")[0]
+  if re.match(r"^\d+x\d+$", size):
+    sheet = getSheetSize(size)
+    if (info["width"], info["height"]) != sheet:
+      problems.append("canvas is {}x{}, expected {}x{}".format(info["width"], info["height"],
+          *sheet))
+  for layer in info["layers"]:
+    # groups span their children so only drawable layers are checked
+    if layer["group"] or not layer["visible"]:
+      continue
+    if layer["x"] < 0 or layer["y"] < 0 or layer["x"] + layer["width"] > info["width"] \
+        or layer["y"] + layer["height"] > info["height"]:
+      problems.append("layer '{}' ({}x{} at {},{}) exceeds canvas".format(layer["name"],
+          layer["width"], layer["height"], layer["x"], layer["y"]))
+
+  exports = getExports(dir_assets, source)
+  missing = getMissingExports(expected, source, exports)
+  for export in missing:
+    problems.append("{}: missing export defined in layers.json".format(export))
+  if not exports and not missing:
+    problems.append("no exported images found")
+  mtime = os.path.getmtime(os.path.join(dir_assets, os.path.normpath(source)))
+  for export in exports:
+    filepath = os.path.join(dir_assets, os.path.normpath(export))
+    dimensions = readPngSize(filepath)
+    if dimensions is None:
+      problems.append("{}: not a PNG image".format(export))
+      continue
+    if dimensions != (info["width"], info["height"]):
+      problems.append("{}: dimensions are {}x{}, expected {}x{}".format(export, dimensions[0],
+          dimensions[1], info["width"], info["height"]))
+    if os.path.getmtime(filepath) + stale_tolerance < mtime:
+      problems.append("{}: older than source".format(export))
+  return problems
+
+def check(dir_assets, dir_cache, jobs=None):
+  # retrieves ({source: [problems]}, number of sources, number of sources decompressed)
+  sources, parsed = readSources(dir_assets, dir_cache, jobs)
+  fopen = open(os.path.join(dir_assets, "layers.json"), "r", encoding="utf-8")
+  expected = getExpected(json.load(fopen))
+  fopen.close()
+  report = {}
+  for source in sorted(sources):
+    problems = checkSource(dir_assets, source, sources[source]["info"], expected)
+    if problems:
+      report[source] = problems
+  return report, len(sources), parsed
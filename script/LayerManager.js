@@ -61,7 +61,7 @@ export const LayerManager = {
         }
       }
       this.onInit();
-    }, "assets/layers.json");
+    }, util.getUrl("assets/layers.json"));
   },
 
   /**
@@ -24,7 +24,7 @@ export const SpriteStore = {
    *   HTMLImageElement.
    */
   getImage: function(filepath) {
-    return this.getHashedImage(util.joinPath("assets", filepath));
+    return this.getHashedImage(util.getUrl(util.joinPath("assets", filepath)));
   },
 
   /**
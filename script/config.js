@@ -15,3 +15,6 @@ config["git-repo"] = "https://github.com/AntumDeluge/chargen";
 config["asset-info"] = config["git-repo"] + "/blob/master/assets/README.md";
 config["web-dist"] = false;
 config["desktop"] = false;
+// files renamed with content hashes indexed by original path (set when staged for web distribution)
+config["fingerprints"] = {};
+config["service-worker"] = false;
@@ -30,6 +30,11 @@ main.init = function() {
     dl.appendChild(dl_button);
   }
 
+  // cache fingerprinted files for repeat visits
+  if (config["service-worker"] && "serviceWorker" in navigator) {
+    navigator.serviceWorker.register(new URL("../service-worker.js", import.meta.url));
+  }
+
   // initialize the layer manager
   LayerManager.init();
 };
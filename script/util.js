@@ -8,9 +8,23 @@
 
 "use strict";
 
+import { config } from "./config.js";
+
 
 export const util = {
 
+  /**
+   * Retrieves URL of a staged file.
+   *
+   * @param path
+   *   Path relative to document root (e.g. assets/layers.json).
+   * @return
+   *   Path of fingerprinted file if renamed for web distribution.
+   */
+  getUrl: function(path) {
+    return config["fingerprints"][path] || path;
+  },
+
   /**
    * Join path nodes into a single string.
    *